@@ -0,0 +1,463 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+
+import datastore
+import engine
+import loader
+import perf
+import rules
+import screens
+
+# ==============================================================================
+# LOCAL HTTP API: Screener, Bluechip Radar & data saham (JSON / CSV)
+# Jalankan: python api_server.py --csv Kompilasi_Data_1Tahun.csv --port 8502
+#
+#   GET /screener?mode=whale&date=2024-05-20&min_value=1000000000&price=hidden_gem
+#   GET /screener?mode=split&period=10&aov_top_pct=2
+#   GET /screener?mode=whale&detector=robust
+#   GET /bluechip?min_value=20000000000&threshold=1.25&period=20&foreign_top_pct=10
+#   GET /screener?mode=whale&tf=W&bars=8
+#   GET /screen?name=whale_hidden_gem&period=5
+#   GET /screen?rule=aov>=2 and foreign>0&score=aov*value_ratio&date=2024-05-20
+#   GET /stock/BBCA?days=120&format=csv
+#   GET /stock/BBCA?tf=M&days=24
+#   GET /stock/BBCA/flow?days=20
+#   GET /stock/BBCA/similar?days=40&k=10
+#   GET /stock/BBCA/signals?signal=whale&since=2023-01-01
+#   GET /signals?date=2024-05-20&signal=bluechip
+#   GET /breadth?sector=Finance&since=2024-01-01   (jumlah & porsi saham bersinyal per tanggal)
+#   GET /screens                (daftar saved screen)
+#   GET /screens/<nama>         (hasil saved screen versi data ini, dari cache screens.py)
+#   GET /health
+#   GET /metrics   (teks Prometheus dari perf.py)
+# ==============================================================================
+SCREENER_COLS = ['Stock Code', 'Company Name', 'Sector', 'Last Trading Date', 'Close', 'Change %', 'Frequency', 'Volume', 'Value', 'Avg_Order_Volume', 'AOV_Ratio', 'AOV_RobustZ', 'AOV_Pct', 'Conviction_Score']
+BLUECHIP_COLS = ['Stock Code', 'Company Name', 'Last Trading Date', 'Close', 'Change %', 'Net Foreign', 'Value', 'Value_Ratio', 'AOV_Ratio', 'AOV_RobustZ', 'Avg_Order_Volume', 'AOV_Pct', 'Value_Pct', 'Foreign_Pct']
+# Saved screen punya cache sendiri (invalidasi per definisi) -> tidak lewat ResponseCache
+UNCACHED_PATHS = ('/screens',)
+STOCK_COLS = ['Last Trading Date', 'Period', 'Open Price', 'High', 'Low', 'Close', 'Adj_Close', 'Adj_Factor', 'Change %', 'Volume', 'Frequency', 'Value', 'Avg_Order_Volume', 'MA50_AOVol', 'MA_AOVol', 'AOV_Ratio', 'AOV_RobustZ', 'Whale_Signal', 'Split_Signal', 'Net Foreign', 'Value_Ratio']
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Dataset:
+    # Snapshot feature store (engine.build_feature_set, jalur yang sama dengan app.py & worker.py):
+    # versi = feature_version data mentah -> kunci hasil saved screen sama di screens dir bersama
+    def __init__(self, df_raw, previous=None, version=None):
+        # Bagian inkremental (ranks, bar, breadth, ledger) dibaca dari snapshot sebelumnya; dict baru
+        # supaya request yang masih memegang snapshot lama tidak ikut berubah
+        self.store = dict(previous.store) if previous else {}
+        # Start server: riwayat ledger dari disk (datastore.ledger_root) disambung, ledger dipersist tiap versi
+        ledger_root = datastore.ledger_root()
+        if previous is None:
+            persisted = datastore.load_ledger_state(ledger_root, engine.code_version())
+            if persisted is not None:
+                engine.restore_ledger(self.store, *persisted)
+        df = engine.build_feature_set(df_raw, self.store, version)
+        datastore.append_ledger(ledger_root, self.store['ledger'].events, engine.code_version(), self.store['corp_actions'], df['Last Trading Date'].min())
+        self.version = self.store['version']
+        self.df = self.store['df']
+        self.panel = self.store['panel']
+        self.prefix = self.store['prefix']
+        self.similarity = self.store['similarity']
+        self.ledger = self.store['ledger']
+        self.breadth = self.store['breadth']
+        self.market = self.store['market']
+        self.bars = {tf: self.store[f'bars_{tf}'] for tf in engine.TIMEFRAMES}
+        self.max_date = self.df['Last Trading Date'].max()
+        self.loaded_at = time.time()
+
+    def feature_store(self):
+        # Dict feature store (screens.py)
+        return self.store
+
+
+class ResponseCache:
+    # LRU per versi data: query identik tidak menjalankan filter pandas lagi
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# ==============================================================================
+# QUERY HANDLERS
+# ==============================================================================
+def _param(params, name, default=None, cast=str):
+    if name not in params:
+        return default
+    try:
+        return cast(params[name])
+    except (TypeError, ValueError):
+        raise ApiError(400, f"Parameter '{name}' tidak valid: {params[name]}")
+
+
+def _count(params, name, default, limit=None):
+    # Jumlah hari / bar / hasil: bilangan bulat positif, dibatasi histori yang tersedia (limit)
+    value = _param(params, name, default, int)
+    if value <= 0:
+        raise ApiError(400, f"Parameter '{name}' harus bilangan bulat positif: {params[name]}")
+    return value if limit is None else min(value, limit)
+
+
+def _timeframe(params):
+    tf = _param(params, 'tf', 'D')
+    if tf != 'D' and tf not in engine.TIMEFRAMES:
+        raise ApiError(400, f"tf harus salah satu dari {['D'] + list(engine.TIMEFRAMES)}")
+    return tf
+
+
+def _window(ds, params):
+    tf = _timeframe(params)
+    if tf != 'D':
+        if any(name.endswith('_top_pct') for name in params):
+            raise ApiError(400, "Filter persentil hanya tersedia untuk tf=D")
+        return engine.latest_bars(ds.bars[tf], _count(params, 'bars', 8)), True
+    date = _param(params, 'date', cast=pd.to_datetime)
+    period = _count(params, 'period', 10)
+    try:
+        if date is not None:
+            return engine.select_window(ds.df, date=date, panel=ds.panel), False
+        return engine.select_window(ds.df, start_date=engine.period_start(ds.max_date, period), panel=ds.panel), True
+    except perf.MemoryBudgetExceeded as e:
+        raise ApiError(413, str(e))
+
+
+def _price_condition(params):
+    cond = _param(params, 'price', 'all')
+    if cond not in engine.PRICE_CONDITIONS:
+        raise ApiError(400, f"price harus salah satu dari {list(engine.PRICE_CONDITIONS)}")
+    return cond
+
+
+def _detector(params):
+    detector = _param(params, 'detector', 'ratio')
+    if detector not in engine.DETECTORS:
+        raise ApiError(400, f"detector harus salah satu dari {list(engine.DETECTORS)}")
+    if detector != 'ratio' and _timeframe(params) != 'D':
+        raise ApiError(400, "detector robust hanya tersedia untuk tf=D")
+    return detector
+
+
+def query_screener(ds, params):
+    mode = _param(params, 'mode', 'whale')
+    if mode not in engine.ANOMALY_MODES:
+        raise ApiError(400, f"mode harus salah satu dari {list(engine.ANOMALY_MODES)}")
+    min_value = _param(params, 'min_value', 1_000_000_000, float)
+    aov_top_pct = _param(params, 'aov_top_pct', cast=float)
+
+    detector = _detector(params)
+
+    price_condition = _price_condition(params)
+    if _timeframe(params) == 'D':
+        date = _param(params, 'date', cast=pd.to_datetime)
+        try:
+            result = engine.anomaly_screen(ds.df, ds.prefix, ds.panel, mode, min_value, price_condition, period=_count(params, 'period', 10), date=date, aov_top_pct=aov_top_pct, detector=detector)
+        except perf.MemoryBudgetExceeded as e:
+            raise ApiError(413, str(e))
+        return result if date is None else result[[c for c in SCREENER_COLS if c in result.columns]]
+
+    target_df, _ = _window(ds, params)
+    suspects = engine.screen_anomaly(target_df, mode, min_value, price_condition, aov_top_pct=aov_top_pct, detector=detector)
+    return engine.summarize_anomaly_period(suspects)
+
+
+def query_bluechip(ds, params):
+    min_value = _param(params, 'min_value', engine.BLUECHIP_MIN_VALUE, float)
+    threshold = _param(params, 'threshold', engine.BLUECHIP_AOV_RATIO, float)
+    top_pct = {}
+    for name, pct_col in (('aov_top_pct', 'AOV_Pct'), ('value_top_pct', 'Value_Pct'), ('foreign_top_pct', 'Foreign_Pct')):
+        pct = _param(params, name, cast=float)
+        if pct is not None:
+            top_pct[pct_col] = pct
+
+    detector = _detector(params)
+
+    price_condition = _price_condition(params)
+    if _timeframe(params) == 'D':
+        date = _param(params, 'date', cast=pd.to_datetime)
+        try:
+            result = engine.bluechip_screen(ds.df, ds.prefix, ds.panel, min_value, threshold, price_condition, period=_count(params, 'period', 10), date=date, top_pct=top_pct, detector=detector)
+        except perf.MemoryBudgetExceeded as e:
+            raise ApiError(413, str(e))
+        return result if date is None else result[[c for c in BLUECHIP_COLS if c in result.columns]]
+
+    df_bc, _ = _window(ds, params)
+    bc_suspects = engine.screen_bluechip(df_bc, min_value, threshold, price_condition, top_pct=top_pct, detector=detector)
+    return engine.summarize_bluechip_period(bc_suspects)
+
+
+def query_stock(ds, code, params):
+    days = _count(params, 'days', 120)
+    tf = _timeframe(params)
+    source = ds.df if tf == 'D' else ds.bars[tf]
+    stock_data = source[source['Stock Code'] == code.upper()].tail(days)
+    if stock_data.empty:
+        raise ApiError(404, f"Saham {code} tidak ditemukan")
+    stock_data = stock_data[[c for c in STOCK_COLS if c in stock_data.columns]]
+    if 'Period' in stock_data.columns:
+        stock_data = stock_data.assign(Period=stock_data['Period'].astype(str))
+    return stock_data
+
+
+def query_flow(ds, code, params):
+    # Total & rata-rata window + streak asing dari prefix-sum (O(1))
+    code = code.upper()
+    if code not in ds.prefix.stock_pos:
+        raise ApiError(404, f"Saham {code} tidak ditemukan")
+    s, e = ds.prefix.stock_pos[code]
+    days = _count(params, 'days', 20, limit=e - s)
+    window = ds.prefix.window(code, list(ds.prefix.cum), days=days)
+    streak_days, streak_sign, streak_total = ds.prefix.foreign_streak(code)
+    window.update({'Stock Code': code, 'Foreign_Streak_Days': streak_days, 'Foreign_Streak_Sign': streak_sign, 'Foreign_Streak_Total': streak_total})
+    return pd.DataFrame([window])
+
+
+def query_similar(ds, code, params):
+    # Top-k saham dengan pola AOV/Value/return N hari terakhir paling mirip
+    days = _count(params, 'days', 40)
+    if days not in engine.SIMILARITY_DAYS:
+        raise ApiError(400, f"days harus salah satu dari {list(engine.SIMILARITY_DAYS)}")
+    index = ds.similarity.get(days)
+    if index is None:
+        index = ds.similarity[days] = engine.SimilarityIndex(ds.prefix, days)
+    similar = index.query(code.upper(), _count(params, 'k', 10, limit=len(index.codes) - 1))
+    if similar is None:
+        raise ApiError(404, f"Saham {code} tidak ditemukan atau histori < {days} hari")
+    return similar
+
+
+def query_screen(ds, params):
+    # Screen deklaratif (rules.py): name = screen bernama, rule = ekspresi bebas, score = urutan hasil
+    name = _param(params, 'name')
+    rule = _param(params, 'rule')
+    if name is not None and name not in engine.NAMED_SCREENS:
+        raise ApiError(400, f"name harus salah satu dari {list(engine.NAMED_SCREENS)}")
+    if (name is None) == (rule is None):
+        raise ApiError(400, "Isi salah satu: name atau rule")
+    if _timeframe(params) != 'D':
+        raise ApiError(400, "Screen rule hanya tersedia untuk tf=D")
+    frame, _ = _window(ds, {'period': 1, **params})
+    try:
+        masks, scores = engine.run_screens(frame, {'screen': rule or engine.NAMED_SCREENS[name]}, _param(params, 'score', engine.SCREEN_SCORE))
+    except rules.RuleError as e:
+        raise ApiError(400, str(e))
+    hits = engine.screen_hits(frame, masks['screen'], scores)
+    return hits[[c for c in SCREENER_COLS + ['Net Foreign', 'Value_Ratio', 'Score'] if c in hits.columns and c != 'Conviction_Score']]
+
+
+def query_saved_screens(ds, name=None):
+    definitions = screens.load_definitions(screens.screens_dir())
+    if name is None:
+        return pd.DataFrame([{'name': n, 'kind': d['kind'], 'params': json.dumps(d['params'])} for n, d in sorted(definitions.items())], columns=['name', 'kind', 'params'])
+    if name not in definitions:
+        raise ApiError(404, f"Saved screen '{name}' tidak ditemukan")
+    try:
+        result, _ = screens.get_result(screens.screens_dir(), definitions[name], ds.feature_store())
+    except perf.MemoryBudgetExceeded as e:
+        raise ApiError(413, str(e))
+    except rules.RuleError as e:
+        raise ApiError(400, f"Saved screen '{name}': {e}")
+    return result
+
+
+def _ledger_signal(params):
+    signal = _param(params, 'signal')
+    if signal is not None and signal not in engine.LEDGER_SIGNALS:
+        raise ApiError(400, f"signal harus salah satu dari {list(engine.LEDGER_SIGNALS)}")
+    return signal
+
+
+def query_stock_signals(ds, code, params):
+    # Riwayat sinyal satu saham dari ledger (index per saham)
+    history = ds.ledger.history(code.upper(), _ledger_signal(params), _param(params, 'since', cast=pd.to_datetime))
+    if history.empty and code.upper() not in ds.prefix.stock_pos:
+        raise ApiError(404, f"Saham {code} tidak ditemukan")
+    return history
+
+
+def query_signals(ds, params):
+    # Semua sinyal satu tanggal dari ledger (index per tanggal), default tanggal terakhir
+    date = _param(params, 'date', ds.max_date, pd.to_datetime)
+    return ds.ledger.on_date(date, _ledger_signal(params))
+
+
+def query_breadth(ds, params):
+    # Seri market breadth dari agregat per tanggal & sektor (tanpa scan df)
+    sector = _param(params, 'sector')
+    if sector is not None and sector not in set(ds.breadth['Sector']):
+        raise ApiError(404, f"Sektor {sector} tidak ditemukan")
+    series = engine.breadth_series(ds.breadth, sector).reset_index()
+    since = _param(params, 'since', cast=pd.to_datetime)
+    return series if since is None else series[series['Last Trading Date'] >= since]
+
+
+def route(ds, path, params):
+    parts = [p for p in path.split('/') if p]
+    if parts == ['screener']:
+        return query_screener(ds, params)
+    if parts == ['bluechip']:
+        return query_bluechip(ds, params)
+    if parts == ['screens']:
+        return query_saved_screens(ds)
+    if len(parts) == 2 and parts[0] == 'screens':
+        return query_saved_screens(ds, unquote(parts[1]))
+    if parts == ['screen']:
+        return query_screen(ds, params)
+    if parts == ['signals']:
+        return query_signals(ds, params)
+    if parts == ['breadth']:
+        return query_breadth(ds, params)
+    if len(parts) == 2 and parts[0] == 'stock':
+        return query_stock(ds, parts[1], params)
+    if len(parts) == 3 and parts[0] == 'stock' and parts[2] == 'flow':
+        return query_flow(ds, parts[1], params)
+    if len(parts) == 3 and parts[0] == 'stock' and parts[2] == 'similar':
+        return query_similar(ds, parts[1], params)
+    if len(parts) == 3 and parts[0] == 'stock' and parts[2] == 'signals':
+        return query_stock_signals(ds, parts[1], params)
+    raise ApiError(404, f"Endpoint tidak dikenal: {path}")
+
+
+def render(result, fmt):
+    if fmt == 'csv':
+        return result.to_csv(index=False).encode('utf-8'), 'text/csv; charset=utf-8'
+    body = result.to_json(orient='records', date_format='iso')
+    return body.encode('utf-8'), 'application/json'
+
+
+# ==============================================================================
+# SERVER
+# ==============================================================================
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, source, cache_size=512):
+        super().__init__(address, ApiHandler)
+        self.poller = loader.SourcePoller(source)
+        self.poller.check()
+        self.cache = ResponseCache(cache_size)
+        self.dataset = Dataset(self.poller.data)
+        self._swap_lock = threading.Lock()
+
+    def refresh(self):
+        # Dataset baru dari data poller; cache lama otomatis tidak terpakai karena versi berubah
+        df_raw = self.poller.data
+        version = engine.feature_version(df_raw)
+        if version == self.dataset.version:
+            return
+        with perf.run('api.refresh'):
+            new_ds = Dataset(df_raw, self.dataset, version)
+        with self._swap_lock:
+            self.dataset = new_ds
+            self.cache.clear()
+        screens.materialize_all(screens.screens_dir(), new_ds.feature_store())
+
+    def start_refresh_loop(self, interval):
+        # Poller hanya cek metadata tiap interval; Dataset dibangun ulang kalau file sumber berubah
+        def on_change(poller):
+            try:
+                self.refresh()
+            except Exception as e:
+                poller.invalidate()
+                print(f"Gagal refresh data: {e}")
+        self.poller.interval = interval
+        self.poller.start(on_change)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        ds = self.server.dataset
+
+        if url.path.rstrip('/') == '/health':
+            poller = self.server.poller
+            body = json.dumps({'version': ds.version, 'max_date': ds.max_date.strftime('%Y-%m-%d'), 'rows': len(ds.df),
+                               'loaded_at': poller.loaded_at, 'last_check': poller.last_check, 'last_error': poller.last_error})
+            return self._send(200, body.encode('utf-8'), 'application/json')
+
+        if url.path.rstrip('/') == '/metrics':
+            return self._send(200, perf.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4')
+
+        fmt = params.pop('format', 'json')
+        key = (ds.version, url.path.rstrip('/'), fmt, tuple(sorted(params.items())))
+        use_cache = not url.path.startswith(UNCACHED_PATHS)
+        cached = self.server.cache.get(key) if use_cache else None
+        if cached is None:
+            try:
+                with perf.stage(f"api.{url.path.strip('/').split('/')[0]}") as rec:
+                    result = route(ds, url.path, params)
+                    rec['rows'] = len(result)
+                    cached = render(result, fmt)
+            except ApiError as e:
+                return self._send(e.status, json.dumps({'error': str(e)}).encode('utf-8'), 'application/json')
+            except Exception as e:
+                # Error tak terduga tetap dijawab JSON 500 (koneksi tidak diputus tanpa respons)
+                return self._send(500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode('utf-8'), 'application/json')
+            if use_cache:
+                self.server.cache.put(key, cached)
+
+        body, content_type = cached
+        self._send(200, body, content_type, version=ds.version)
+
+    def _send(self, status, body, content_type, version=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if version:
+            self.send_header('ETag', f'"{version}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frequency Analyzer local HTTP API")
+    loader.add_source_args(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--refresh', type=int, default=loader.POLL_INTERVAL, help="Interval cek metadata sumber (detik), reload hanya kalau berubah; 0 = mati")
+    parser.add_argument('--cache-size', type=int, default=512)
+    args = parser.parse_args()
+
+    server = ApiServer((args.host, args.port), loader.make_source(args), args.cache_size)
+    if args.refresh > 0:
+        server.start_refresh_loop(args.refresh)
+    print(f"API siap di http://{args.host}:{args.port} (versi data {server.dataset.version})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,26 @@
+import time
+_import_started = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.express as px
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import io
 from datetime import datetime, timedelta
 
+import datastore
+import engine
+import loader
+import perf
+import rules
+import screens
+
+# Plotly di-import di sini (bukan per tab): Streamlit menjalankan isi semua tab tiap rerun,
+# jadi import lazy di dalam tab tidak menunda apa pun. Yang benar-benar lazy: client Google (hanya sumber Drive)
+perf_run = perf.start_run('app')
+if perf.once('app.import'):
+    perf.record({'stage': 'app.import', 'wall_ms': (time.perf_counter() - _import_started) * 1000})
+
 # ==============================================================================
 # 1. KONFIGURASI HALAMAN & CSS
 # ==============================================================================
@@ -46,102 +57,188 @@ st.markdown("""
 # ==============================================================================
 # 2. LOAD DATA
 # ==============================================================================
-FOLDER_ID = '1hX2jwUrAgi4Fr8xkcFWjCW6vbk6lsIlP'
-FILE_NAME = 'Kompilasi_Data_1Tahun.csv'
 
-@st.cache_resource
-def get_drive_service():
-    try:
-        creds = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=['https://www.googleapis.com/auth/drive.readonly']
-        )
-        return build('drive', 'v3', credentials=creds)
-    except Exception as e:
-        st.error(f"❌ Error Auth: {e}")
-        return None
+@st.cache_resource(show_spinner=False)
+def get_poller():
+    # Satu poller per proses: load pertama di sini, sesudahnya thread background hanya cek metadata
+    # (id, modifiedTime, size) tiap loader.POLL_INTERVAL detik dan download ulang kalau file berubah
+    # Beberapa file (arsip + tahun berjalan) di-load paralel lalu digabung di loader
+    if loader.local_source_paths():
+        source = loader.LocalSource()
+    else:
+        source = loader.DriveSource(dict(st.secrets["gcp_service_account"]), pattern=loader.drive_pattern())
+    poller = loader.SourcePoller(source)
+    poller.check()
+    return poller.start()
 
-@st.cache_data(ttl=1800)
-def load_data():
+# Mode worker (env FREQ_STORE_DIR): worker.py menyiapkan data & fitur, session hanya membaca versi terbaru
+STORE_DIR = datastore.store_dir()
+SCREENS_DIR = screens.screens_dir()
+LEDGER_ROOT = datastore.ledger_root()
+if STORE_DIR:
+    published_version = datastore.current_version(STORE_DIR)
+    if published_version is None:
+        st.warning(f"Belum ada data yang dipublikasikan worker di `{STORE_DIR}`. Jalankan `python worker.py --store {STORE_DIR} ...`.")
+        st.stop()
+else:
     try:
-        service = get_drive_service()
-        if not service: return None
-        
-        query = f"'{FOLDER_ID}' in parents and name='{FILE_NAME}' and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        
-        if not files: return None
-        
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False: status, done = downloader.next_chunk()
-        
-        fh.seek(0)
-        df = pd.read_csv(fh)
-        
-        # Preprocessing
-        df['Last Trading Date'] = pd.to_datetime(df['Last Trading Date'])
-        
-        numeric_cols = ['Close', 'Open Price', 'High', 'Low', 'Volume', 'Frequency', 'Avg_Order_Volume', 'MA50_AOVol', 'Value', 'Change', 'Previous']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        if 'Change %' not in df.columns:
-             df['Change %'] = np.where(df['Previous'] > 0, (df['Change'] / df['Previous']) * 100, 0)
-        
-        if 'Value' not in df.columns or df['Value'].sum() == 0:
-            df['Value'] = df['Close'] * df['Volume'] * 100
-            
-        return df
+        with st.spinner('Sedang menyiapkan data pasar...'):
+            poller = get_poller()
     except Exception as e:
         st.error(f"Gagal Load Data: {e}")
-        return None
-
-with st.spinner('Sedang menyiapkan data pasar...'):
-    df_raw = load_data()
-
-if df_raw is None:
-    st.stop()
+        st.stop()
+    data_generation, df_raw = poller.current
 
 # ==============================================================================
 # 3. GLOBAL CALCULATION (MA50 LOGIC)
 # ==============================================================================
-df = df_raw.sort_values(by=['Stock Code', 'Last Trading Date']).copy()
+# Feature store lintas rerun: fitur turunan hanya dihitung untuk tanggal/bar baru
+@st.cache_resource
+def get_feature_store():
+    return {}
 
-# A. Pastikan MA50 Ada
-if 'MA50_AOVol' not in df.columns:
-    df['MA50_AOVol'] = df.groupby('Stock Code')['Avg_Order_Volume'].transform(lambda x: x.rolling(50, min_periods=1).mean())
+# Versi hasil worker: tabel & index turunan (panel, prefix, market, ledger) langsung di atas memory-map
+@st.cache_resource(max_entries=2, show_spinner=False)
+def open_published(version):
+    tables = datastore.load(STORE_DIR, version)
+    # Versi lama tanpa tabel ledger -> ledger lintas versi di store
+    ledger_events = datastore.load_ledger(STORE_DIR) if 'ledger' not in tables else None
+    return engine.open_feature_set(tables, version, ledger_events, datastore.load_arrays(STORE_DIR, version))
 
-# B. Hitung Ratio Anomali
-df['AOV_Ratio'] = np.where(df['MA50_AOVol'] > 0, df['Avg_Order_Volume'] / df['MA50_AOVol'], 0)
+# Dihitung sekali per data baru dari poller (generation), df mentah tidak di-hash tiap rerun
+@st.cache_resource(max_entries=1, show_spinner=False)
+def build_features(generation, _df_raw):
+    store = get_feature_store()
+    # Ledger juga dipersist tanpa worker: riwayat sinyal dari sebelum restart disambung lagi
+    if 'ledger' not in store:
+        persisted = datastore.load_ledger_state(LEDGER_ROOT, engine.code_version())
+        if persisted is not None:
+            engine.restore_ledger(store, *persisted)
+    df = engine.build_feature_set(_df_raw, store)
+    datastore.append_ledger(LEDGER_ROOT, store['ledger'].events, engine.code_version(), store['corp_actions'], df['Last Trading Date'].min())
+    # Versi data baru -> saved screens langsung di-materialize (mode worker: dikerjakan worker.py)
+    screens.materialize_all(SCREENS_DIR, store)
+    return df
 
-# C. [PENTING] BUAT KOLOM SIGNAL (Fix Error KeyError)
-# Kolom ini wajib ada agar bisa dipanggil di Tab 1 (Charting)
-df['Whale_Signal'] = df['AOV_Ratio'] >= 1.5
-df['Split_Signal'] = (df['AOV_Ratio'] <= 0.6) & (df['AOV_Ratio'] > 0)
+if STORE_DIR:
+    feature_store = open_published(published_version)
+else:
+    build_features(data_generation, df_raw)
+    # Snapshot per rerun: semua tabel & index dari versi yang sama walau session lain memasang versi baru
+    feature_store = dict(get_feature_store())
+df = feature_store['df']
+prefix = feature_store['prefix']
+panel = feature_store['panel']
+market = feature_store['market']
+
+max_date = df['Last Trading Date'].max()
 
+# Kesegaran data: tanggal data terakhir + kapan sumber diubah / dimuat / dicek (poller)
+def fmt_clock(ts):
+    return datetime.fromtimestamp(ts).strftime('%d %b %H:%M:%S') if ts else "-"
 
-# D. Net Foreign Calc (Cek ketersediaan kolom dulu)
-if 'Foreign Buy' in df.columns and 'Foreign Sell' in df.columns:
-    df['Net Foreign'] = df['Foreign Buy'] - df['Foreign Sell']
+if STORE_DIR:
+    st.caption(f"📅 Data per **{max_date:%d %b %Y}** · versi `{published_version}` (worker)")
 else:
-    df['Net Foreign'] = 0
+    st.caption(
+        f"📅 Data per **{max_date:%d %b %Y}** · file sumber diubah {fmt_clock(poller.source_modified())} · "
+        f"dimuat {fmt_clock(poller.loaded_at)} · cek terakhir {fmt_clock(poller.last_check)} (tiap {poller.interval} s)"
+        + (f" · ⚠️ cek gagal: {poller.last_error}" if poller.last_error else "")
+    )
 
-# E. Value Spike (Money Flow) - Khusus Bluechip
-# Rata-rata Value transaksi 20 hari
-df['MA20_Value'] = df.groupby('Stock Code')['Value'].transform(lambda x: x.rolling(20, min_periods=1).mean())
-df['Value_Ratio'] = np.where(df['MA20_Value'] > 0, df['Value'] / df['MA20_Value'], 0)
+# Timeframe chart / scan: label UI -> konfigurasi
+CHART_TIMEFRAMES = {
+    "Harian": {'tf': 'D', 'unit': 'Hari', 'ranges': [30, 60, 90, 120, 200], 'index': 3},
+    "Mingguan": {'tf': 'W', 'unit': 'Minggu', 'ranges': [26, 52, 104, 156], 'index': 1},
+    "Bulanan": {'tf': 'M', 'unit': 'Bulan', 'ranges': [12, 24, 36, 60], 'index': 1}
+}
 
-max_date = df['Last Trading Date'].max()
+# Detektor anomali AOV (berlaku di semua tab)
+DETECTOR_LABELS = {
+    "📏 Ratio MA50 (Standar)": 'ratio',
+    "🛡️ Robust Z (log AOV, Median/MAD 50D)": 'robust'
+}
+
+# Label UI -> kunci kondisi harga di engine
+PRICE_CONDITION_LABELS = {
+    "🔍 SEMUA FASE (Tampilkan Semua)": 'all',
+    "💎 HIDDEN GEM (Sideways/Datar)": 'hidden_gem',
+    "⚓ BOTTOM FISHING (Lagi Turun/Downtrend)": 'bottom_fishing',
+    "🚀 EARLY MOVE (Baru Mulai Naik)": 'early_move'
+}
 
 # ==============================================================================
 # 4. DASHBOARD TABS
 # ==============================================================================
+def save_screen_form(kind, params, key, default_name=""):
+    # Simpan pengaturan screen saat ini (hasil dihitung otomatis tiap versi data baru)
+    c_save1, c_save2 = st.columns([3, 1])
+    screen_name = c_save1.text_input("Nama screen", default_name, key=f"{key}_save_name", placeholder="mis. Whale Hidden Gem 10 Hari")
+    if c_save2.button("💾 Simpan Screen", key=f"{key}_save", use_container_width=True):
+        if not screen_name.strip():
+            st.warning("Isi nama screen dulu.")
+        else:
+            screens.save_definition(SCREENS_DIR, screen_name.strip(), kind, params)
+            st.success(f"Screen **{screen_name.strip()}** tersimpan.")
+
+
+def render_saved_screens(kinds, key):
+    # Buka screen tersimpan: hasil versi data ini dibaca dari cache (dihitung sekali kalau belum ada)
+    definitions = {name: d for name, d in screens.load_definitions(SCREENS_DIR).items() if d['kind'] in kinds}
+    with st.expander(f"📌 Saved Screens ({len(definitions)})"):
+        if not definitions:
+            st.caption("Belum ada screen tersimpan. Atur filter lalu klik 💾 Simpan Screen.")
+            return
+        c_saved1, c_saved2 = st.columns([3, 1])
+        saved_name = c_saved1.selectbox("Screen", sorted(definitions), key=f"{key}_saved")
+        if c_saved2.button("🗑️ Hapus", key=f"{key}_saved_delete", use_container_width=True):
+            screens.delete_definition(SCREENS_DIR, saved_name)
+            st.rerun()
+        definition = definitions[saved_name]
+        st.caption(" | ".join(f"{k}: {v}" for k, v in definition['params'].items() if v not in (None, {}, 'all')))
+        try:
+            result, cached = screens.get_result(SCREENS_DIR, definition, feature_store)
+        except (perf.MemoryBudgetExceeded, rules.RuleError) as e:
+            st.error(f"⚠️ Screen gagal dihitung: {e}")
+            return
+        st.caption(f"{'⚡ Dari cache' if cached else '🔄 Baru dihitung'} · data s/d {max_date:%d %b %Y} · {len(result)} baris")
+        st.dataframe(result, use_container_width=True, hide_index=True)
+
+detector_label = st.radio(
+    "Detektor Anomali AOV:",
+    list(DETECTOR_LABELS),
+    horizontal=True,
+    key="detector",
+    help="Robust Z = (log AOV - Median 50D) / MAD 50D. Tidak terdistorsi satu transaksi crossing raksasa; skala log membuat sisi Whale & Split seimbang."
+)
+detector = DETECTOR_LABELS[detector_label]
+det_cfg = engine.DETECTORS[detector]
+
+# Market Breadth: jumlah / porsi saham bersinyal per hari (agregat precompute per tanggal & sektor)
+with st.expander("🌡️ Market Breadth (Whale vs Split)"):
+    breadth = feature_store['breadth']
+    c_br1, c_br2, c_br3 = st.columns([2, 2, 1])
+    breadth_sector = c_br1.selectbox("Sektor", ["Semua Sektor"] + sorted(breadth['Sector'].unique()), key="breadth_sector")
+    breadth_metric = c_br2.radio("Ukuran", ["% Saham", "% Value", "Jumlah Saham"], horizontal=True, key="breadth_metric")
+    breadth_days = c_br3.selectbox("Hari", [60, 120, 250], index=1, key="breadth_days")
+    # Sinyal mengikuti detektor aktif (ratio: whale/split, robust: whale_robust/split_robust)
+    suffix = '' if detector == 'ratio' else f'_{detector}'
+    breadth_signals = {'🐋 Whale': f'whale{suffix}', '⚡ Split': f'split{suffix}', '📊 Bluechip': 'bluechip'}
+    with perf.stage('breadth.series'):
+        series = engine.breadth_series(breadth, None if breadth_sector == "Semua Sektor" else breadth_sector, breadth_signals.values()).tail(breadth_days)
+    metric_suffix = {"% Saham": '_Pct', "% Value": '_Value_Pct', "Jumlah Saham": '_Count'}[breadth_metric]
+
+    fig_breadth = go.Figure()
+    for label, color in zip(breadth_signals, ['#00cc00', '#ff4444', '#2962ff']):
+        fig_breadth.add_trace(go.Scatter(x=series.index, y=series[breadth_signals[label] + metric_suffix], name=label, mode='lines', line=dict(color=color, width=1.5)))
+    fig_breadth.update_layout(height=260, margin=dict(l=10, r=10, t=10, b=10), hovermode="x unified", legend=dict(orientation='h', y=1.1))
+    st.plotly_chart(fig_breadth, use_container_width=True)
+    if not series.empty:
+        latest = series.iloc[-1]
+        st.caption(f"{series.index[-1]:%d %b %Y}: " + " · ".join(
+            f"{label} {int(latest[f'{sig}_Count'])} saham ({latest[f'{sig}_Pct']:.1f}%, Value {latest[f'{sig}_Value_Pct']:.1f}%)"
+            for label, sig in breadth_signals.items()) + f" dari {int(latest['Stocks'])} saham")
+
 tab1, tab2, tab3, tab4 = st.tabs([
     "📈 Deep Dive", 
     "🐋 Screener", 
@@ -164,26 +261,48 @@ with tab1:
         selected_stock = st.selectbox("🔍 Pilih Saham", all_stocks, key="deepdive_stock")
     
     with c_sel2:
-        chart_days = st.selectbox("Rentang Chart", [30, 60, 90, 120, 200], index=3, format_func=lambda x: f"{x} Hari")
+        chart_tf = st.radio("Timeframe", list(CHART_TIMEFRAMES), horizontal=True, key="deepdive_tf")
+        tf_cfg = CHART_TIMEFRAMES[chart_tf]
+        chart_days = st.selectbox("Rentang Chart", tf_cfg['ranges'], index=tf_cfg['index'], format_func=lambda x: f"{x} {tf_cfg['unit']}")
     
     with c_sel3:
         chart_type = st.radio("Tipe Chart", ["Candle", "Line"], horizontal=True, label_visibility="collapsed")
+        adjusted_chart = st.toggle("Harga Adjusted", value=True, key="deepdive_adjusted", help="Harga & volume disesuaikan untuk split, reverse split, dan rights issue yang terdeteksi.")
     st.markdown('</div>', unsafe_allow_html=True)
     
     # --- B. DATA PROCESSING ---
-    stock_data = df[df['Stock Code'] == selected_stock].tail(chart_days).copy()
+    perf_rec = perf.start('tab1.filter')
+    # Baris saham berurutan di df -> slice posisi dari prefix index (tanpa mask full frame)
+    daily_data = df.iloc[slice(*prefix.span(selected_stock))]
+    if tf_cfg['tf'] == 'D':
+        stock_data = daily_data.tail(chart_days)
+        if adjusted_chart:
+            stock_data = engine.adjusted_prices(stock_data)
+    else:
+        # Bar mingguan/bulanan dari feature store (ratusan baris, bukan ribuan)
+        tf_bars = feature_store[f"bars_{tf_cfg['tf']}"]
+        stock_data = tf_bars[tf_bars['Stock Code'] == selected_stock].tail(chart_days)
+    # Sinyal chart & garis AOV ikut detektor (bar mingguan/bulanan selalu Ratio)
+    line_cfg = engine.signal_config(stock_data, detector)
+    
+    perf.stop(perf_rec, rows=len(stock_data))
     
     # Cek Data Ada/Tidak
     if not stock_data.empty:
-        last_row = stock_data.iloc[-1]
+        # Card & metrics selalu pakai data harian terakhir
+        last_row = daily_data.iloc[-1]
         company_name = last_row.get('Company Name', selected_stock)
         
         # --- C. STATUS CARD (VERDICT) ---
         aov_ratio = last_row.get('AOV_Ratio', 1)
+        det_value = last_row.get(det_cfg['col'], 0)
+        aov_text = f"AOV Ratio: <b>{aov_ratio:.2f}x</b>"
+        if detector == 'robust':
+            aov_text += f" | Robust Z: <b>{det_value:+.1f}</b>"
         
         # Hitung Conviction Score (0-100%)
-        if aov_ratio >= 1.5:
-            conviction_score = min(99, ((aov_ratio - 1.5) / (5 - 1.5)) * 80 + 20)
+        if last_row[det_cfg['whale_signal']]:
+            conviction_score = engine.conviction_score(det_value, detector, 'whale')
             card_html = f"""
             <div class="whale-card">
                 <div style="display: flex; justify-content: space-between; align-items: center;">
@@ -193,13 +312,13 @@ with tab1:
                     </div>
                     <div style="text-align: right;">
                         <div class="value-text">Score: {conviction_score:.0f}%</div>
-                        <div class="small-text">AOV Ratio: <b>{aov_ratio:.2f}x</b></div>
+                        <div class="small-text">{aov_text}</div>
                     </div>
                 </div>
             </div>
             """
-        elif aov_ratio <= 0.6 and aov_ratio > 0:
-            conviction_score = min(99, ((0.6 - aov_ratio) / 0.6) * 80 + 20)
+        elif last_row[det_cfg['split_signal']]:
+            conviction_score = engine.conviction_score(det_value, detector, 'split')
             card_html = f"""
             <div class="split-card">
                 <div style="display: flex; justify-content: space-between; align-items: center;">
@@ -209,7 +328,7 @@ with tab1:
                     </div>
                     <div style="text-align: right;">
                         <div class="value-text">Score: {conviction_score:.0f}%</div>
-                        <div class="small-text">AOV Ratio: <b>{aov_ratio:.2f}x</b></div>
+                        <div class="small-text">{aov_text}</div>
                     </div>
                 </div>
             </div>
@@ -224,7 +343,7 @@ with tab1:
                     </div>
                     <div style="text-align: right;">
                         <div class="value-text">Neutral</div>
-                        <div class="small-text">AOV Ratio: <b>{aov_ratio:.2f}x</b></div>
+                        <div class="small-text">{aov_text}</div>
                     </div>
                 </div>
             </div>
@@ -252,7 +371,10 @@ with tab1:
         with m4:
             # Foreign Flow (CUMULATIVE LOGIC)
             # 1. Hitung Total selama periode chart (misal 30 hari)
-            cum_foreign = stock_data['Net Foreign'].sum()
+            if tf_cfg['tf'] == 'D':
+                cum_foreign = prefix.total('Net Foreign', *prefix.span(selected_stock, days=chart_days))
+            else:
+                cum_foreign = stock_data['Net Foreign'].sum()
             
             # 2. Ambil data hari terakhir saja (untuk info tambahan/delta)
             last_day_foreign = last_row.get('Net Foreign', 0)
@@ -274,7 +396,7 @@ with tab1:
             # Value: Total Kumulatif
             # Delta: Flow Hari Ini (Hijau kalau beli, Merah kalau jual)
             st.metric(
-                label=f"Asing (Total {chart_days} Hari)", 
+                label=f"Asing (Total {chart_days} {tf_cfg['unit']})", 
                 value=cum_fmt, 
                 delta=f"{last_fmt} (Hari Ini)", 
                 delta_color="normal",
@@ -295,21 +417,35 @@ with tab1:
             
             st.metric("Free Float", ff_display, label_ff, delta_color="off", help="< 10% = Saham Kering (Enteng). > 40% = Saham Berat.")
 
+        # Streak Asing (hari beruntun net buy / net sell)
+        streak_days, streak_sign, streak_total = prefix.foreign_streak(selected_stock)
+        if streak_sign != 0:
+            streak_label = "Net Buy" if streak_sign > 0 else "Net Sell"
+            st.caption(f"🌏 Streak Asing: **{streak_days} hari {streak_label}** beruntun (Total Rp {streak_total/1e9:+,.1f} M)")
+
+        # Corporate action terdeteksi (split / rights issue)
+        stock_events = feature_store['corp_actions']
+        stock_events = stock_events[stock_events['Stock Code'] == selected_stock]
+        if not stock_events.empty:
+            event_text = ", ".join(f"{row['Last Trading Date']:%d %b %Y} (faktor {row['Factor']:.3g})" for _, row in stock_events.iterrows())
+            st.caption(f"🔀 Corporate Action: {event_text}")
+
         st.divider()
 
         # --- E. CHARTING SECTION ---
+        perf_rec = perf.start('tab1.chart', rows=len(stock_data))
         fig = make_subplots(
-            rows=3, cols=1,
+            rows=4, cols=1,
             shared_xaxes=True,
             vertical_spacing=0.05,
-            row_heights=[0.6, 0.2, 0.2],
-            specs=[[{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": False}]]
+            row_heights=[0.5, 0.15, 0.2, 0.15],
+            specs=[[{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": False}]]
         )
         
         # 1. Price Chart
         if chart_type == "Candle":
             # Validasi data candle
-            valid_candle = stock_data[(stock_data['Open Price'] > 0) & (stock_data['High'] > 0)].copy()
+            valid_candle = stock_data[(stock_data['Open Price'] > 0) & (stock_data['High'] > 0)]
             if not valid_candle.empty:
                 fig.add_trace(go.Candlestick(
                     x=valid_candle['Last Trading Date'],
@@ -323,47 +459,106 @@ with tab1:
             fig.add_trace(go.Scatter(x=stock_data['Last Trading Date'], y=stock_data['Close'], mode='lines', line=dict(color='#2962ff', width=2), name='Close'), row=1, col=1)
         
         # Markers
-        if 'Whale_Signal' in stock_data.columns:
-            ws = stock_data[stock_data['Whale_Signal']]
-            if not ws.empty and 'High' in ws.columns:
-                fig.add_trace(go.Scatter(x=ws['Last Trading Date'], y=ws['High']*1.02, mode='markers', marker=dict(symbol='triangle-down', size=12, color='#00cc00', line=dict(width=1, color='black')), name='Whale'), row=1, col=1)
+        whale_sig, split_sig = stock_data[line_cfg['whale_signal']], stock_data[line_cfg['split_signal']]
+        ws = stock_data[whale_sig]
+        if not ws.empty and 'High' in ws.columns:
+            fig.add_trace(go.Scatter(x=ws['Last Trading Date'], y=ws['High']*1.02, mode='markers', marker=dict(symbol='triangle-down', size=12, color='#00cc00', line=dict(width=1, color='black')), name='Whale'), row=1, col=1)
         
-        if 'Split_Signal' in stock_data.columns:
-            ss = stock_data[stock_data['Split_Signal']]
-            if not ss.empty and 'Low' in ss.columns:
-                fig.add_trace(go.Scatter(x=ss['Last Trading Date'], y=ss['Low']*0.98, mode='markers', marker=dict(symbol='triangle-up', size=12, color='#ff4444', line=dict(width=1, color='black')), name='Split'), row=1, col=1)
+        ss = stock_data[split_sig]
+        if not ss.empty and 'Low' in ss.columns:
+            fig.add_trace(go.Scatter(x=ss['Last Trading Date'], y=ss['Low']*0.98, mode='markers', marker=dict(symbol='triangle-up', size=12, color='#ff4444', line=dict(width=1, color='black')), name='Split'), row=1, col=1)
 
         # 2. Volume Chart
-        colors = ['#00cc00' if r >= 1.5 else '#ff4444' if (r <= 0.6 and r > 0) else '#cfd8dc' for r in stock_data['AOV_Ratio']]
+        colors = np.where(whale_sig, '#00cc00', np.where(split_sig, '#ff4444', '#cfd8dc'))
         fig.add_trace(go.Bar(x=stock_data['Last Trading Date'], y=stock_data['Volume'], marker_color=colors, name='Volume'), row=2, col=1)
         
-        # 3. AOV Ratio Line
-        ma_col = 'MA50_AOVol' if 'MA50_AOVol' in stock_data.columns else 'MA30_AOVol'
+        # 3. AOV Ratio Line (atau Robust Z; bar mingguan/bulanan selalu Ratio)
+        ma_col = 'MA50_AOVol' if 'MA50_AOVol' in stock_data.columns else 'MA_AOVol'
         ma_vals = stock_data[ma_col].fillna(0).values if ma_col in stock_data.columns else np.zeros(len(stock_data))
+        line_fmt = '%{y:.2f}x' if line_cfg['col'] == 'AOV_Ratio' else 'Z %{y:+.1f}'
         
         fig.add_trace(go.Scatter(
-            x=stock_data['Last Trading Date'], y=stock_data['AOV_Ratio'],
+            x=stock_data['Last Trading Date'], y=stock_data[line_cfg['col']],
             mode='lines', line=dict(color='#9c88ff', width=2), name='AOV Ratio',
             customdata=np.stack((stock_data['Avg_Order_Volume'], ma_vals), axis=-1),
-            hovertemplate='Ratio: %{y:.2f}x<br>Avg: %{customdata[0]:.0f}<br>MA: %{customdata[1]:.0f}'
+            hovertemplate=f'Ratio: {line_fmt}<br>Avg: %{{customdata[0]:.0f}}<br>MA: %{{customdata[1]:.0f}}'
         ), row=3, col=1)
         
         # Ref Lines
-        fig.add_hline(y=1.5, line_dash="dash", line_color="green", row=3, col=1)
-        fig.add_hline(y=0.6, line_dash="dash", line_color="red", row=3, col=1)
+        fig.add_hline(y=line_cfg['whale'], line_dash="dash", line_color="green", row=3, col=1)
+        fig.add_hline(y=line_cfg['split'], line_dash="dash", line_color="red", row=3, col=1)
+
+        # 4. Net Foreign Kumulatif (selisih prefix-sum, tanpa cumsum ulang)
+        if tf_cfg['tf'] == 'D':
+            cum_line = prefix.running_total('Net Foreign', *prefix.span(selected_stock, days=chart_days))
+        else:
+            cum_line = stock_data['Net Foreign'].cumsum().values
+        fig.add_trace(go.Scatter(
+            x=stock_data['Last Trading Date'], y=cum_line,
+            mode='lines', fill='tozeroy', line=dict(color='#ff9f43', width=2), name='Asing Kumulatif',
+            hovertemplate='Asing Kumulatif: Rp %{y:,.0f}'
+        ), row=4, col=1)
 
         # Gap Fixing (Anti Ompong)
         dt_all = pd.date_range(start=stock_data['Last Trading Date'].min(), end=stock_data['Last Trading Date'].max())
         dt_obs = [d.strftime("%Y-%m-%d") for d in stock_data['Last Trading Date']]
         dt_breaks = [d.strftime("%Y-%m-%d") for d in dt_all if d.strftime("%Y-%m-%d") not in dt_obs]
         
-        fig.update_xaxes(rangebreaks=[dict(values=dt_breaks)])
-        fig.update_layout(height=700, margin=dict(l=10, r=10, t=10, b=10), showlegend=False, hovermode="x unified")
+        if tf_cfg['tf'] == 'D':
+            fig.update_xaxes(rangebreaks=[dict(values=dt_breaks)])
+        fig.update_layout(height=820, margin=dict(l=10, r=10, t=10, b=10), showlegend=False, hovermode="x unified")
         fig.update_yaxes(title_text="Price", row=1, col=1)
         fig.update_yaxes(title_text="Vol", row=2, col=1)
         fig.update_yaxes(title_text="AOV", row=3, col=1)
+        fig.update_yaxes(title_text="Asing", row=4, col=1)
+
+        perf.stop(perf_rec)
+
+        with perf.stage('tab1.render', rows=len(stock_data)):
+            st.plotly_chart(fig, use_container_width=True)
+
+        # --- F. SIMILARITY SEARCH (Pola AOV mirip di seluruh bursa) ---
+        with st.expander("🧬 Cari Saham dengan Pola Mirip"):
+            c_sim1, c_sim2 = st.columns(2)
+            sim_days = c_sim1.selectbox("Jendela Pola", engine.SIMILARITY_DAYS, index=1, format_func=lambda x: f"{x} Hari", key="sim_days")
+            sim_k = c_sim2.number_input("Jumlah Hasil", min_value=5, max_value=50, value=10, step=5, key="sim_k")
+
+            with perf.stage('tab1.similarity') as rec:
+                sim_index = feature_store['similarity'].get(sim_days)
+                if sim_index is None:
+                    sim_index = feature_store['similarity'][sim_days] = engine.SimilarityIndex(prefix, sim_days)
+                similar = sim_index.query(selected_stock, int(sim_k))
+                rec['rows'] = 0 if similar is None else len(similar)
 
-        st.plotly_chart(fig, use_container_width=True)
+            if similar is None:
+                st.info(f"Histori {selected_stock} kurang dari {sim_days} hari.")
+            else:
+                st.caption(f"Kemiripan (cosine) pola {sim_days} hari terakhir: {', '.join(engine.SIMILARITY_FEATURES)}")
+                st.dataframe(similar.style.format({'Similarity': '{:.2f}'}).background_gradient(subset=['Similarity'], cmap='Greens'), use_container_width=True, hide_index=True)
+
+        # --- G. RIWAYAT SINYAL (Ledger append-only, tanpa hitung ulang) ---
+        with st.expander("📒 Riwayat Sinyal (Ledger)"):
+            ledger = feature_store['ledger']
+            with perf.stage('tab1.ledger') as rec:
+                signal_summary = ledger.stock_summary(selected_stock)
+                signal_history = ledger.history(selected_stock)
+                rec['rows'] = len(signal_history)
+
+            if signal_history.empty:
+                st.info(f"Belum ada sinyal tercatat untuk {selected_stock}.")
+            else:
+                st.caption(f"Ledger sejak {pd.Timestamp(ledger.dates[0]):%d %b %Y}: {len(ledger):,} sinyal di {len(ledger.stocks):,} saham")
+                st.dataframe(signal_summary.style.format({'First_Seen': '{:%d %b %Y}', 'Last_Seen': '{:%d %b %Y}', 'Avg_Score': '{:.0f}%'}), use_container_width=True, hide_index=True)
+                ledger_signal = st.selectbox("Sinyal", ['Semua'] + list(engine.LEDGER_SIGNALS), key="ledger_signal")
+                if ledger_signal != 'Semua':
+                    signal_history = signal_history[signal_history['Signal'] == ledger_signal]
+                st.dataframe(
+                    signal_history.iloc[::-1].drop(columns=['Stock Code']).style.format({
+                        'Last Trading Date': '{:%d %b %Y}', 'Close': '{:,.0f}', 'Change %': '{:+.2f}%', 'Value': 'Rp {:,.0f}',
+                        'Net Foreign': 'Rp {:,.0f}', 'AOV_Ratio': '{:.2f}x', 'AOV_RobustZ': '{:.2f}', 'Value_Ratio': '{:.2f}x', 'Conviction_Score': '{:.0f}%'
+                    }),
+                    use_container_width=True, hide_index=True
+                )
     
     else:
         st.warning("Data tidak tersedia untuk saham ini.")
@@ -373,12 +568,13 @@ with tab1:
 # ==============================================================================
 with tab2:
     st.markdown("### 🐋 Whale & Retail Detection Screener")
+    render_saved_screens(('anomaly', 'rule'), "tab2")
     
     # --- Settings ---
     with st.container():
         scan_mode = st.radio(
             "Metode Scanning:",
-            ("📸 Daily Snapshot (Satu Tanggal)", "🗓️ Period Scanner (Rentang Waktu)"),
+            ("📸 Daily Snapshot (Satu Tanggal)", "🗓️ Period Scanner (Rentang Waktu)", "📆 Bar Scanner (Mingguan/Bulanan)"),
             horizontal=True
         )
         st.divider()
@@ -387,16 +583,27 @@ with tab2:
         with col_set1:
             st.markdown("#### 🎯 Mode Deteksi")
             anomaly_type = st.radio("Target:", ("🐋 Whale Signal (High AOV)", "⚡ Split/Retail Signal (Low AOV)"))
+            aov_cutoff = st.radio("Cutoff AOV:", ("Absolut (Ratio MA50)", "Persentil Harian"), horizontal=True, help="Persentil = relatif terhadap semua saham di tanggal yang sama.")
+            aov_top_pct = None
+            if aov_cutoff == "Persentil Harian":
+                aov_top_pct = st.number_input("Top/Bottom % AOV hari itu", 0.5, 50.0, 2.0, 0.5)
             
         with col_set2:
             if scan_mode == "📸 Daily Snapshot (Satu Tanggal)":
                 st.markdown("#### 📅 Tanggal Analisa")
                 selected_date_val = st.date_input("Pilih Tanggal", max_date)
                 selected_date = pd.to_datetime(selected_date_val)
-            else:
+            elif scan_mode == "🗓️ Period Scanner (Rentang Waktu)":
                 st.markdown("#### ⏳ Rentang Waktu")
                 period_days = st.selectbox("Analisa Data Terakhir:", [5, 10, 20, 60], index=1, format_func=lambda x: f"{x} Hari Kerja")
-                start_date_scan = max_date - timedelta(days=period_days * 1.5)
+                start_date_scan = engine.period_start(max_date, period_days)
+                period_label = f"{period_days} hari terakhir"
+            else:
+                st.markdown("#### 📆 Timeframe Bar")
+                scan_tf = st.radio("Timeframe", ["Mingguan", "Bulanan"], horizontal=True, key="scan_tf")
+                scan_tf_cfg = CHART_TIMEFRAMES[scan_tf]
+                scan_bars = st.selectbox("Analisa Bar Terakhir:", [4, 8, 12, 26], index=1, format_func=lambda x: f"{x} {scan_tf_cfg['unit']}")
+                period_label = f"{scan_bars} {scan_tf_cfg['unit'].lower()} terakhir"
             
         with col_set3:
             st.markdown("#### 💰 Min. Transaksi")
@@ -406,58 +613,58 @@ with tab2:
     st.markdown("#### 📉 Kondisi Harga (Price Context)")
     price_condition = st.selectbox(
         "Filter Kondisi Harga:",
-        [
-            "🔍 SEMUA FASE (Tampilkan Semua)",
-            "💎 HIDDEN GEM (Sideways/Datar)", 
-            "⚓ BOTTOM FISHING (Lagi Turun/Downtrend)",
-            "🚀 EARLY MOVE (Baru Mulai Naik)"
-        ]
+        list(PRICE_CONDITION_LABELS)
     )
 
-    # --- Data Prep ---
-    if scan_mode == "📸 Daily Snapshot (Satu Tanggal)":
-        target_df = df[df['Last Trading Date'] == selected_date].copy()
-    else:
-        target_df = df[df['Last Trading Date'] >= start_date_scan].copy()
+    anomaly_mode = 'whale' if anomaly_type == "🐋 Whale Signal (High AOV)" else 'split'
 
-    # --- Filtering ---
-    if anomaly_type == "🐋 Whale Signal (High AOV)":
-        min_ratio = 2.0
-        suspects = target_df[(target_df['AOV_Ratio'] >= min_ratio) & (target_df['Value'] >= min_value)]
-        color_map = 'Greens'
-    else:
-        suspects = target_df[(target_df['AOV_Ratio'] <= 0.6) & (target_df['AOV_Ratio'] > 0) & (target_df['Value'] >= min_value)]
-        color_map = 'Reds_r'
-
-    # VWMA Logic for Price Context
-    if not suspects.empty:
-        if 'VWMA_20D' not in suspects.columns:
-            suspects['TP'] = (suspects['High'] + suspects['Low'] + suspects['Close']) / 3
-            suspects['VP'] = suspects['TP'] * suspects['Volume']
-            suspects['VWMA_20D'] = suspects.groupby('Stock Code')['VP'].transform(lambda x: x.rolling(20).sum() / x.rolling(20).sum())
-
-        if price_condition == "💎 HIDDEN GEM (Sideways/Datar)":
-            suspects = suspects[(suspects['Change %'] >= -2.0) & (suspects['Change %'] <= 2.0)]
-        elif price_condition == "⚓ BOTTOM FISHING (Lagi Turun/Downtrend)":
-            suspects = suspects[(suspects['Close'] < suspects['VWMA_20D']) | (suspects['Change %'] < 0)]
-        elif price_condition == "🚀 EARLY MOVE (Baru Mulai Naik)":
-            suspects = suspects[(suspects['Change %'] > 0) & (suspects['Change %'] <= 4.0)]
+    # Saved screen selalu memakai data terbaru (snapshot = tanggal terakhir); Bar Scanner belum didukung
+    if scan_mode != "📆 Bar Scanner (Mingguan/Bulanan)":
+        save_screen_form('anomaly', {
+            'mode': anomaly_mode, 'min_value': float(min_value), 'price_condition': PRICE_CONDITION_LABELS[price_condition],
+            'period': period_days if scan_mode == "🗓️ Period Scanner (Rentang Waktu)" else None,
+            'aov_top_pct': aov_top_pct, 'detector': detector
+        }, "tab2")
+    color_map = 'Greens' if anomaly_mode == 'whale' else 'Reds_r'
+
+    # --- Period Scanner: langsung dari counter kumulatif (None = perlu jalur filter) ---
+    perf_rec = perf.start('tab2.filter')
+    summary = None
+    if scan_mode == "🗓️ Period Scanner (Rentang Waktu)":
+        summary = engine.period_anomaly_summary(prefix, start_date_scan, anomaly_mode, min_value, PRICE_CONDITION_LABELS[price_condition], aov_top_pct=aov_top_pct, detector=detector)
+
+    if summary is None:
+        # --- Data Prep ---
+        try:
+            if scan_mode == "📸 Daily Snapshot (Satu Tanggal)":
+                target_df = engine.select_window(df, date=selected_date, panel=panel)
+            elif scan_mode == "🗓️ Period Scanner (Rentang Waktu)":
+                target_df = engine.select_window(df, start_date=start_date_scan, panel=panel)
+            else:
+                target_df = engine.latest_bars(feature_store[f"bars_{scan_tf_cfg['tf']}"], scan_bars)
+                aov_top_pct = None  # Persentil hanya tersedia untuk data harian
+        except perf.MemoryBudgetExceeded as e:
+            st.error(f"⚠️ Melebihi budget memori: {e}. Perpendek periode scan.")
+            target_df = df.iloc[:0]
+
+        # --- Filtering (+ Price Context) ---
+        scan_detector = detector if det_cfg['col'] in target_df.columns else 'ratio'
+        suspects = engine.screen_anomaly(target_df, anomaly_mode, min_value, PRICE_CONDITION_LABELS[price_condition], aov_top_pct=aov_top_pct, detector=scan_detector)
+        if scan_mode != "📸 Daily Snapshot (Satu Tanggal)":
+            summary = engine.summarize_anomaly_period(suspects)
+
+    tab2_result = suspects if summary is None else summary
+    perf.stop(perf_rec, rows=len(tab2_result))
 
     # --- Display ---
-    if suspects.empty:
+    perf_rec = perf.start('tab2.render', rows=len(tab2_result))
+    if tab2_result.empty:
         st.warning("Tidak ditemukan saham dengan kriteria tersebut.")
     else:
         if scan_mode == "📸 Daily Snapshot (Satu Tanggal)":
             # --- DAILY MODE DISPLAY ---
-            suspects = suspects.sort_values(by='AOV_Ratio', ascending=False)
-            
-            # Hitung Conviction Score Simple
-            suspects['Conviction_Score'] = np.where(
-                anomaly_type == "🐋 Whale Signal (High AOV)",
-                (suspects['AOV_Ratio'] / 4.0) * 100,  # Whale Logic
-                ((0.6 - suspects['AOV_Ratio']) / 0.6) * 100 # Split Logic
-            )
-            suspects['Conviction_Score'] = suspects['Conviction_Score'].clip(0, 99)
+            # Sortir + Conviction Score Simple
+            suspects = engine.add_conviction_score(suspects, anomaly_mode, detector)
 
             col_met1, col_met2 = st.columns(2)
             col_met1.metric("Saham Ditemukan", len(suspects))
@@ -467,10 +674,10 @@ with tab2:
             desired_order = [
                 'Stock Code', 'Company Name', 'Sector', 'Close', 'Change %', 
                 'Frequency', 'Volume', 'Value', 'Avg_Order_Volume', 
-                'AOV_Ratio', 'Conviction_Score'
+                'AOV_Ratio', 'AOV_RobustZ' if detector == 'robust' else None, 'Conviction_Score'
             ]
             display_cols = [col for col in desired_order if col in suspects.columns]
-            display_df = suspects[display_cols].copy()
+            display_df = suspects[display_cols]
 
             # Styling
             styled_df = display_df.style
@@ -503,6 +710,7 @@ with tab2:
                 'Value': 'Rp {:,.0f}',
                 'Avg_Order_Volume': '{:,.0f}',
                 'AOV_Ratio': '{:.2f}x',
+                'AOV_RobustZ': '{:+.1f}',
                 'Conviction_Score': '{:.0f}%'
             })
 
@@ -521,6 +729,7 @@ with tab2:
                     'Value': st.column_config.Column("Value"),
                     'Avg_Order_Volume': st.column_config.Column("Avg Lot"),
                     'AOV_Ratio': st.column_config.Column("AOV Ratio"),
+                    'AOV_RobustZ': st.column_config.Column("Robust Z"),
                     'Conviction_Score': st.column_config.Column("Conviction")
                 },
                 hide_index=True
@@ -528,18 +737,7 @@ with tab2:
 
         else:
             # === PERIOD MODE DISPLAY (SUMMARY) ===
-            st.info(f"📊 Statistik Akumulasi selama **{period_days} hari terakhir** (Fase: {price_condition})")
-            
-            summary = suspects.groupby(['Stock Code', 'Company Name']).agg(
-                Total_Signals=('Last Trading Date', 'count'),
-                Last_Signal=('Last Trading Date', 'max'),
-                Avg_AOV_Ratio=('AOV_Ratio', 'mean'),
-                Avg_Value=('Value', 'mean'),
-                Latest_Close=('Close', 'last'),
-                Avg_Change=('Change %', 'mean')
-            ).reset_index()
-
-            summary = summary.sort_values(by='Total_Signals', ascending=False).head(50)
+            st.info(f"📊 Statistik Akumulasi selama **{period_label}** (Fase: {price_condition})")
 
             col_p1, col_p2 = st.columns(2)
             col_p1.metric("Emiten Terdeteksi", len(summary))
@@ -567,6 +765,48 @@ with tab2:
                 hide_index=True
             )
 
+    perf.stop(perf_rec)
+
+    # --- Screen Kustom: rule deklaratif (engine.NAMED_SCREENS / rules.py), semua screen dalam satu pass ---
+    with st.expander("🧩 Screen Kustom (Rule)"):
+        st.caption(f"Alias kolom: {', '.join(rules.FIELDS)} | Parameter: {', '.join(engine.SCREEN_PARAMS)} | Contoh: `aov >= 2 and value >= 5e9 and -2 <= chg <= 2`")
+        c_rule1, c_rule2 = st.columns([2, 1])
+        named_screens = c_rule1.multiselect("Screen Bernama", list(engine.NAMED_SCREENS), default=['whale', 'whale_hidden_gem', 'bluechip'], key="rule_named")
+        rule_days = c_rule2.selectbox("Data", [1, 5, 10, 20, 60], index=0, format_func=lambda x: "Tanggal terakhir" if x == 1 else f"{x} hari kerja terakhir", key="rule_days")
+        custom_rules_text = st.text_area("Screen Tambahan (satu per baris, `nama: ekspresi`)", "", key="rule_custom", placeholder="asing_masuk: foreign > 0 and aov >= 1.5")
+        score_rule = st.text_input("Score (urutkan hasil)", engine.SCREEN_SCORE, key="rule_score")
+
+        try:
+            rule_screens = {name: engine.NAMED_SCREENS[name] for name in named_screens}
+            rule_screens.update(rules.parse_rule_lines(custom_rules_text))
+            if not rule_screens:
+                st.info("Pilih atau tulis minimal satu screen.")
+            else:
+                with perf.stage('tab2.rules') as rec:
+                    if rule_days == 1:
+                        rule_df = engine.select_window(df, date=max_date, panel=panel)
+                    else:
+                        rule_df = engine.select_window(df, start_date=engine.period_start(max_date, rule_days), panel=panel)
+                    screen_masks, screen_scores = engine.run_screens(rule_df, rule_screens, score_rule or None)
+                    rec['rows'] = len(rule_df)
+                st.dataframe(engine.summarize_screens(rule_df, screen_masks), use_container_width=True, hide_index=True)
+
+                shown_screen = st.selectbox("Tampilkan Hasil", list(rule_screens), key="rule_show")
+                hits = engine.screen_hits(rule_df, screen_masks[shown_screen], screen_scores)
+                hit_cols = [c for c in ['Stock Code', 'Company Name', 'Last Trading Date', 'Close', 'Change %', 'Value', 'AOV_Ratio', 'AOV_RobustZ', 'Value_Ratio', 'Net Foreign', 'Score'] if c in hits.columns]
+                st.dataframe(
+                    hits[hit_cols].head(200).style.format({
+                        'Last Trading Date': '{:%d %b %Y}', 'Close': 'Rp {:,.0f}', 'Change %': '{:+.2f}%', 'Value': 'Rp {:,.0f}',
+                        'AOV_Ratio': '{:.2f}x', 'AOV_RobustZ': '{:+.1f}', 'Value_Ratio': '{:.2f}x', 'Net Foreign': 'Rp {:,.0f}', 'Score': '{:.0f}'
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+                save_screen_form('rule', {'rule': rule_screens[shown_screen], 'score': score_rule or None, 'period': rule_days if rule_days > 1 else None}, "rule", default_name=shown_screen)
+        except rules.RuleError as e:
+            st.error(f"⚠️ Rule tidak valid: {e}")
+        except perf.MemoryBudgetExceeded as e:
+            st.error(f"⚠️ Melebihi budget memori: {e}. Perpendek periode.")
+
 # ==============================================================================
 # TAB 3: BLUECHIP RADAR (PRO: DUAL MODE + PRICE CONTEXT)
 # ==============================================================================
@@ -578,6 +818,7 @@ with tab3:
         Fitur baru: Bisa scan periode (akumulasi mingguan/bulanan) dan filter kondisi harga.
     </div>
     """, unsafe_allow_html=True)
+    render_saved_screens(('bluechip',), "tab3")
     
     # --- 1. SETTINGS CONTAINER ---
     with st.container(border=True):
@@ -600,71 +841,72 @@ with tab3:
             else:
                 st.markdown("#### ⏳ Rentang Waktu")
                 bc_period = st.selectbox("Analisa Data Terakhir:", [5, 10, 20, 60], index=1, format_func=lambda x: f"{x} Hari Kerja", key="bc_period")
-                bc_start_date = max_date - timedelta(days=bc_period * 1.5)
+                bc_start_date = engine.period_start(max_date, bc_period)
 
         with col_bc2:
             st.markdown("#### 💰 Min. Transaksi (Likuiditas)")
-            min_bc_value = st.number_input("Rp (Miliar)", value=20_000_000_000, step=5_000_000_000, format="%d", help="Saring saham kecil.")
+            min_bc_value = st.number_input("Rp (Miliar)", value=engine.BLUECHIP_MIN_VALUE, step=5_000_000_000, format="%d", help="Saring saham kecil.")
         
         with col_bc3:
             st.markdown("#### 🎯 Sensitivitas AOV")
-            bc_aov_threshold = st.slider("Min. AOV Ratio", 1.1, 2.0, 1.25, 0.05, key="bc_threshold", help="1.25x sudah cukup signifikan untuk Bluechip.")
+            if detector == 'ratio':
+                bc_aov_threshold = st.slider("Min. AOV Ratio", 1.1, 2.0, engine.BLUECHIP_AOV_RATIO, 0.05, key="bc_threshold", help="1.25x sudah cukup signifikan untuk Bluechip.")
+            else:
+                bc_aov_threshold = st.slider("Min. Robust Z", 0.5, 4.0, 1.0, 0.25, key="bc_threshold_robust", help="Z 1.0 = log AOV 1 MAD di atas median 50 hari.")
+
+        # Filter relatif per tanggal (0 = tidak dipakai)
+        with st.expander("📐 Filter Persentil Harian (Top % hari itu)"):
+            col_pct1, col_pct2, col_pct3 = st.columns(3)
+            bc_top_pct = {
+                'AOV_Pct': col_pct1.number_input("Top % AOV", 0.0, 50.0, 0.0, 0.5, key="bc_aov_pct", help="Jika diisi, menggantikan Min. AOV Ratio."),
+                'Value_Pct': col_pct2.number_input("Top % Value Spike", 0.0, 50.0, 0.0, 0.5, key="bc_value_pct"),
+                'Foreign_Pct': col_pct3.number_input("Top % Net Foreign", 0.0, 50.0, 0.0, 0.5, key="bc_foreign_pct")
+            }
+            bc_top_pct = {k: v for k, v in bc_top_pct.items() if v > 0}
 
     # --- 2. PRICE CONTEXT FILTER ---
     st.markdown("#### 📉 Kondisi Harga (Price Context)")
     bc_price_cond = st.selectbox(
         "Filter Kondisi Harga:",
-        [
-            "🔍 SEMUA FASE (Tampilkan Semua)",
-            "💎 HIDDEN GEM (Sideways/Datar)", 
-            "⚓ BOTTOM FISHING (Lagi Turun/Downtrend)",
-            "🚀 EARLY MOVE (Baru Mulai Naik)"
-        ],
+        list(PRICE_CONDITION_LABELS),
         key="bc_price_cond"
     )
+    save_screen_form('bluechip', {
+        'min_value': float(min_bc_value), 'aov_threshold': float(bc_aov_threshold), 'price_condition': PRICE_CONDITION_LABELS[bc_price_cond],
+        'period': bc_period if bc_scan_mode != "📸 Daily Snapshot (Harian)" else None,
+        'top_pct': bc_top_pct, 'detector': detector
+    }, "tab3")
 
-    # --- 3. DATA PREPARATION ---
-    if bc_scan_mode == "📸 Daily Snapshot (Harian)":
-        df_bc = df[df['Last Trading Date'] == bc_date].copy()
-    else:
-        df_bc = df[df['Last Trading Date'] >= bc_start_date].copy()
+    # --- 3. PERIOD SCANNER: counter kumulatif (None = perlu jalur filter) ---
+    perf_rec = perf.start('tab3.filter')
+    bc_summary = None
+    if bc_scan_mode != "📸 Daily Snapshot (Harian)":
+        bc_summary = engine.period_bluechip_summary(prefix, bc_start_date, min_bc_value, bc_aov_threshold, PRICE_CONDITION_LABELS[bc_price_cond], top_pct=bc_top_pct, detector=detector)
 
-    # --- 4. DATA ENRICHMENT (CEK KOLOM) ---
-    # Net Foreign
-    if 'Net Foreign' not in df_bc.columns:
-        if 'Foreign Buy' in df_bc.columns and 'Foreign Sell' in df_bc.columns:
-            df_bc['Net Foreign'] = df_bc['Foreign Buy'] - df_bc['Foreign Sell']
-        else:
-            df_bc['Net Foreign'] = 0 
-
-    # Value Ratio (Spike Uang Masuk)
-    if 'Value_Ratio' not in df_bc.columns:
-        df_bc['Value_Ratio'] = 0 
-
-    # --- 5. FILTERING LOGIC ---
-    # Filter Utama: Value Besar + AOV agak naik
-    bc_suspects = df_bc[
-        (df_bc['Value'] >= min_bc_value) & 
-        (df_bc['AOV_Ratio'] >= bc_aov_threshold)
-    ]
-
-    # Filter Price Context
-    if not bc_suspects.empty:
-        # VWMA Logic (On the fly check)
-        if 'VWMA_20D' not in bc_suspects.columns:
-             bc_suspects['TP'] = (bc_suspects['High'] + bc_suspects['Low'] + bc_suspects['Close']) / 3
-             bc_suspects['VP'] = bc_suspects['TP'] * bc_suspects['Volume']
-             bc_suspects['VWMA_20D'] = bc_suspects.groupby('Stock Code')['VP'].transform(lambda x: x.rolling(20).sum() / x.rolling(20).sum())
-
-        if bc_price_cond == "💎 HIDDEN GEM (Sideways/Datar)":
-            bc_suspects = bc_suspects[(bc_suspects['Change %'] >= -2.0) & (bc_suspects['Change %'] <= 2.0)]
-        elif bc_price_cond == "⚓ BOTTOM FISHING (Lagi Turun/Downtrend)":
-            bc_suspects = bc_suspects[(bc_suspects['Close'] < bc_suspects['VWMA_20D']) | (bc_suspects['Change %'] < 0)]
-        elif bc_price_cond == "🚀 EARLY MOVE (Baru Mulai Naik)":
-            bc_suspects = bc_suspects[(bc_suspects['Change %'] > 0) & (bc_suspects['Change %'] <= 4.0)]
+    if bc_summary is None:
+        # --- 4. DATA PREPARATION ---
+        try:
+            if bc_scan_mode == "📸 Daily Snapshot (Harian)":
+                df_bc = engine.select_window(df, date=bc_date, panel=panel)
+            else:
+                df_bc = engine.select_window(df, start_date=bc_start_date, panel=panel)
+        except perf.MemoryBudgetExceeded as e:
+            st.error(f"⚠️ Melebihi budget memori: {e}. Perpendek periode scan.")
+            df_bc = df.iloc[:0]
+
+        # --- 5. ENRICHMENT + FILTERING LOGIC ---
+        # Filter Utama: Value Besar + AOV agak naik, lalu Price Context
+        bc_suspects = engine.screen_bluechip(df_bc, min_bc_value, bc_aov_threshold, PRICE_CONDITION_LABELS[bc_price_cond], top_pct=bc_top_pct, detector=detector)
+        if bc_scan_mode != "📸 Daily Snapshot (Harian)":
+            # Total Net Foreign selama periode (Akumulasi Asing), sortir Asing terbesar
+            bc_summary = engine.summarize_bluechip_period(bc_suspects)
+
+    tab3_result = bc_suspects if bc_summary is None else bc_summary
+    perf.stop(perf_rec, rows=len(tab3_result))
 
     # --- 6. DISPLAY RESULTS ---
-    if not bc_suspects.empty:
+    perf_rec = perf.start('tab3.render', rows=len(tab3_result))
+    if not tab3_result.empty:
         
         # === A. TAMPILAN HARIAN ===
         if bc_scan_mode == "📸 Daily Snapshot (Harian)":
@@ -672,7 +914,7 @@ with tab3:
             
             st.success(f"Ditemukan {len(bc_suspects)} Bluechip Potensial (Fase: {bc_price_cond})")
             
-            cols_bc = ['Stock Code', 'Close', 'Change %', 'Net Foreign', 'Value', 'Value_Ratio', 'AOV_Ratio', 'Avg_Order_Volume']
+            cols_bc = ['Stock Code', 'Close', 'Change %', 'Net Foreign', 'Value', 'Value_Ratio', 'AOV_Ratio', 'AOV_RobustZ' if detector == 'robust' else None, 'Avg_Order_Volume']
             valid_cols = [c for c in cols_bc if c in bc_suspects.columns]
             
             styled_bc = bc_suspects[valid_cols].style
@@ -694,7 +936,7 @@ with tab3:
             styled_bc = styled_bc.background_gradient(subset=['AOV_Ratio'], cmap='Blues', vmin=1.0, vmax=2.0)
             
             # Formatting
-            format_dict = {'Close': 'Rp {:,.0f}', 'Change %': '{:+.2f}%', 'Value': 'Rp {:,.0f}', 'Avg_Order_Volume': '{:,.0f}', 'Net Foreign': 'Rp {:,.0f}', 'Value_Ratio': '{:.1f}x', 'AOV_Ratio': '{:.2f}x'}
+            format_dict = {'Close': 'Rp {:,.0f}', 'Change %': '{:+.2f}%', 'Value': 'Rp {:,.0f}', 'Avg_Order_Volume': '{:,.0f}', 'Net Foreign': 'Rp {:,.0f}', 'Value_Ratio': '{:.1f}x', 'AOV_Ratio': '{:.2f}x', 'AOV_RobustZ': '{:+.1f}'}
             styled_bc = styled_bc.format({k: v for k, v in format_dict.items() if k in valid_cols})
 
             st.dataframe(styled_bc, use_container_width=True, hide_index=True)
@@ -703,19 +945,8 @@ with tab3:
         else:
             st.info(f"📊 Statistik Big Caps selama **{bc_period} hari terakhir**. Mencari akumulasi konsisten.")
             
-            # Agregasi Data
-            # Kita hitung Total Net Foreign selama periode tersebut (Akumulasi Asing)
-            summary = bc_suspects.groupby(['Stock Code', 'Company Name']).agg(
-                Freq_Muncul=('Last Trading Date', 'count'),
-                Total_Net_Foreign=('Net Foreign', 'sum'), # Penting: Total Akumulasi Asing
-                Avg_Value=('Value', 'mean'),
-                Avg_AOV_Ratio=('AOV_Ratio', 'mean'),
-                Last_Close=('Close', 'last'),
-                Avg_Change=('Change %', 'mean')
-            ).reset_index()
-            
-            # Sortir berdasarkan Total Net Foreign (Asing Paling Banyak Masuk)
-            summary = summary.sort_values(by='Total_Net_Foreign', ascending=False).head(50)
+            # Agregasi Data (Total Net Foreign periode, urut Asing terbesar)
+            summary = bc_summary
             
             # Metrics
             c1, c2 = st.columns(2)
@@ -757,6 +988,8 @@ with tab3:
     else:
         st.warning(f"Tidak ditemukan Bluechip dengan kriteria: **{bc_price_cond}**.")
 
+    perf.stop(perf_rec)
+
 # ==============================================================================
 # TAB 4: RESEARCH LAB (Backtesting)
 # ==============================================================================
@@ -773,21 +1006,35 @@ with tab4:
         with col_res3:
             min_tx_test = st.number_input("Filter Saham Liquid (Min Rp):", value=500_000_000)
 
+        benchmark_labels = {
+            'market_value': "Pasar (Value-Weighted)",
+            'market_equal': "Pasar (Equal-Weighted)",
+            'sector_value': "Sektor Saham (Value-Weighted)",
+        }
+        benchmark = st.selectbox("Benchmark Excess Return:", engine.BENCHMARKS, format_func=benchmark_labels.get, key="benchmark",
+                                 help="Return sinyal dikurangi return index di tanggal entry-exit yang sama. Bobot = Value transaksi hari sebelumnya.")
+
+        col_stat1, col_stat2 = st.columns(2)
+        stats_mode = col_stat1.toggle("📐 Mode Statistik (Bootstrap & Baseline Acak)", key="stats_mode", help="CI bootstrap mean & win rate, dibandingkan dengan entry acak di tanggal & likuiditas yang sama (universe Min Rp yang sama).")
+        n_resamples = col_stat2.select_slider("Jumlah Resample", [1_000, 2_000, 5_000, 10_000], value=engine.BOOTSTRAP_RESAMPLES, key="stats_resamples", disabled=not stats_mode)
+
         if st.button("🚀 JALANKAN BACKTEST", type="primary", use_container_width=True):
             with st.spinner("Sedang memproses data historis..."):
-                df_test = df.sort_values(['Stock Code', 'Last Trading Date']).copy()
-                
-                # Definisi Sinyal MA50
+                perf_rec = perf.start('tab4.backtest', rows=len(df))
+                # df sudah urut Stock Code & tanggal: sinyal = mask, forward return hanya untuk baris sinyal
+                whale_mask, split_mask = engine.anomaly_masks(df, detector, whale_key='screener_whale')
                 if test_mode == "Whale (AOV Tinggi)":
-                    df_test['Signal'] = (df_test['AOV_Ratio'] >= 2.0) & (df_test['Value'] >= min_tx_test)
+                    signal_mask = whale_mask & (df['Value'] >= min_tx_test)
                 else:
-                    df_test['Signal'] = (df_test['AOV_Ratio'] <= 0.6) & (df_test['AOV_Ratio'] > 0) & (df_test['Value'] >= min_tx_test)
+                    signal_mask = split_mask & (df['Value'] >= min_tx_test)
                 
-                # Hitung Forward Return
-                for d in hold_days:
-                    df_test[f'Return_{d}D'] = df_test.groupby('Stock Code')['Close'].transform(lambda x: x.shift(-d) / x - 1)
-                
-                signals = df_test[df_test['Signal']].copy()
+                try:
+                    signals = engine.backtest_signals(prefix, signal_mask, hold_days, market, benchmark)
+                except perf.MemoryBudgetExceeded as e:
+                    st.error(f"⚠️ Melebihi budget memori: {e}. Perketat filter Min Rp.")
+                    signals = df.iloc[:0]
+                perf.stop(perf_rec)
+                perf_rec = perf.start('tab4.render', rows=len(signals))
                 
                 if signals.empty:
                     st.warning("Tidak ditemukan sinyal historis dengan filter ini.")
@@ -801,17 +1048,59 @@ with tab4:
                         
                         avg_ret = valid_signals[col_name].mean() * 100
                         win_rate = (valid_signals[col_name] > 0).mean() * 100
+                        excess = valid_signals[f'Excess_{d}D'].dropna()
                         
                         with stats_cols[idx]:
                             st.markdown(f"#### Simpan {d} Hari")
                             st.metric("Rata-rata Profit", f"{avg_ret:+.2f}%")
                             st.metric("Win Rate (Peluang Naik)", f"{win_rate:.1f}%")
+                            st.metric(f"Excess vs {benchmark_labels[benchmark]}", f"{excess.mean() * 100:+.2f}%",
+                                      delta=f"Beat rate {(excess > 0).mean() * 100:.1f}%", delta_color="off")
                             
-                            fig_hist = px.histogram(valid_signals, x=col_name, nbins=50, title=f"Distribusi Profit {d} Hari",
-                                                  labels={col_name: "Return"}, color_discrete_sequence=['#2962ff'])
+                            # Bin dihitung di server (engine.return_histogram): browser hanya menerima 50 bar
+                            hist = engine.return_histogram(valid_signals[col_name])
+                            fig_hist = go.Figure(go.Bar(
+                                x=(hist['Bin_Left'] + hist['Bin_Right']) / 2, y=hist['Count'],
+                                width=hist['Bin_Right'] - hist['Bin_Left'], marker_color='#2962ff',
+                                customdata=hist[['Bin_Left', 'Bin_Right', 'Bin_Mean']].to_numpy(),
+                                hovertemplate="Return %{customdata[0]:.2%} s.d. %{customdata[1]:.2%}<br>Sinyal: %{y}<br>Rata-rata: %{customdata[2]:.2%}<extra></extra>"
+                            ))
+                            fig_hist.update_layout(title=f"Distribusi Profit {d} Hari", xaxis_title="Return", yaxis_title="count", bargap=0)
                             fig_hist.add_vline(x=0, line_dash="dash", line_color="red")
                             st.plotly_chart(fig_hist, use_container_width=True)
 
+                    if stats_mode:
+                        st.markdown("#### 📐 Signifikansi vs Entry Acak")
+                        with perf.stage('tab4.significance', rows=len(signals)) as rec:
+                            try:
+                                liquid_mask = (df['Value'] >= min_tx_test).to_numpy()
+                                significance = engine.signal_significance(prefix, signal_mask.to_numpy(), liquid_mask, hold_days, n_resamples=n_resamples)
+                            except perf.MemoryBudgetExceeded as e:
+                                st.error(f"⚠️ Melebihi budget memori: {e}. Kurangi jumlah resample.")
+                                significance = None
+                            rec['resamples'] = n_resamples
+
+                        if significance is not None:
+                            def fmt_ci(row, col, lo, hi, signed=True):
+                                # "+1.23% [+0.50%, +2.01%]"; sinyal < 2 -> CI tidak ada
+                                if pd.isna(row[col]):
+                                    return "-"
+                                spec = '+.2f' if signed else '.1f'
+                                return f"{row[col]*100:{spec}}% [{row[lo]*100:{spec}}%, {row[hi]*100:{spec}}%]"
+
+                            rows = significance.to_dict('records')
+                            st.dataframe(pd.DataFrame({
+                                'Simpan': [f"{r['Hold_Days']} Hari" for r in rows],
+                                'Sinyal': [r['Signals'] for r in rows],
+                                'Mean Sinyal (CI 95%)': [fmt_ci(r, 'Mean', 'Mean_Lo', 'Mean_Hi') for r in rows],
+                                'Mean Acak (95%)': [fmt_ci(r, 'Random_Mean', 'Random_Mean_Lo', 'Random_Mean_Hi') for r in rows],
+                                'p Mean': [r['P_Mean'] for r in rows],
+                                'Win Rate (CI 95%)': [fmt_ci(r, 'Win_Rate', 'Win_Lo', 'Win_Hi', signed=False) for r in rows],
+                                'Win Acak': [r['Random_Win_Rate'] * 100 for r in rows],
+                                'p Win': [r['P_Win'] for r in rows],
+                            }).style.format({'p Mean': '{:.3f}', 'p Win': '{:.3f}', 'Win Acak': '{:.1f}%'}, na_rep='-'), use_container_width=True, hide_index=True)
+                            st.caption(f"{n_resamples:,} resample · baseline = saham acak di tanggal & strata Value (½ dekade) yang sama dengan tiap sinyal · p dua arah (< 0.05 = beda nyata dari acak)")
+
                     st.markdown("#### 🏆 Top Gainers (Contoh Sinyal Sukses)")
                     sort_col = f'Return_{hold_days[0]}D'
                     top_signals = signals.dropna(subset=[sort_col]).sort_values(sort_col, ascending=False).head(10)
@@ -826,3 +1115,34 @@ with tab4:
                         }).background_gradient(subset=[f'Return_{d}D' for d in hold_days], cmap='RdYlGn'),
                         use_container_width=True
                     )
+                perf.stop(perf_rec)
+
+# ==============================================================================
+# 5. PERF PANEL (Opsional)
+# ==============================================================================
+# Time-to-first-render: render pertama proses ini (sejak boot) & render pertama tiap session
+if perf.once('first_render'):
+    perf.record({'stage': 'boot.first_render', 'wall_ms': (time.time() - perf.boot_ts()) * 1000})
+if not st.session_state.get('perf_first_render'):
+    st.session_state['perf_first_render'] = True
+    perf.record({'stage': 'session.first_render', 'wall_ms': (time.time() - perf_run.started) * 1000})
+
+if st.sidebar.toggle("⏱️ Perf Panel", key="perf_panel", help="Waktu per stage pipeline untuk rerun ini. Stage cache (load/features) hanya muncul saat cache miss."):
+    perf_df = pd.DataFrame(perf_run.records)
+    if perf_df.empty:
+        st.sidebar.info("Belum ada stage tercatat.")
+    else:
+        # boot.* / session.* = durasi sejak boot / awal rerun, bukan stage -> tidak ikut dijumlah
+        is_stage = ~perf_df['stage'].str.startswith(('boot.', 'session.'))
+        st.sidebar.metric("Total Rerun", f"{perf_df.loc[is_stage, 'wall_ms'].sum():,.0f} ms")
+        st.sidebar.dataframe(
+            perf_df[['stage', 'wall_ms', 'rows', 'mem_delta_mb']].style.format({'wall_ms': '{:,.1f}', 'rows': '{:,.0f}', 'mem_delta_mb': '{:+.1f}'}, na_rep='-'),
+            use_container_width=True,
+            hide_index=True
+        )
+        budget = perf.mem_budget_bytes()
+        st.sidebar.caption(
+            f"RSS: {perf.rss_bytes()/1e6:,.0f} MB | Peak rerun: {perf_run.peak_rss/1e6:,.0f} MB "
+            f"(+{(perf_run.peak_rss - perf_run.rss_start)/1e6:,.1f}) | Alokasi terbesar: {perf_run.peak_alloc/1e6:,.1f} MB"
+            f" / budget {'-' if budget is None else f'{budget/1e6:,.0f} MB'} | Log JSON: env `{perf.PERF_LOG_ENV}`"
+        )
@@ -0,0 +1,292 @@
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# DATASTORE: Versi feature set di disk (satu file .npy per kolom, dibaca via memory-map)
+# Ditulis worker.py, dibaca session app.py (env FREQ_STORE_DIR)
+#
+#   <store>/CURRENT                    -> id versi terbaru (diganti atomik via os.replace)
+#   <store>/<versi>/manifest.json      -> kolom, dtype, kategori string per tabel
+#   <store>/<versi>/<tabel>/<i>.npy
+#   <store>/<versi>/arrays/<i>.npy     -> index turunan (engine.index_arrays), tanpa dibangun ulang di session
+#   <store>/ledger/manifest.json       -> segmen ledger sinyal (append-only, lintas versi)
+#   <store>/ledger/seg-<n>/<i>.npy
+# Tanpa worker (app.py / api_server.py menghitung sendiri) ledger tetap dipersist di <FREQ_LEDGER_DIR>/ledger
+# ==============================================================================
+STORE_DIR_ENV = 'FREQ_STORE_DIR'
+LEDGER_DIR_ENV = 'FREQ_LEDGER_DIR'
+KEEP_VERSIONS = 3
+STALE_TMP_SECONDS = 3600
+LEDGER_DIR = 'ledger'
+
+
+def store_dir():
+    return os.environ.get(STORE_DIR_ENV)
+
+
+def ledger_root():
+    # Root ledger mode non-worker (default direktori temp): riwayat sinyal bertahan saat proses restart
+    return os.environ.get(LEDGER_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'freq-ledger')
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _encode(series):
+    # (array, meta kolom) -> array numerik yang bisa di-memory-map
+    dtype = series.dtype
+    if isinstance(dtype, pd.PeriodDtype):
+        return series.array.asi8, {'kind': 'period', 'dtype': str(dtype)}
+    if pd.api.types.is_datetime64_dtype(dtype):
+        return series.to_numpy().view('int64'), {'kind': 'datetime', 'dtype': str(dtype)}
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return series.to_numpy(), {'kind': 'array'}
+    # String / object: kode int32 + daftar nilai unik di manifest
+    codes, uniques = pd.factorize(series)
+    return codes.astype(np.int32), {'kind': 'codes', 'values': [str(v) for v in uniques]}
+
+
+def _decode(arr, meta):
+    kind = meta['kind']
+    if kind == 'period':
+        return pd.arrays.PeriodArray(np.asarray(arr), dtype=pd.api.types.pandas_dtype(meta['dtype']))
+    if kind == 'datetime':
+        return arr.view(meta['dtype'])
+    if kind == 'codes':
+        # Kode -1 (NaN) menunjuk elemen terakhir = None
+        return np.asarray(meta['values'] + [None], dtype=object)[arr]
+    return arr
+
+
+def write_atomic(path, text):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _write_table(path, frame):
+    # Satu .npy per kolom -> daftar meta kolom untuk manifest
+    os.makedirs(path)
+    columns = []
+    for i, col in enumerate(frame.columns):
+        arr, meta = _encode(frame[col])
+        np.save(os.path.join(path, f'{i}.npy'), np.ascontiguousarray(arr))
+        columns.append({'name': col, **meta})
+    return {'rows': len(frame), 'columns': columns}
+
+
+def _read_table(path, table):
+    data = {}
+    for i, meta in enumerate(table['columns']):
+        # rows bisa < panjang file (segmen ledger yang ekornya dipotong)
+        arr = np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')[:table['rows']]
+        data[meta['name']] = _decode(arr, meta)
+    return pd.DataFrame(data, copy=False)
+
+
+def _write_arrays(path, arrays):
+    # Array numerik -> .npy (memory-map); array string (daftar saham / sektor, kecil) -> langsung di manifest
+    os.makedirs(path)
+    entries = []
+    for i, (name, arr) in enumerate(arrays.items()):
+        arr = np.asarray(arr)
+        if arr.dtype.kind in 'OUS':
+            entries.append({'name': name, 'kind': 'strings', 'values': [None if pd.isna(v) else str(v) for v in arr]})
+        else:
+            np.save(os.path.join(path, f'{i}.npy'), np.ascontiguousarray(arr))
+            entries.append({'name': name, 'kind': 'array'})
+    return entries
+
+
+def load_arrays(root, version):
+    # {nama: array} index turunan versi ini; {} untuk versi yang dipublikasikan tanpa arrays
+    manifest = read_manifest(root, version)
+    arrays = {}
+    for i, entry in enumerate(manifest.get('arrays', [])):
+        if entry['kind'] == 'strings':
+            arrays[entry['name']] = np.asarray(entry['values'], dtype=object)
+        else:
+            arrays[entry['name']] = np.load(os.path.join(root, version, 'arrays', f'{i}.npy'), mmap_mode='r')
+    return arrays
+
+
+def publish(root, version, tables, info=None, keep=KEEP_VERSIONS, arrays=None):
+    # Tulis ke direktori sementara, rename ke <versi>, lalu ganti CURRENT (pembaca tidak pernah lihat versi setengah jadi)
+    os.makedirs(root, exist_ok=True)
+    final = os.path.join(root, version)
+    if not os.path.isdir(final):
+        tmp = os.path.join(root, f'.tmp-{version}-{os.getpid()}')
+        shutil.rmtree(tmp, ignore_errors=True)
+        manifest = {'version': version, 'published_at': time.time(), 'info': info or {}, 'tables': {}}
+        for name, frame in tables.items():
+            manifest['tables'][name] = _write_table(os.path.join(tmp, name), frame)
+        if arrays:
+            manifest['arrays'] = _write_arrays(os.path.join(tmp, 'arrays'), arrays)
+        write_atomic(os.path.join(tmp, 'manifest.json'), json.dumps(manifest))
+        os.rename(tmp, final)
+
+    write_atomic(os.path.join(root, 'CURRENT'), version)
+    prune(root, keep)
+    return final
+
+
+def prune(root, keep=KEEP_VERSIONS):
+    # Hapus versi lama; session yang masih memegang mmap versi lama tetap aman (file unlinked tetap terbaca)
+    current = current_version(root)
+    now = time.time()
+    versions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        if name.startswith('.tmp-'):
+            if now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        elif name != current:
+            versions.append((os.path.getmtime(path), path))
+    for _, path in sorted(versions, reverse=True)[max(keep - 1, 0):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_manifest(root, version):
+    with open(os.path.join(root, version, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def load(root, version):
+    # {nama tabel: DataFrame} dengan kolom numerik langsung di atas memory-map (read-only)
+    manifest = read_manifest(root, version)
+    return {name: _read_table(os.path.join(root, version, name), table) for name, table in manifest['tables'].items()}
+
+
+# ==============================================================================
+# SIGNAL LEDGER (append-only): satu segmen per refresh berisi event tanggal baru + tanggal terakhir sebelumnya
+# (diekstrak ulang, bisa parsial saat ditulis; segmen lama dipotong sebelum tanggal itu lewat rows di manifest)
+# Ledger ditulis ulang dari data saat ini kalau kode fitur berubah atau corporate action di window
+# berubah; event yang sudah keluar dari window sumber tidak memicu tulis ulang
+# ==============================================================================
+def read_ledger_manifest(root):
+    try:
+        with open(os.path.join(root, LEDGER_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _corp_action_records(corp_actions):
+    return [[str(code), str(date), float(factor)] for code, date, factor in
+            corp_actions[['Stock Code', 'Last Trading Date', 'Factor']].itertuples(index=False)]
+
+
+def _ledger_compatible(manifest, code, records, window_start):
+    # Event di tanggal pertama window / sebelumnya sudah tidak terdeteksi & tidak mengubah harga adjusted di window
+    if manifest.get('code') != code:
+        return False
+    start = str(pd.Timestamp(window_start))
+    return [r for r in manifest['corp_actions'] if r[1] > start] == records
+
+
+def append_ledger(root, events, code, corp_actions, window_start):
+    # events: seluruh event yang diketahui proses ini (urut tanggal), code: engine.code_version(),
+    # corp_actions & window_start: corporate action & tanggal pertama data saat ini. Return jumlah baris yang ditulis
+    ledger_dir = os.path.join(root, LEDGER_DIR)
+    os.makedirs(ledger_dir, exist_ok=True)
+    records = _corp_action_records(corp_actions)
+    # Lock: app.py & api_server.py (mode non-worker) bisa berbagi root ledger yang sama
+    with open(os.path.join(ledger_dir, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        manifest = read_ledger_manifest(root)
+        if manifest is None or not _ledger_compatible(manifest, code, records, window_start):
+            manifest = {'code': code, 'corp_actions': records, 'segments': []}
+        segments = json.dumps(manifest['segments'])
+        if manifest['segments']:
+            last_date = pd.Timestamp(manifest['segments'][-1]['last_date'])
+            if last_date >= pd.Timestamp(window_start):
+                # Tanggal terakhir masih di data: event tanggal itu diganti (bisa masih parsial saat ditulis)
+                events = events[events['Last Trading Date'] >= last_date]
+                events = _replace_last_date(ledger_dir, manifest, last_date, events)
+            else:
+                events = events[events['Last Trading Date'] > last_date]
+        changed = manifest['corp_actions'] != records or json.dumps(manifest['segments']) != segments
+        manifest['corp_actions'] = records
+        if events.empty:
+            if changed or not manifest['segments']:
+                _commit_ledger(ledger_dir, manifest)  # Tanpa event baru: catat kode & corporate action saja
+            return 0
+        _append_segment(ledger_dir, manifest, events)
+        _commit_ledger(ledger_dir, manifest)
+    return len(events)
+
+
+def _replace_last_date(ledger_dir, manifest, last_date, events):
+    # Segmen urut tanggal -> event tanggal terakhir = ekor segmen terakhir, cukup dipotong di manifest (rows),
+    # file segmen tidak ditulis ulang. Return event yang perlu di-append; kosong kalau tidak ada yang berubah
+    seg = manifest['segments'][-1]
+    stored = _read_table(os.path.join(ledger_dir, seg['name']), seg)
+    keep = int((stored['Last Trading Date'] < last_date).sum())
+    if len(events) == len(stored) - keep and (events['Last Trading Date'] == last_date).all():
+        tail = stored.iloc[keep:].reset_index(drop=True)
+        if tail.equals(events.reset_index(drop=True).astype(tail.dtypes.to_dict())):
+            return events.iloc[:0]
+    if keep:
+        seg.update(rows=keep, last_date=str(stored['Last Trading Date'].iloc[keep - 1]))
+    else:
+        manifest['segments'].pop()
+    return events
+
+
+def _append_segment(ledger_dir, manifest, events):
+    seq = max((int(name.split('-')[1]) for name in os.listdir(ledger_dir) if name.startswith('seg-')), default=0) + 1
+    name = f'seg-{seq:06d}'
+    tmp = os.path.join(ledger_dir, f'.tmp-{name}-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    table = _write_table(tmp, events)
+    os.rename(tmp, os.path.join(ledger_dir, name))
+    dates = events['Last Trading Date']
+    manifest['segments'].append({'name': name, **table, 'first_date': str(dates.min()), 'last_date': str(dates.max())})
+
+
+def _commit_ledger(ledger_dir, manifest):
+    write_atomic(os.path.join(ledger_dir, 'manifest.json'), json.dumps(manifest))
+    # Segmen yang tidak lagi ada di manifest (ledger ditulis ulang) dihapus
+    live = {seg['name'] for seg in manifest['segments']}
+    for name in os.listdir(ledger_dir):
+        if name.startswith('seg-') and name not in live:
+            shutil.rmtree(os.path.join(ledger_dir, name), ignore_errors=True)
+
+
+def load_ledger(root):
+    # Seluruh event ledger (gabungan segmen, urut tanggal); None kalau ledger belum ada
+    manifest = read_ledger_manifest(root)
+    if not manifest or not manifest['segments']:
+        return None
+    frames = [_read_table(os.path.join(root, LEDGER_DIR, seg['name']), seg) for seg in manifest['segments']]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_ledger_state(root, code):
+    # Start proses non-worker: (event, corporate action) ledger di disk, None kalau belum ada / kode fitur berbeda
+    manifest = read_ledger_manifest(root)
+    if not manifest or manifest.get('code') != code:
+        return None
+    events = load_ledger(root)
+    if events is None:
+        return None
+    corp_actions = pd.DataFrame(manifest['corp_actions'], columns=['Stock Code', 'Last Trading Date', 'Factor'])
+    corp_actions['Last Trading Date'] = pd.to_datetime(corp_actions['Last Trading Date'])
+    return events, corp_actions
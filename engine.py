@@ -0,0 +1,1511 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import perf
+import rules
+
+# ==============================================================================
+# ENGINE: Logika perhitungan & filter tanpa Streamlit
+# Dipakai bersama oleh app.py (UI) dan api_server.py (HTTP API)
+# ==============================================================================
+
+NUMERIC_COLS = ['Close', 'Open Price', 'High', 'Low', 'Volume', 'Frequency', 'Avg_Order_Volume', 'MA50_AOVol', 'Value', 'Change', 'Previous']
+
+# Threshold standar MA50
+WHALE_RATIO = 1.5          # Whale_Signal (chart & card Deep Dive)
+SPLIT_RATIO = 0.6          # Split_Signal
+SCREENER_WHALE_RATIO = 2.0 # Screener & Research Lab (lebih ketat)
+
+# Robust detector: rolling median & MAD Avg_Order_Volume (tahan terhadap 1 crossing raksasa)
+ROBUST_WINDOW = 50
+ROBUST_MIN_PERIODS = 10
+MAD_SCALE = 1.4826  # MAD -> setara standar deviasi (distribusi normal)
+
+# Detektor anomali AOV: kolom + threshold masing-masing
+# whale/split: sinyal chart, screener_whale: screener & backtest (lebih ketat)
+# whale_max/split_min: skala Conviction Score (sama di kartu Deep Dive, Screener & ledger)
+# whale_signal/split_signal: kolom bool sinyal chart (di-precompute di compute_features)
+DETECTORS = {
+    'ratio': {'col': 'AOV_Ratio', 'whale': WHALE_RATIO, 'split': SPLIT_RATIO, 'screener_whale': SCREENER_WHALE_RATIO,
+              'whale_max': 5.0, 'split_min': 0.0,
+              'whale_signal': 'Whale_Signal', 'split_signal': 'Split_Signal'},
+    'robust': {'col': 'AOV_RobustZ', 'whale': 2.0, 'split': -1.5, 'screener_whale': 3.0,
+               'whale_max': 8.0, 'split_min': -4.0,
+               'whale_signal': 'Whale_Signal_Robust', 'split_signal': 'Split_Signal_Robust'}
+}
+
+# Corporate action (split / reverse split / rights issue)
+CA_PREVIOUS_TOL = 0.05       # Previous hari ini vs Close kemarin beda > 5% -> harga referensi disesuaikan bursa
+CA_JUMP_LOW, CA_JUMP_HIGH = 0.6, 1.6  # Lompatan harga di luar batas ARA/ARB (+-35%)
+CA_SPLIT_RATIOS = np.array([1 / 20, 1 / 10, 1 / 5, 1 / 4, 1 / 3, 1 / 2, 2, 3, 4, 5, 10, 20])
+CA_SNAP_TOL = 0.15           # Lompatan harga harus dekat salah satu rasio split
+CA_VOLUME_DAYS = 10          # Konfirmasi: rata-rata volume N hari sesudah vs sebelum event
+
+# Kunci kondisi harga (label UI dipetakan ke kunci ini)
+PRICE_CONDITIONS = ('all', 'hidden_gem', 'bottom_fishing', 'early_move')
+ANOMALY_MODES = ('whale', 'split')
+
+# Kriteria Bluechip default (Bluechip Radar & ledger sinyal)
+BLUECHIP_MIN_VALUE = 20_000_000_000
+BLUECHIP_AOV_RATIO = 1.25
+
+# ==============================================================================
+# RULE SCREEN & SCORE (bahasa rules.py, dikompilasi sekali jadi ekspresi NumPy)
+# x = kolom detektor aktif (AOV_Ratio / AOV_RobustZ); threshold detektor masuk sebagai parameter
+# ==============================================================================
+PRICE_RULES = {
+    'hidden_gem': '-2 <= chg <= 2',               # Sideways/datar
+    'early_move': '0 < chg <= 4',                 # Baru mulai naik
+    'bottom_fishing': 'close < vwma or chg < 0',  # Di bawah VWMA 20 / lagi turun
+}
+SIGNAL_RULES = {
+    'whale': 'x >= whale',
+    'split': 'x <= split and aov > 0',  # AOV_Ratio > 0 = data AOV valid
+}
+CONVICTION_RULES = {
+    'whale': 'clip((x - whale) / (whale_max - whale) * 80 + 20, 0, 99)',
+    'split': 'clip((split - x) / (split - split_min) * 80 + 20, 0, 99)',
+}
+
+# Screen bernama (Screener > Screen Kustom, GET /screen?name=)
+SCREEN_PARAMS = {
+    'whale': WHALE_RATIO, 'split': SPLIT_RATIO, 'screener_whale': SCREENER_WHALE_RATIO, 'robust_whale': 3.0,
+    'whale_max': DETECTORS['ratio']['whale_max'], 'min_value': 1_000_000_000,
+    'bluechip_value': BLUECHIP_MIN_VALUE, 'bluechip_aov': BLUECHIP_AOV_RATIO,
+}
+NAMED_SCREENS = {
+    'whale': 'aov >= screener_whale and value >= min_value',
+    'split': '0 < aov <= split and value >= min_value',
+    'whale_robust': 'aov_z >= robust_whale and value >= min_value',
+    'whale_hidden_gem': f"aov >= screener_whale and value >= min_value and {PRICE_RULES['hidden_gem']}",
+    'whale_early_move': f"aov >= screener_whale and value >= min_value and {PRICE_RULES['early_move']}",
+    'split_early_move': f"0 < aov <= split and value >= min_value and {PRICE_RULES['early_move']}",
+    'bluechip': 'value >= bluechip_value and aov >= bluechip_aov',
+    'bluechip_foreign': 'value >= bluechip_value and aov >= bluechip_aov and foreign > 0',
+    'value_spike': 'value_ratio >= 3 and chg > 0 and value >= min_value',
+}
+SCREEN_SCORE = 'clip((aov - whale) / (whale_max - whale) * 80 + 20, 0, 99)'  # = Conviction whale detektor ratio
+
+
+def preprocess_raw(df):
+    # Preprocessing data mentah hasil read_csv
+    df['Last Trading Date'] = pd.to_datetime(df['Last Trading Date'])
+
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    if 'Change %' not in df.columns:
+        df['Change %'] = np.where(df['Previous'] > 0, (df['Change'] / df['Previous']) * 100, 0)
+
+    if 'Value' not in df.columns or df['Value'].sum() == 0:
+        df['Value'] = df['Close'] * df['Volume'] * 100
+
+    return df
+
+
+def compute_features(df_raw):
+    # Section 3: Global Calculation (MA50 Logic)
+    rows = len(df_raw)
+    with perf.stage('features.sort', rows):
+        # sort_values sudah menghasilkan frame baru, tidak perlu .copy() lagi
+        df = df_raw.sort_values(by=['Stock Code', 'Last Trading Date'])
+
+    # Corporate Action: faktor penyesuaian + Close/Volume/AOV adjusted (sekali per versi data)
+    with perf.stage('features.corp_actions', rows) as rec:
+        adjust_corporate_actions(df)
+        rec['events'] = int((df['CA_Factor'] != 1).sum())
+
+    # A. Pastikan MA50 Ada (dari AOV adjusted)
+    with perf.stage('features.ma50', rows):
+        if 'MA50_AOVol' not in df.columns:
+            df['MA50_AOVol'] = df.groupby('Stock Code')['Adj_AOV'].transform(lambda x: x.rolling(50, min_periods=1).mean())
+        else:
+            # MA50 dari sumber dihitung dari AOV mentah -> hitung ulang hanya untuk saham yang kena corporate action
+            affected = df['Stock Code'].isin(df.loc[df['CA_Factor'] != 1, 'Stock Code'].unique())
+            if affected.any():
+                df.loc[affected, 'MA50_AOVol'] = df.loc[affected].groupby('Stock Code')['Adj_AOV'].transform(lambda x: x.rolling(50, min_periods=1).mean())
+
+    with perf.stage('features.signals', rows):
+        # B. Hitung Ratio Anomali
+        df['AOV_Ratio'] = np.where(df['MA50_AOVol'] > 0, df['Adj_AOV'] / df['MA50_AOVol'], 0)
+
+        # C. Kolom Signal (dipakai di chart Tab 1)
+        df['Whale_Signal'] = df['AOV_Ratio'] >= WHALE_RATIO
+        df['Split_Signal'] = (df['AOV_Ratio'] <= SPLIT_RATIO) & (df['AOV_Ratio'] > 0)
+
+        # D. Net Foreign Calc (Cek ketersediaan kolom dulu)
+        # Sel Foreign Buy/Sell kosong = 0 (sama dengan .sum() yang melewati NaN; prefix-sum tidak ikut NaN)
+        if 'Foreign Buy' in df.columns and 'Foreign Sell' in df.columns:
+            df['Net Foreign'] = (df['Foreign Buy'] - df['Foreign Sell']).fillna(0)
+        else:
+            df['Net Foreign'] = 0
+
+    # E. Value Spike (Money Flow) - Rata-rata Value transaksi 20 hari
+    with perf.stage('features.value_ratio', rows):
+        df['MA20_Value'] = df.groupby('Stock Code')['Value'].transform(lambda x: x.rolling(20, min_periods=1).mean())
+        df['Value_Ratio'] = np.where(df['MA20_Value'] > 0, df['Value'] / df['MA20_Value'], 0)
+
+    # F. Robust Z-Score log AOV (Rolling Median / MAD)
+    with perf.stage('features.robust_z', rows):
+        df['AOV_RobustZ'] = robust_zscore(df, 'Adj_AOV', log=True)
+        # Sinyal robust sebagai kolom bool (1 byte/baris), bukan copy frame tiap rerun
+        whale, split = anomaly_masks(df, 'robust')
+        df['Whale_Signal_Robust'] = whale
+        df['Split_Signal_Robust'] = split
+
+    return df
+
+
+def detect_corporate_actions(df):
+    # df urut Stock Code, tanggal. Faktor harga per baris (1 = tidak ada event):
+    # harga sebelum event x faktor = setara harga sesudah event (split 1:2 -> 0.5)
+    codes = df['Stock Code'].to_numpy()
+    close = df['Close'].to_numpy(dtype=np.float64)
+    n = len(df)
+    same = np.r_[False, codes[1:] == codes[:-1]]
+    prior = np.r_[np.nan, close[:-1]]
+    valid = same & (prior > 0) & (close > 0)
+    factor = np.ones(n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # A. Previous sudah disesuaikan bursa (rights issue, split dengan harga referensi baru)
+        by_prev = np.zeros(n, dtype=bool)
+        if 'Previous' in df.columns:
+            prev = df['Previous'].to_numpy(dtype=np.float64)
+            prev_ratio = prev / prior
+            by_prev = valid & (prev > 0) & (np.abs(prev_ratio - 1) > CA_PREVIOUS_TOL)
+            factor[by_prev] = prev_ratio[by_prev]
+
+        # B. Previous tidak disesuaikan: lompatan harga ~ rasio split + volume bergeser berlawanan arah
+        jump = close / prior
+        rows = np.flatnonzero(valid & ~by_prev & ((jump < CA_JUMP_LOW) | (jump > CA_JUMP_HIGH)))
+        if len(rows):
+            ratio = jump[rows]
+            nearest = CA_SPLIT_RATIOS[np.abs(np.log(ratio[:, None] / CA_SPLIT_RATIOS)).argmin(axis=1)]
+
+            bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+            sid = np.searchsorted(bounds, rows, side='right') - 1
+            cum_vol = np.r_[0.0, np.cumsum(df['Volume'].to_numpy(dtype=np.float64))]
+            lo = np.maximum(rows - CA_VOLUME_DAYS, bounds[sid])
+            hi = np.minimum(rows + CA_VOLUME_DAYS, bounds[sid + 1])
+            vol_before = (cum_vol[rows] - cum_vol[lo]) / (rows - lo)
+            vol_after = (cum_vol[hi] - cum_vol[rows]) / (hi - rows)
+            # Volume minimal bergeser setengah jalan (skala log) ke arah kebalikan rasio harga
+            confirmed = np.abs(np.log(vol_after / vol_before * nearest)) < np.abs(np.log(nearest)) / 2
+            snapped = np.abs(ratio / nearest - 1) <= CA_SNAP_TOL
+            keep = snapped & confirmed
+            factor[rows[keep]] = nearest[keep]
+
+    return factor
+
+
+def adjust_corporate_actions(df):
+    # Tambah kolom in-place: CA_Factor (faktor di baris event), Adj_Factor (kumulatif),
+    # Adj_Close / Adj_Volume / Adj_AOV. Baris terakhir tiap saham selalu faktor 1
+    factor = detect_corporate_actions(df)
+    codes = df['Stock Code'].to_numpy()
+    ends = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True])
+    lengths = np.diff(np.r_[-1, ends])
+    # Faktor kumulatif = produk faktor semua event SESUDAH baris ini (dalam saham yang sama)
+    log_cum = np.cumsum(np.log(factor))
+    adj = np.exp(np.repeat(log_cum[ends], lengths) - log_cum)
+
+    df['CA_Factor'] = factor
+    df['Adj_Factor'] = adj
+    df['Adj_Close'] = df['Close'] * adj
+    df['Adj_Volume'] = df['Volume'] / adj
+    df['Adj_AOV'] = df['Avg_Order_Volume'] / adj
+    return df
+
+
+def corporate_actions(df):
+    # Daftar event terdeteksi (hasil compute_features)
+    events = df.loc[df['CA_Factor'] != 1, ['Stock Code', 'Last Trading Date', 'Close', 'CA_Factor']]
+    return events.rename(columns={'CA_Factor': 'Factor'}).reset_index(drop=True)
+
+
+def adjusted_prices(frame):
+    # OHLC & volume adjusted untuk chart (frame kecil); bar sudah adjusted saat resample
+    if 'Adj_Factor' not in frame.columns:
+        return frame
+    adj = frame['Adj_Factor']
+    return frame.assign(**{
+        'Open Price': frame['Open Price'] * adj, 'High': frame['High'] * adj, 'Low': frame['Low'] * adj,
+        'Close': frame['Adj_Close'], 'Volume': frame['Adj_Volume'], 'Avg_Order_Volume': frame['Adj_AOV']
+    })
+
+
+def robust_zscore(df, col, window=ROBUST_WINDOW, min_periods=ROBUST_MIN_PERIODS, log=False):
+    # Rolling median pandas memakai indexable skiplist (O(log w) per baris)
+    # MAD streaming: rolling median dari |x - median| tiap hari
+    # log=True: z dari log(nilai). AOV miring ke kanan & dibatasi 0 dari bawah -> di skala mentah sisi
+    # bawah hampir tidak pernah mencapai -1.5 MAD (Split robust kosong); di skala log kedua ekor seimbang.
+    # Nilai <= 0 (AOV tidak valid) -> NaN, dilewati rolling median, z = 0
+    x = df[col]
+    if log:
+        x = np.log(x.where(x > 0))
+    med = x.groupby(df['Stock Code']).rolling(window, min_periods=min_periods).median().droplevel(0)
+    dev = (x - med).abs()
+    mad = dev.groupby(df['Stock Code']).rolling(window, min_periods=min_periods).median().droplevel(0)
+    z = np.where(mad > 0, (x - med) / (MAD_SCALE * mad), 0)
+    return np.nan_to_num(z)
+
+
+def rule_params(detector='ratio', whale_key='whale'):
+    # Parameter rule sinyal/score dari config detektor
+    cfg = DETECTORS[detector]
+    return {'whale': cfg[whale_key], 'split': cfg['split'], 'whale_max': cfg['whale_max'], 'split_min': cfg['split_min']}
+
+
+def anomaly_masks(frame, detector='ratio', whale_key='whale'):
+    # (whale_mask, split_mask) sesuai detektor (SIGNAL_RULES)
+    x = frame[DETECTORS[detector]['col']].to_numpy()
+    masks = rules.evaluate(SIGNAL_RULES, frame, rule_params(detector, whale_key), {'x': x})
+    return pd.Series(masks['whale'], index=frame.index), pd.Series(masks['split'], index=frame.index)
+
+
+def signal_config(frame, detector):
+    # Config detektor kalau kolomnya ada di frame (bar mingguan/bulanan hanya punya Ratio)
+    cfg = DETECTORS[detector]
+    return cfg if cfg['col'] in frame.columns else DETECTORS['ratio']
+
+
+def conviction_score(value, detector, mode):
+    # Conviction Score (CONVICTION_RULES): 20% di threshold sinyal, 99% di whale_max / split_min
+    # value skalar (kartu Deep Dive) atau array (Screener, ledger sinyal)
+    return rules.evaluate({mode: CONVICTION_RULES[mode]}, params=rule_params(detector), extra={'x': value})[mode]
+
+
+# ==============================================================================
+# PANEL TANGGAL x SAHAM (Akses per tanggal & per saham tanpa groupby / scan)
+# ==============================================================================
+class Panel:
+    # row_pos[tanggal, saham] = posisi baris di df (-1 = saham tidak trading hari itu)
+    # Array metrik float32 (NaN = kosong) dibentuk saat pertama diminta, sekali per versi data
+    def __init__(self, df):
+        self.df = df
+        # df urut Stock Code -> index saham dari batas blok (tanpa sort string)
+        codes = df['Stock Code'].to_numpy()
+        new_stock = np.r_[True, codes[1:] != codes[:-1]]
+        self.stocks = codes[new_stock]
+        stock_idx = np.cumsum(new_stock) - 1
+        self.dates, date_idx = np.unique(df['Last Trading Date'].to_numpy(), return_inverse=True)
+        self.stock_index = {code: i for i, code in enumerate(self.stocks)}
+        self.row_pos = np.full((len(self.dates), len(self.stocks)), -1, dtype=np.int32)
+        self.row_pos[date_idx, stock_idx] = np.arange(len(df), dtype=np.int32)
+        self.mask = self.row_pos >= 0
+        self._arrays = {}
+
+    # Array index yang dipublikasikan worker (datastore.publish) -> session tidak membangun ulang
+    STATE = ('stocks', 'dates', 'row_pos', 'mask')
+
+    @classmethod
+    def from_state(cls, df, state):
+        panel = _restore(cls, state)
+        panel.df = df
+        panel.stock_index = {code: i for i, code in enumerate(panel.stocks)}
+        panel._arrays = {}
+        return panel
+
+    def array(self, col, dtype=np.float32):
+        key = (col, np.dtype(dtype).str)
+        arr = self._arrays.get(key)
+        if arr is None:
+            arr = np.full(self.row_pos.shape, np.nan, dtype=dtype)
+            arr[self.mask] = self.df[col].to_numpy(dtype=dtype)[self.row_pos[self.mask]]
+            self._arrays[key] = arr
+        return arr
+
+    def date_index(self, date):
+        # Index tanggal di axis panel (-1 = bukan hari trading)
+        date = np.datetime64(pd.Timestamp(date), 'ns')
+        i = np.searchsorted(self.dates, date)
+        return int(i) if i < len(self.dates) and self.dates[i] == date else -1
+
+    def date_rows(self, date=None, start_date=None):
+        # Posisi baris df (urut saham, tanggal) untuk satu tanggal atau sejak start_date
+        if date is not None:
+            i = self.date_index(date)
+            rows = self.row_pos[i] if i >= 0 else self.row_pos[:0].ravel()
+            return rows[rows >= 0]
+        start = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date), 'ns'), side='left')
+        rows = self.row_pos[start:]
+        return np.sort(rows[rows >= 0])
+
+    def cross_section_pct(self, col, date_idx):
+        # Persentil per tanggal (method='max', 100 = tertinggi), satu baris panel per tanggal
+        values = self.array(col, np.float64)[date_idx]
+        order = np.argsort(values, axis=1, kind='stable')  # NaN di ujung kanan
+        ordered = np.take_along_axis(values, order, axis=1)
+        # Rank 'max' = posisi akhir run nilai yang sama (+1), dicari dari kanan ke kiri
+        width = values.shape[1]
+        run_end = np.concatenate([ordered[:, 1:] != ordered[:, :-1], np.ones((len(values), 1), dtype=bool)], axis=1)
+        end_pos = np.where(run_end, np.arange(width), width)
+        end_pos = np.minimum.accumulate(end_pos[:, ::-1], axis=1)[:, ::-1]
+
+        count = (~np.isnan(values)).sum(axis=1, keepdims=True)
+        pct = np.empty(values.shape)
+        np.put_along_axis(pct, order, (end_pos + 1) / np.maximum(count, 1) * 100, axis=1)
+        pct[np.isnan(values)] = np.nan
+        return pct
+
+
+# ==============================================================================
+# CROSS-SECTIONAL PERCENTILE RANK (per Last Trading Date)
+# ==============================================================================
+# Kolom sumber -> kolom persentil (0-100, 100 = tertinggi hari itu)
+RANK_COLS = {'AOV_Ratio': 'AOV_Pct', 'Value_Ratio': 'Value_Pct', 'Net Foreign': 'Foreign_Pct'}
+
+
+# Window rolling fitur harian terpanjang (MA50 AOV, MA20 Value, robust z): dengan min_periods kecil,
+# N baris pertama tiap saham ikut berubah kalau baris sebelumnya keluar dari file sumber (rolling 1 tahun).
+# Robust z = median rolling atas deviasi dari median rolling -> jangkauannya dua window
+ROLLING_WARMUP = max(50, 20, 2 * ROBUST_WINDOW)
+
+
+def stock_first_dates(df):
+    # Tanggal pertama tiap saham (df urut Stock Code, tanggal)
+    codes = df['Stock Code'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return pd.Series(df['Last Trading Date'].to_numpy()[starts], index=codes[starts])
+
+
+def rolloff_until(df, known_first_dates):
+    # Tanggal terakhir yang fitur rolling-nya berubah karena baris awal saham keluar dari data
+    # (tanggal pertama saham maju vs versi sebelumnya), None kalau tidak ada.
+    # Agregat cross-sectional (ranks, breadth) di tanggal <= ini harus dihitung ulang untuk semua saham
+    if known_first_dates is None or known_first_dates.empty:
+        return None
+    codes = df['Stock Code'].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+    starts, ends = bounds[:-1], bounds[1:]
+    dates = df['Last Trading Date'].to_numpy()
+    previous = known_first_dates.reindex(codes[starts]).to_numpy(dtype='datetime64[ns]')
+    lost = previous < dates[starts]  # NaT (saham baru) -> False
+    if not lost.any():
+        return None
+    last_rows = np.minimum(starts + ROLLING_WARMUP, ends) - 1
+    return pd.Timestamp(dates[last_rows[lost]].max())
+
+
+def percentile_ranks(df, known=None, panel=None, stale_until=None):
+    # Ranking hanya untuk tanggal yang barisnya berubah: tanggal baru, saham baru dengan histori lama (merge),
+    # nilai historis yang dikoreksi / baris yang hilang. Tanggal lain dipakai ulang dari known
+    # known: hasil percentile_ranks sebelumnya (index: Stock Code, Last Trading Date; kolom persentil + input RANK_COLS)
+    # stale_until: hasil rolloff_until -> tanggal <= ini di-rank ulang
+    panel = panel if panel is not None else Panel(df)
+    n_dates = len(panel.dates)
+    if known is not None and not known.empty:
+        # Baris df yang belum ada di known / input rank-nya berbeda -> tanggalnya di-rank ulang
+        keys = pd.MultiIndex.from_arrays([df['Stock Code'], df['Last Trading Date']])
+        pos = known.index.get_indexer(keys)
+        same = pos >= 0
+        for col in RANK_COLS:
+            previous = known[col].to_numpy()[pos]
+            current = df[col].to_numpy(dtype=np.float64)
+            same &= (previous == current) | (np.isnan(previous) & np.isnan(current))
+        date_idx = np.searchsorted(panel.dates, df['Last Trading Date'].to_numpy())
+        dirty = np.bincount(date_idx[~same], minlength=n_dates) > 0
+
+        # Baris known yang hilang dari df (jumlah baris per tanggal berbeda)
+        known_dates = known.index.get_level_values('Last Trading Date').to_numpy()
+        known_idx = np.minimum(np.searchsorted(panel.dates, known_dates), n_dates - 1)
+        in_panel = panel.dates[known_idx] == known_dates
+        dirty |= np.bincount(known_idx[in_panel], minlength=n_dates) != panel.mask.sum(axis=1)
+        # Tanggal terakhir versi sebelumnya selalu di-rank ulang (data hari itu bisa masih parsial)
+        dirty |= panel.dates == known_dates.max()
+        if stale_until is not None:
+            dirty |= panel.dates <= np.datetime64(stale_until)
+        known = known[in_panel & ~dirty[known_idx]]
+        new_dates = np.flatnonzero(dirty)
+    else:
+        new_dates = np.arange(n_dates)
+
+    # Sel panel tanggal yang di-rank -> baris df (urutan df dipertahankan)
+    rows = panel.row_pos[new_dates]
+    present = rows >= 0
+    order = np.argsort(rows[present], kind='stable')
+    pos = rows[present][order]
+    ranks = pd.DataFrame(
+        {pct_col: panel.cross_section_pct(col, new_dates)[present][order].astype(np.float32) for col, pct_col in RANK_COLS.items()},
+        index=pd.MultiIndex.from_arrays([df['Stock Code'].to_numpy()[pos], df['Last Trading Date'].to_numpy()[pos]], names=['Stock Code', 'Last Trading Date'])
+    )
+    for col in RANK_COLS:
+        ranks[col] = df[col].to_numpy(dtype=np.float64)[pos]
+
+    if known is None or known.empty:
+        return ranks
+    return pd.concat([known, ranks])
+
+
+def attach_percentile_ranks(df, ranks):
+    # Kolom ditambahkan in-place (join akan meng-copy seluruh frame); kolom input di ranks tidak ikut
+    keys = pd.MultiIndex.from_arrays([df['Stock Code'], df['Last Trading Date']])
+    aligned = ranks.reindex(keys)
+    for col in RANK_COLS.values():
+        df[col] = aligned[col].to_numpy()
+    return df
+
+
+def top_pct_mask(frame, pct_col, top_pct):
+    # "Top 2% hari itu" -> persentil >= 98
+    return frame[pct_col] >= 100 - top_pct
+
+
+# ==============================================================================
+# MULTI-TIMEFRAME BARS (Mingguan / Bulanan)
+# ==============================================================================
+# ma_bars: padanan MA50 harian di timeframe bar (10 minggu / 3 bulan)
+TIMEFRAMES = {
+    'W': {'period': 'W-FRI', 'ma_bars': 10},
+    'M': {'period': 'M', 'ma_bars': 3}
+}
+BAR_AGG = {
+    'Open Price': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last',
+    'Volume': 'sum', 'Frequency': 'sum', 'Value': 'sum', 'Net Foreign': 'sum',
+    'Last Trading Date': 'max', 'Company Name': 'last', 'Sector': 'last'
+}
+
+
+def _resample_rows(rows, timeframe):
+    rows = adjusted_prices(rows)
+    period = rows['Last Trading Date'].dt.to_period(TIMEFRAMES[timeframe]['period'])
+    agg = {k: v for k, v in BAR_AGG.items() if k in rows.columns}
+    bars = rows.groupby([rows['Stock Code'], period.rename('Period')]).agg(agg).reset_index()
+    return bars
+
+
+def resample_bars(df, timeframe, known=None):
+    # df: hasil compute_features (urut Stock Code, tanggal)
+    # known: bar hasil sebelumnya -> hanya bar terakhir (bisa parsial), bar baru & bar awal yang dihitung ulang
+    # Bar yang dimulai sebelum tanggal tertua df dibuang: tanggal tertua keluar dari file sumber (rolling 1 tahun)
+    # -> agregat bar pertama berubah. Data mulai di tengah periode -> bar parsial itu juga selalu dihitung ulang
+    dates = df['Last Trading Date']
+    if known is not None:
+        known = known[known['Period'].dt.start_time >= dates.min()]
+    if known is not None and not known.empty:
+        first_period, last_period = known['Period'].min(), known['Period'].max()
+        known = known[known['Period'] < last_period]
+        rows = df[(dates < first_period.start_time) | (dates >= last_period.start_time)]
+        bars = pd.concat([known, _resample_rows(rows, timeframe)], ignore_index=True)
+        bars = bars.sort_values(['Stock Code', 'Period'], ignore_index=True)
+    else:
+        bars = _resample_rows(df, timeframe)
+
+    # AOV bar = total lot / total frekuensi di bar tsb, ratio vs MA bar
+    grouped = bars.groupby('Stock Code')
+    bars['Avg_Order_Volume'] = np.where(bars['Frequency'] > 0, bars['Volume'] / bars['Frequency'], 0)
+    ma_bars = TIMEFRAMES[timeframe]['ma_bars']
+    bars['MA_AOVol'] = grouped['Avg_Order_Volume'].transform(lambda x: x.rolling(ma_bars, min_periods=1).mean())
+    bars['AOV_Ratio'] = np.where(bars['MA_AOVol'] > 0, bars['Avg_Order_Volume'] / bars['MA_AOVol'], 0)
+    bars['Whale_Signal'] = bars['AOV_Ratio'] >= WHALE_RATIO
+    bars['Split_Signal'] = (bars['AOV_Ratio'] <= SPLIT_RATIO) & (bars['AOV_Ratio'] > 0)
+
+    prev_close = grouped['Close'].shift(1)
+    bars['Change %'] = np.where(prev_close > 0, (bars['Close'] / prev_close - 1) * 100, 0)
+    return bars
+
+
+def latest_bars(bars, n_bars):
+    # n bar terakhir tiap saham (untuk scan akumulasi mingguan/bulanan)
+    return bars.groupby('Stock Code').tail(n_bars)
+
+
+# ==============================================================================
+# PREFIX-SUM INDEX (Total / rata-rata window apapun dalam O(1))
+# ==============================================================================
+PREFIX_COLS = ['Net Foreign', 'Value', 'Volume', 'Frequency']
+# Kolom yang dijumlah hanya pada hari "hit" (lolos threshold) untuk Period Scanner
+HIT_SUM_COLS = ['AOV_Ratio', 'Value', 'Change %', 'Net Foreign']
+MAX_HIT_SETS = 32
+
+
+class PrefixIndex:
+    # df harus urut Stock Code, Last Trading Date (hasil compute_features)
+    # Baris tiap saham berurutan, jadi satu cumsum global cukup:
+    # total baris [s, e) = cum[e] - cum[s]
+    def __init__(self, df, cols=PREFIX_COLS):
+        self.df = df
+        codes = df['Stock Code'].to_numpy()
+        n = len(df)
+        bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+        self.stock_pos = {codes[s]: (s, e) for s, e in zip(bounds[:-1], bounds[1:])}
+        self.dates = df['Last Trading Date'].to_numpy()
+
+        # Array per saham untuk query semua saham sekaligus
+        self.codes = codes[bounds[:-1]]
+        self.starts, self.ends = bounds[:-1], bounds[1:]
+        self.names = df['Company Name'].to_numpy()[self.ends - 1] if 'Company Name' in df.columns else self.codes
+        # Kunci urut (saham, hari) -> awal window semua saham via satu searchsorted
+        self.stock_idx = np.repeat(np.arange(len(self.codes), dtype=np.int32), self.ends - self.starts)
+        self._day = self.dates.astype('datetime64[D]').astype(np.int64)
+        self._key = self.stock_idx.astype(np.int64) * 1_000_000 + self._day
+        self._hit_sets = OrderedDict()
+        self._hit_lock = threading.Lock()  # Index dibagi antar session / thread API
+
+        self.cum = {}
+        for col in cols:
+            self._add(col, df[col].to_numpy(dtype=np.float64))
+        # Jumlah sinyal per detektor: 'Whale_Signal:ratio', 'Split_Signal:robust', ...
+        for detector, cfg in DETECTORS.items():
+            self._add(f'Whale_Signal:{detector}', df[cfg['whale_signal']].to_numpy(dtype=np.float64))
+            self._add(f'Split_Signal:{detector}', df[cfg['split_signal']].to_numpy(dtype=np.float64))
+
+        # Streak asing: posisi awal run tanda Net Foreign yang sama (per saham)
+        self.flow_sign = np.sign(df['Net Foreign'].to_numpy(dtype=np.float64))
+        new_run = np.r_[True, (self.flow_sign[1:] != self.flow_sign[:-1]) | (codes[1:] != codes[:-1])]
+        self.run_start = np.maximum.accumulate(np.where(new_run, np.arange(n), 0))
+
+    STATE = ('codes', 'starts', 'ends', 'names', 'stock_idx', '_day', '_key', 'flow_sign', 'run_start', 'cum')
+
+    @classmethod
+    def from_state(cls, df, state):
+        prefix = _restore(cls, state)
+        prefix.df = df
+        prefix.dates = df['Last Trading Date'].to_numpy()
+        prefix.stock_pos = {code: (s, e) for code, s, e in zip(prefix.codes, prefix.starts, prefix.ends)}
+        prefix._hit_sets = OrderedDict()
+        prefix._hit_lock = threading.Lock()
+        return prefix
+
+    def _add(self, key, values):
+        # NaN dihitung 0 (seperti .sum()), supaya satu sel kosong tidak membuat semua total setelahnya NaN
+        self.cum[key] = np.concatenate([[0.0], np.cumsum(np.nan_to_num(values))])
+
+    def span(self, code, days=None, start_date=None):
+        # Posisi [s, e) untuk N baris terakhir atau sejak start_date
+        s, e = self.stock_pos.get(code, (0, 0))
+        if days is not None:
+            s = max(s, e - days)
+        if start_date is not None:
+            s += np.searchsorted(self.dates[s:e], np.datetime64(start_date), side='left')
+        return s, e
+
+    def total(self, key, s, e):
+        return self.cum[key][e] - self.cum[key][s]
+
+    def window(self, code, keys=PREFIX_COLS, days=None, start_date=None):
+        s, e = self.span(code, days, start_date)
+        result = {'Days': e - s}
+        for key in keys:
+            result[key] = self.total(key, s, e)
+            result[f'Avg {key}'] = result[key] / (e - s) if e > s else 0
+        return result
+
+    def running_total(self, key, s, e):
+        # Garis kumulatif di dalam window (mulai dari 0 di awal window)
+        return self.cum[key][s + 1:e + 1] - self.cum[key][s]
+
+    def window_starts(self, start_date):
+        # Posisi baris pertama >= start_date untuk tiap saham (vectorized)
+        # Tanggal trading resolusi hari -> start_date dibulatkan ke atas
+        day = np.datetime64(pd.Timestamp(start_date).ceil('D'), 'D').astype(np.int64)
+        return np.searchsorted(self._key, np.arange(len(self.codes)) * 1_000_000 + day, side='left')
+
+    def forward_returns(self, rows, days):
+        # Return d hari ke depan untuk baris tertentu saja (NaN kalau melewati akhir data saham)
+        # Harga adjusted: return tidak terdistorsi split / rights issue
+        close = self.df['Adj_Close' if 'Adj_Close' in self.df.columns else 'Close'].to_numpy(dtype=np.float64)
+        target = rows + days
+        valid = target < self.ends[self.stock_idx[rows]]
+        result = np.full(len(rows), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[valid] = close[target[valid]] / close[rows[valid]] - 1
+        return result
+
+    def hit_set(self, key, mask_fn):
+        # Counter kumulatif hari "hit" + jumlah kolom pada hari hit, di-materialize sekali per key
+        # Lookup & insert/evict LRU di bawah lock; hitung cumsum di luar lock (dua thread bisa menghitung key
+        # yang sama bersamaan, hasilnya identik)
+        with self._hit_lock:
+            hits = self._hit_sets.get(key)
+            if hits is not None:
+                self._hit_sets.move_to_end(key)
+                return hits
+
+        mask = np.asarray(mask_fn(self.df), dtype=bool)
+        hits = {'count': np.concatenate([[0], np.cumsum(mask)])}
+        for col in HIT_SUM_COLS:
+            values = np.where(mask, np.nan_to_num(self.df[col].to_numpy(dtype=np.float64)), 0)
+            hits[col] = np.concatenate([[0.0], np.cumsum(values)])
+        # Posisi hit terakhir s/d baris i (-1 = belum ada)
+        hits['last'] = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+        with self._hit_lock:
+            self._hit_sets[key] = hits
+            while len(self._hit_sets) > MAX_HIT_SETS:
+                self._hit_sets.popitem(last=False)
+        return hits
+
+    def range_hits(self, key, mask_fn, start_date):
+        # Agregat hit [start_date, akhir] untuk semua saham: selisih 2 nilai kumulatif
+        hits = self.hit_set(key, mask_fn)
+        s, e = self.window_starts(start_date), self.ends
+        count = hits['count'][e] - hits['count'][s]
+        keep = count > 0
+        s, e, count = s[keep], e[keep], count[keep]
+        last = hits['last'][e - 1]
+
+        result = pd.DataFrame({'Stock Code': self.codes[keep], 'Company Name': self.names[keep], 'Count': count})
+        for col in HIT_SUM_COLS:
+            result[f'Sum {col}'] = hits[col][e] - hits[col][s]
+        result['Last Date'] = self.dates[last]
+        result['Last Close'] = self.df['Close'].to_numpy()[last]
+        return result
+
+    def foreign_streak(self, code):
+        # (jumlah hari beruntun, arah +1 beli / -1 jual / 0, total Net Foreign selama streak)
+        s, e = self.stock_pos.get(code, (0, 0))
+        if e == s:
+            return 0, 0, 0.0
+        start = self.run_start[e - 1]
+        return int(e - start), int(self.flow_sign[e - 1]), self.total('Net Foreign', start, e)
+
+
+# ==============================================================================
+# SIMILARITY SEARCH (Saham dengan jejak AOV mirip)
+# ==============================================================================
+# Fitur per hari; rasio di-log1p supaya satu spike tidak mendominasi vektor
+SIMILARITY_FEATURES = ['AOV_Ratio', 'Value_Ratio', 'Change %']
+SIMILARITY_LOG_FEATURES = ('AOV_Ratio', 'Value_Ratio')
+SIMILARITY_DAYS = (20, 40, 60)
+
+
+class SimilarityIndex:
+    # Matriks saham x (hari x fitur) dari N baris terakhir tiap saham, tiap vektor dinormalisasi
+    # Query = satu perkalian matriks-vektor (cosine similarity) + argpartition top-k
+    def __init__(self, prefix, days, features=SIMILARITY_FEATURES):
+        self.days = days
+        keep = (prefix.ends - prefix.starts) >= days
+        self.codes = prefix.codes[keep]
+        self.names = prefix.names[keep]
+        self.row = {code: i for i, code in enumerate(self.codes)}
+        rows = prefix.ends[keep][:, None] - days + np.arange(days)
+
+        blocks = []
+        for col in features:
+            values = prefix.df[col].to_numpy(dtype=np.float64)[rows]
+            if col in SIMILARITY_LOG_FEATURES:
+                values = np.log1p(np.clip(values, 0, None))
+            # Z-score per saham per fitur: yang dibandingkan bentuk pola, bukan level
+            values = values - values.mean(axis=1, keepdims=True)
+            std = values.std(axis=1, keepdims=True)
+            blocks.append(np.divide(values, std, out=np.zeros_like(values), where=std > 0))
+        matrix = np.concatenate(blocks, axis=1)
+        norm = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.divide(matrix, norm, out=np.zeros_like(matrix), where=norm > 0).astype(np.float32)
+
+    def query(self, code, k=10):
+        # Top-k saham paling mirip (tanpa saham itu sendiri); None kalau histori < N hari
+        i = self.row.get(code)
+        if i is None:
+            return None
+        scores = self.matrix @ self.matrix[i]
+        scores[i] = -np.inf
+        k = min(k, len(scores) - 1)
+        top = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.array([], dtype=int)
+        top = top[np.argsort(-scores[top])]
+        return pd.DataFrame({'Stock Code': self.codes[top], 'Company Name': self.names[top], 'Similarity': scores[top]})
+
+
+def data_version(df):
+    # Sidik jari dataset: berubah kalau isi data berubah
+    h = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(h.tobytes()).hexdigest()[:16]
+
+
+def code_version():
+    # Kode fitur berubah (deploy baru) -> versi baru walau data mentah sama
+    h = hashlib.sha1()
+    for path in (__file__, rules.__file__):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:8]
+
+
+def feature_version(df_raw):
+    # Versi feature set = data mentah + kode (id versi di store worker & kunci hasil saved screen)
+    return f'{data_version(df_raw)}-{code_version()}'
+
+
+# ==============================================================================
+# SIGNAL LEDGER (Riwayat sinyal append-only, index per saham & per tanggal)
+# ==============================================================================
+# Sinyal ledger -> (kolom bool di df / None = dihitung, detektor, mode conviction score)
+LEDGER_SIGNALS = {
+    'whale': ('Whale_Signal', 'ratio', 'whale'),
+    'split': ('Split_Signal', 'ratio', 'split'),
+    'whale_robust': ('Whale_Signal_Robust', 'robust', 'whale'),
+    'split_robust': ('Split_Signal_Robust', 'robust', 'split'),
+    'bluechip': (None, 'ratio', 'whale'),
+}
+LEDGER_COLS = ['Stock Code', 'Last Trading Date', 'Signal', 'Close', 'Change %', 'Value', 'Net Foreign', 'AOV_Ratio', 'AOV_RobustZ', 'Value_Ratio', 'Conviction_Score']
+
+
+def ledger_signal_mask(df, signal):
+    # Mask bool sinyal ledger (kolom precompute, bluechip = kriteria default Bluechip Radar)
+    col = LEDGER_SIGNALS[signal][0]
+    mask = df[col] if col else bluechip_mask(df, BLUECHIP_MIN_VALUE, BLUECHIP_AOV_RATIO)
+    return mask.to_numpy()
+
+
+def signal_events(df, since=None):
+    # Satu baris per (tanggal, saham, sinyal) untuk tanggal >= since, urut tanggal lalu saham
+    new = np.ones(len(df), dtype=bool) if since is None else (df['Last Trading Date'] >= since).to_numpy()
+    parts = []
+    for signal, (col, detector, mode) in LEDGER_SIGNALS.items():
+        rows = np.flatnonzero(ledger_signal_mask(df, signal) & new)
+        part = df.take(rows)
+        score = conviction_score(part[DETECTORS[detector]['col']].to_numpy(dtype=np.float64), detector, mode)
+        parts.append(part.assign(Signal=signal, Conviction_Score=score)[LEDGER_COLS])
+    events = pd.concat(parts, ignore_index=True)
+    return events.sort_values(['Last Trading Date', 'Stock Code', 'Signal'], ignore_index=True)
+
+
+class SignalLedger:
+    # events urut tanggal (append-only). Index per tanggal = offset awal tiap tanggal,
+    # index per saham = urutan baris per saham + offset (CSR), keduanya int32
+    def __init__(self, events):
+        self.events = events
+        n = len(events)
+        dates = events['Last Trading Date'].to_numpy()
+        self.dates, date_starts = np.unique(dates, return_index=True)
+        self.date_offsets = np.r_[date_starts, n].astype(np.int32)
+
+        stock_codes, self.stocks = pd.factorize(events['Stock Code'], sort=True)
+        self.stock_order = np.argsort(stock_codes, kind='stable').astype(np.int32)  # stable -> kronologis
+        self.stock_offsets = np.searchsorted(stock_codes[self.stock_order], np.arange(len(self.stocks) + 1)).astype(np.int32)
+        self.stock_codes = stock_codes.astype(np.int32)
+        self.signal_values = events['Signal'].to_numpy()
+        self.max_date = pd.Timestamp(self.dates[-1]) if n else None
+
+    STATE = ('dates', 'date_offsets', 'stocks', 'stock_order', 'stock_offsets', 'stock_codes')
+
+    @classmethod
+    def from_state(cls, events, state):
+        ledger = _restore(cls, state)
+        ledger.events = events
+        ledger.stocks = pd.Index(ledger.stocks)
+        ledger.signal_values = events['Signal'].to_numpy()
+        ledger.max_date = pd.Timestamp(ledger.dates[-1]) if len(events) else None
+        return ledger
+
+    def __len__(self):
+        return len(self.events)
+
+    def _date_start(self, start_date):
+        return self.date_offsets[np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)))]
+
+    def _stock_rows(self, code):
+        i = self.stocks.get_indexer([code])[0]
+        if i < 0:
+            return np.array([], dtype=np.int32)
+        return self.stock_order[self.stock_offsets[i]:self.stock_offsets[i + 1]]
+
+    def _take(self, rows, signal=None):
+        if signal is not None:
+            rows = rows[self.signal_values[rows] == signal]
+        return self.events.take(rows)
+
+    def history(self, code, signal=None, start_date=None):
+        # Semua sinyal satu saham (kronologis), opsional sejak start_date
+        rows = self._stock_rows(code)
+        if start_date is not None:
+            rows = rows[rows >= self._date_start(start_date)]
+        return self._take(rows, signal)
+
+    def on_date(self, date, signal=None):
+        i = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date)))
+        if i == len(self.dates) or self.dates[i] != np.datetime64(pd.Timestamp(date)):
+            return self.events.iloc[:0]
+        return self._take(np.arange(self.date_offsets[i], self.date_offsets[i + 1]), signal)
+
+    def stock_summary(self, code):
+        # Per sinyal: jumlah, kemunculan pertama & terakhir
+        rows = self._stock_rows(code)
+        frame = self.events.take(rows)
+        return frame.groupby('Signal', sort=False).agg(
+            Total=('Last Trading Date', 'size'),
+            First_Seen=('Last Trading Date', 'first'),
+            Last_Seen=('Last Trading Date', 'last'),
+            Avg_Score=('Conviction_Score', 'mean')
+        ).reset_index()
+
+    def counts(self, signal, start_date=None):
+        # Jumlah sinyal per saham (bincount di atas kode saham, tanpa groupby)
+        start = 0 if start_date is None else self._date_start(start_date)
+        rows = start + np.flatnonzero(self.signal_values[start:] == signal)
+        totals = np.bincount(self.stock_codes[rows], minlength=len(self.stocks))
+        return pd.Series(totals, index=self.stocks, name=signal)
+
+    def daily_counts(self, signal):
+        # Jumlah saham dengan sinyal per tanggal
+        hits = np.r_[0, np.cumsum(self.signal_values == signal)]
+        return pd.Series(hits[self.date_offsets[1:]] - hits[self.date_offsets[:-1]], index=pd.DatetimeIndex(self.dates), name=signal)
+
+
+# ==============================================================================
+# MARKET BREADTH (Jumlah & porsi Value saham bersinyal per tanggal, indikator regime)
+# ==============================================================================
+# Agregat per (tanggal, sektor): Stocks, Value + {sinyal}_Count, {sinyal}_Value untuk tiap sinyal ledger.
+# Total pasar = jumlah antar sektor (tabel kecil: tanggal x sektor), tanpa scan df per rerun
+NO_SECTOR = '-'
+
+
+def breadth_aggregates(frame):
+    # Satu bincount per kolom atas key (tanggal, sektor)
+    date_codes, dates = pd.factorize(frame['Last Trading Date'], sort=True)
+    sector = frame['Sector'].fillna(NO_SECTOR) if 'Sector' in frame.columns else pd.Series(NO_SECTOR, index=frame.index)
+    sector_codes, sectors = pd.factorize(sector, sort=True)
+    key = date_codes.astype(np.int64) * len(sectors) + sector_codes
+    size = len(dates) * len(sectors)
+    value = frame['Value'].to_numpy(dtype=np.float64)
+
+    aggregates = {'Stocks': np.bincount(key, minlength=size), 'Value': np.bincount(key, value, size)}
+    for signal in LEDGER_SIGNALS:
+        mask = ledger_signal_mask(frame, signal)
+        aggregates[f'{signal}_Count'] = np.bincount(key[mask], minlength=size)
+        aggregates[f'{signal}_Value'] = np.bincount(key[mask], value[mask], size)
+    present = aggregates['Stocks'] > 0
+    return pd.DataFrame({
+        'Last Trading Date': np.repeat(dates.to_numpy(), len(sectors))[present],
+        'Sector': np.tile(sectors.to_numpy(dtype=object), len(dates))[present],
+        **{col: values[present] for col, values in aggregates.items()},
+    })
+
+
+def market_breadth(df, known=None, panel=None, stale_until=None):
+    # Inkremental seperti percentile_ranks: hanya tanggal baru (+ tanggal terakhir, bisa parsial) yang diagregasi
+    # known: hasil market_breadth sebelumnya, stale_until: hasil rolloff_until -> tanggal <= ini diagregasi ulang
+    start = None
+    if known is not None and not known.empty:
+        start = known['Last Trading Date'].max()
+        known_dates = known['Last Trading Date']
+        keep = (known_dates < start) & (known_dates >= df['Last Trading Date'].min())
+        if stale_until is not None:
+            keep &= known_dates > stale_until
+        known = known[keep]
+    if start is None:
+        frame = df
+    elif stale_until is None:
+        frame = select_window(df, start_date=start, panel=panel)
+    else:
+        dates = df['Last Trading Date']
+        frame = df[(dates >= start) | (dates <= stale_until)]
+    breadth = breadth_aggregates(frame)
+    if known is None or known.empty:
+        return breadth
+    return pd.concat([known, breadth], ignore_index=True).sort_values(['Last Trading Date', 'Sector'], ignore_index=True)
+
+
+def breadth_series(breadth, sector=None, signals=None):
+    # Seri harian: {sinyal}_Count, {sinyal}_Pct (% saham), {sinyal}_Value_Pct (% Value) -- pasar atau satu sektor
+    frame = breadth[breadth['Sector'] == sector] if sector is not None else breadth
+    totals = frame.drop(columns='Sector').groupby('Last Trading Date').sum()
+    series = pd.DataFrame({'Stocks': totals['Stocks']}, index=totals.index)
+    for signal in signals or LEDGER_SIGNALS:
+        series[f'{signal}_Count'] = totals[f'{signal}_Count']
+        series[f'{signal}_Pct'] = totals[f'{signal}_Count'] / totals['Stocks'] * 100
+        series[f'{signal}_Value_Pct'] = np.where(totals['Value'] > 0, totals[f'{signal}_Value'] / totals['Value'] * 100, 0)
+    return series
+
+
+# ==============================================================================
+# FEATURE SET (Section 3 lengkap: dipakai app.py & worker.py)
+# ==============================================================================
+def build_feature_set(df_raw, store, version=None):
+    # store: dict lintas versi data. Ranks & bar lama dipakai ulang (inkremental),
+    # index turunan (panel, prefix, similarity) diganti tiap versi
+    # Versi baru dibangun di dict terpisah lalu dipasang dengan satu store.update (atomik di bawah GIL):
+    # session lain yang membaca dict(store) tidak pernah melihat version baru dengan df lama
+    built = {'version': version or feature_version(df_raw)}
+    df = compute_features(df_raw)
+
+    # Event corporate action berubah -> harga adjusted historis berubah, fitur inkremental dihitung ulang penuh
+    corp_actions = corporate_actions(df)[['Stock Code', 'Last Trading Date', 'Factor']]
+    known = store if corp_actions.equals(store.get('corp_actions')) else {}
+    built['corp_actions'] = corp_actions
+    # Ledger = riwayat: cukup event di dalam window yang sama (event yang keluar dari sumber tidak menghapus riwayat)
+    window_start = df['Last Trading Date'].min()
+    ledger = store.get('ledger') if corp_actions_match(store.get('corp_actions'), corp_actions, window_start) else None
+
+    # F. Panel Tanggal x Saham (snapshot harian & ranking cross-sectional per axis)
+    with perf.stage('features.panel', len(df)):
+        built['panel'] = Panel(df)
+
+    # Tanggal tertua keluar dari sumber -> fitur rolling di awal window berubah, agregat tanggal itu dihitung ulang
+    stale_until = rolloff_until(df, store.get('first_dates'))
+    built['first_dates'] = stock_first_dates(df)
+
+    # G. Percentile Rank Harian (Cross-Sectional)
+    with perf.stage('features.ranks', len(df)):
+        built['ranks'] = percentile_ranks(df, known.get('ranks'), built['panel'], stale_until)
+        df = attach_percentile_ranks(df, built['ranks'])
+
+    # H. Bar Mingguan & Bulanan (Multi-Timeframe)
+    with perf.stage('features.bars', len(df)):
+        for tf in TIMEFRAMES:
+            built[f'bars_{tf}'] = resample_bars(df, tf, known.get(f'bars_{tf}'))
+
+    # I. Prefix-Sum Index (Net Foreign, Value, Volume, Frequency, jumlah sinyal)
+    with perf.stage('features.prefix', len(df)):
+        built['prefix'] = PrefixIndex(df)
+        # Index similarity per jumlah hari, dibangun saat pertama dipakai
+        built['similarity'] = {}
+
+    # I2. Index Pasar & Sektor (benchmark excess return backtest)
+    with perf.stage('features.market_index', len(df)):
+        built['market'] = MarketIndex(df, built['panel'].dates)
+
+    # I3. Market Breadth (agregat sinyal per tanggal & sektor, hanya tanggal baru)
+    with perf.stage('features.breadth', len(df)):
+        built['breadth'] = market_breadth(df, known.get('breadth'), built['panel'], stale_until)
+
+    # J. Signal Ledger: hanya tanggal baru yang diekstrak, riwayat lama tetap (walau sudah keluar dari file sumber)
+    with perf.stage('features.ledger', len(df)) as rec:
+        built['ledger'] = append_signal_events(ledger, df)
+        rec['events'] = len(built['ledger'])
+    built['df'] = df
+    store.update(built)
+    return df
+
+
+def corp_actions_match(known, corp_actions, window_start):
+    # Event di tanggal pertama window / sebelumnya sudah tidak terdeteksi & tidak mengubah harga adjusted di window
+    if known is None:
+        return False
+    known = known[known['Last Trading Date'] > window_start].reset_index(drop=True)
+    if len(known) != len(corp_actions):
+        return False
+    return known.astype(corp_actions.dtypes.to_dict()).equals(corp_actions)
+
+
+def restore_ledger(store, events, corp_actions):
+    # Proses baru (store kosong): ledger dari disk disambung build_feature_set kalau corporate action masih cocok
+    store['ledger'] = SignalLedger(events)
+    store['corp_actions'] = corp_actions
+
+
+def append_signal_events(ledger, df):
+    # Seperti percentile_ranks: tanggal terakhir ledger diekstrak ulang & diganti (data hari itu bisa masih parsial),
+    # tanggal yang sudah keluar dari df tetap di ledger
+    if ledger is None or ledger.max_date is None:
+        return SignalLedger(signal_events(df))
+    since = ledger.max_date
+    new_events = signal_events(df, since)
+    if (df['Last Trading Date'] == since).any():
+        kept = ledger.events[ledger.events['Last Trading Date'] < since]
+    elif new_events.empty:
+        return ledger
+    else:
+        kept = ledger.events
+    return SignalLedger(pd.concat([kept, new_events], ignore_index=True))
+
+
+# Index turunan yang dipublikasikan bersama versi: key -> kelas (atribut STATE jadi array memory-map)
+INDEX_KEYS = ('panel', 'prefix', 'market', 'ledger')
+
+
+def _restore(cls, state):
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+
+def index_arrays(store):
+    # {'<key>.<atribut>[.<sub key>]': array} untuk datastore.publish (dict seperti PrefixIndex.cum diratakan)
+    arrays = {}
+    for key in INDEX_KEYS:
+        index = store[key]
+        for name in index.STATE:
+            value = getattr(index, name)
+            if isinstance(value, dict):
+                arrays.update({f'{key}.{name}.{sub}': v for sub, v in value.items()})
+            else:
+                arrays[f'{key}.{name}'] = value
+    return arrays
+
+
+def _index_state(arrays, key, cls):
+    state = {}
+    for path, value in arrays.items():
+        owner, _, rest = path.partition('.')
+        if owner != key:
+            continue
+        name, _, sub = rest.partition('.')
+        if sub:
+            state.setdefault(name, {})[sub] = value
+        else:
+            state[name] = value
+    return state if set(state) == set(cls.STATE) else None
+
+
+def open_feature_set(tables, version, ledger_events=None, arrays=None):
+    # Feature set dari tabel yang sudah jadi (hasil worker). arrays (index_arrays hasil worker): index turunan
+    # langsung di atas memory-map; versi lama tanpa arrays -> index dibangun di sini
+    df = tables['df']
+    arrays = arrays or {}
+    store = {f'bars_{tf}': tables[f'bars_{tf}'] for tf in TIMEFRAMES}
+    store['version'] = version
+    store['corp_actions'] = corporate_actions(df)[['Stock Code', 'Last Trading Date', 'Factor']]
+    with perf.stage('features.panel', len(df)):
+        state = _index_state(arrays, 'panel', Panel)
+        store['panel'] = Panel.from_state(df, state) if state else Panel(df)
+    with perf.stage('features.prefix', len(df)):
+        state = _index_state(arrays, 'prefix', PrefixIndex)
+        store['prefix'] = PrefixIndex.from_state(df, state) if state else PrefixIndex(df)
+        store['similarity'] = {}
+    with perf.stage('features.market_index', len(df)):
+        state = _index_state(arrays, 'market', MarketIndex)
+        store['market'] = MarketIndex.from_state(store['panel'].dates, state) if state else MarketIndex(df, store['panel'].dates)
+    with perf.stage('features.breadth', len(df)):
+        store['breadth'] = tables['breadth'] if 'breadth' in tables else market_breadth(df, panel=store['panel'])
+    with perf.stage('features.ledger', len(df)):
+        # Ledger yang dipublikasikan bersama versi menang (index-nya dihitung dari event yang sama)
+        state = None
+        if 'ledger' in tables:
+            ledger_events = tables['ledger']
+            state = _index_state(arrays, 'ledger', SignalLedger)
+        if ledger_events is None:
+            store['ledger'] = append_signal_events(None, df)
+        else:
+            store['ledger'] = SignalLedger.from_state(ledger_events, state) if state else SignalLedger(ledger_events)
+    store['df'] = df
+    return store
+
+
+# ==============================================================================
+# SCREENER HELPERS
+# ==============================================================================
+def period_start(max_date, period_days):
+    # Hari kerja -> hari kalender (kira-kira)
+    return max_date - pd.Timedelta(days=period_days * 1.5)
+
+
+def row_nbytes(frame):
+    # Perkiraan byte per baris saat baris di-materialize (kolom object = pointer 8 byte)
+    return frame.memory_usage(index=True, deep=False).sum() / max(len(frame), 1)
+
+
+def select_window(df, date=None, start_date=None, panel=None):
+    # Daily snapshot (satu tanggal) atau period scanner (>= start_date)
+    # panel: Panel atas df yang sama -> posisi baris dari axis tanggal, tanpa mask full frame
+    if panel is not None:
+        rows = panel.date_rows(date=date, start_date=start_date)
+        perf.reserve(len(rows) * row_nbytes(df), 'select_window')
+        return df.take(rows)
+    if date is not None:
+        return df[df['Last Trading Date'] == pd.to_datetime(date)]
+    return df[df['Last Trading Date'] >= pd.to_datetime(start_date)]
+
+
+# Kondisi harga yang murni per baris (tanpa VWMA window) -> bisa di-precompute
+ROW_PRICE_CONDITIONS = ('all', 'hidden_gem', 'early_move')
+
+
+def price_mask(frame, condition):
+    if condition in ROW_PRICE_CONDITIONS[1:]:
+        return pd.Series(rules.evaluate({condition: PRICE_RULES[condition]}, frame)[condition], index=frame.index)
+    return pd.Series(True, index=frame.index)
+
+
+def apply_price_context(suspects, condition):
+    if suspects.empty or condition not in PRICE_CONDITIONS[1:]:
+        return suspects
+    if condition != 'bottom_fishing':
+        return suspects[price_mask(suspects, condition)]
+
+    # VWMA Logic (On the fly check) - TP/VP array lokal, bukan kolom baru di suspects
+    if 'VWMA_20D' in suspects.columns:
+        vwma = suspects['VWMA_20D']
+    else:
+        tp = (suspects['High'] + suspects['Low'] + suspects['Close']) / 3
+        vp = tp * suspects['Volume']
+        vwma = vp.groupby(suspects['Stock Code']).transform(lambda x: x.rolling(20).sum() / x.rolling(20).sum())
+    mask = rules.evaluate({'bottom_fishing': PRICE_RULES['bottom_fishing']}, suspects, extra={'vwma': vwma.to_numpy()})
+    return suspects[mask['bottom_fishing']]
+
+
+def anomaly_mask(frame, mode, min_value, aov_top_pct=None, detector='ratio'):
+    # aov_top_pct: cutoff relatif per tanggal (Whale = top N%, Split = bottom N%) menggantikan detektor
+    if aov_top_pct is not None:
+        if mode == 'whale':
+            aov_mask = top_pct_mask(frame, 'AOV_Pct', aov_top_pct)
+        else:
+            aov_mask = (frame['AOV_Pct'] <= aov_top_pct) & (frame['AOV_Ratio'] > 0)
+    else:
+        whale, split = anomaly_masks(frame, detector, whale_key='screener_whale')
+        aov_mask = whale if mode == 'whale' else split
+    return aov_mask & (frame['Value'] >= min_value)
+
+
+def screen_anomaly(target_df, mode, min_value, price_condition='all', aov_top_pct=None, detector='ratio'):
+    # Tab 2: Whale (AOV tinggi) / Split (AOV rendah)
+    suspects = target_df[anomaly_mask(target_df, mode, min_value, aov_top_pct, detector)]
+    return apply_price_context(suspects, price_condition)
+
+
+def add_conviction_score(suspects, mode, detector='ratio'):
+    # Conviction Score (Daily Snapshot) -- rumus sama dengan kartu Deep Dive
+    cfg = DETECTORS[detector]
+    suspects = suspects.sort_values(by=cfg['col'], ascending=False)
+    return suspects.assign(Conviction_Score=conviction_score(suspects[cfg['col']].to_numpy(dtype=np.float64), detector, mode))
+
+
+def run_screens(frame, screens, score=None, params=None):
+    # Semua screen (+ score opsional) dikompilasi jadi satu program -> satu pass atas kolom frame
+    # Return (DataFrame bool per screen, array score / None)
+    program_rules = dict(screens)
+    if score:
+        program_rules['__score__'] = score
+    results = rules.evaluate(program_rules, frame, {**SCREEN_PARAMS, **(params or {})})
+    scores = results.pop('__score__', None)
+    masks = pd.DataFrame({name: np.broadcast_to(np.asarray(mask, dtype=bool), len(frame)) for name, mask in results.items()}, index=frame.index)
+    if scores is not None:
+        scores = np.broadcast_to(np.asarray(scores, dtype=np.float64), len(frame))
+    return masks, scores
+
+
+def summarize_screens(frame, masks):
+    # Per screen: jumlah baris hit & jumlah saham unik
+    codes, _ = pd.factorize(frame['Stock Code'])
+    return pd.DataFrame({
+        'Screen': masks.columns,
+        'Hits': masks.sum().to_numpy(),
+        'Saham': [len(np.unique(codes[masks[name].to_numpy()])) for name in masks.columns],
+    })
+
+
+def screen_hits(frame, mask, scores=None):
+    hits = frame[np.asarray(mask)]
+    if scores is None:
+        return hits
+    return hits.assign(Score=np.asarray(scores)[np.asarray(mask)]).sort_values('Score', ascending=False)
+
+
+def summarize_anomaly_period(suspects):
+    summary = suspects.groupby(['Stock Code', 'Company Name']).agg(
+        Total_Signals=('Last Trading Date', 'count'),
+        Last_Signal=('Last Trading Date', 'max'),
+        Avg_AOV_Ratio=('AOV_Ratio', 'mean'),
+        Avg_Value=('Value', 'mean'),
+        Latest_Close=('Close', 'last'),
+        Avg_Change=('Change %', 'mean')
+    ).reset_index()
+    return summary.sort_values(by='Total_Signals', ascending=False).head(50)
+
+
+def screen_bluechip(df_bc, min_value, aov_threshold, price_condition='all', top_pct=None, detector='ratio'):
+    # Tab 3: Value Besar + AOV agak naik
+    bc_suspects = df_bc[bluechip_mask(df_bc, min_value, aov_threshold, top_pct, detector)]
+    if 'Net Foreign' not in bc_suspects.columns:
+        if 'Foreign Buy' in bc_suspects.columns and 'Foreign Sell' in bc_suspects.columns:
+            bc_suspects = bc_suspects.assign(**{'Net Foreign': bc_suspects['Foreign Buy'] - bc_suspects['Foreign Sell']})
+        else:
+            bc_suspects = bc_suspects.assign(**{'Net Foreign': 0})
+    if 'Value_Ratio' not in bc_suspects.columns:
+        bc_suspects = bc_suspects.assign(Value_Ratio=0)
+    return apply_price_context(bc_suspects, price_condition)
+
+
+def bluechip_mask(frame, min_value, aov_threshold, top_pct=None, detector='ratio'):
+    # top_pct: {'AOV_Pct': 2, 'Foreign_Pct': 10} -> AOV top 2% & Asing top 10% hari itu
+    # Kalau AOV_Pct dipakai, threshold AOV absolut diabaikan
+    # aov_threshold dalam satuan detektor (ratio x atau robust z)
+    top_pct = top_pct or {}
+    mask = frame['Value'] >= min_value
+    if 'AOV_Pct' not in top_pct:
+        mask &= frame[DETECTORS[detector]['col']] >= aov_threshold
+    for pct_col, pct in top_pct.items():
+        mask &= top_pct_mask(frame, pct_col, pct)
+    return mask
+
+
+# ==============================================================================
+# MARKET INDEX (Benchmark Backtest)
+# ==============================================================================
+# market_value: bobot Value (transaksi) hari sebelumnya, market_equal: rata-rata biasa,
+# sector_value: index value-weighted sektor saham itu sendiri
+BENCHMARKS = ('market_value', 'market_equal', 'sector_value')
+
+
+class MarketIndex:
+    # Level index per tanggal panel: level[t] = prod(1 + return harian tertimbang), dibangun sekali per versi data
+    # Data tidak punya kapitalisasi pasar -> "value-weighted" = bobot Value hari sebelumnya (tanpa look-ahead)
+    def __init__(self, df, dates):
+        self.dates = dates
+        self.date_idx = np.searchsorted(dates, df['Last Trading Date'].to_numpy()).astype(np.int32)
+        sector = df['Sector'] if 'Sector' in df.columns else pd.Series(np.nan, index=df.index)
+        sector_idx, self.sectors = pd.factorize(sector)  # -1 = sektor kosong
+        self.sector_idx = sector_idx.astype(np.int32)
+
+        # Return harian per baris = vs baris sebelumnya saham yang sama (df urut Stock Code, tanggal)
+        codes = df['Stock Code'].to_numpy()
+        close = df['Adj_Close' if 'Adj_Close' in df.columns else 'Close'].to_numpy(dtype=np.float64)
+        prev_close = np.r_[np.nan, close[:-1]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily = close / prev_close - 1
+        valid = np.r_[False, codes[1:] == codes[:-1]] & (prev_close > 0) & np.isfinite(daily)
+        prev_value = np.r_[0.0, df['Value'].to_numpy(dtype=np.float64)[:-1]]
+        weight = np.where(valid & (prev_value > 0), prev_value, 0.0)
+        daily = np.where(valid, daily, 0.0)
+
+        n_dates = len(dates)
+        self.levels = {
+            'market_value': self._levels(self.date_idx, daily * weight, weight, (n_dates,)),
+            'market_equal': self._levels(self.date_idx, daily, valid.astype(np.float64), (n_dates,)),
+        }
+        # Semua sektor sekaligus: key (sektor, tanggal) diratakan -> satu bincount
+        has_sector = self.sector_idx >= 0
+        key = self.sector_idx[has_sector].astype(np.int64) * n_dates + self.date_idx[has_sector]
+        self.levels['sector_value'] = self._levels(key, (daily * weight)[has_sector], weight[has_sector], (len(self.sectors), n_dates))
+
+    STATE = ('date_idx', 'sector_idx', 'sectors', 'levels')
+
+    @classmethod
+    def from_state(cls, dates, state):
+        market = _restore(cls, state)
+        market.dates = dates
+        market.sectors = pd.Index(market.sectors)
+        return market
+
+    @staticmethod
+    def _levels(key, weighted_returns, weights, shape):
+        size = int(np.prod(shape))
+        total = np.bincount(key, weighted_returns, size).reshape(shape)
+        total_weight = np.bincount(key, weights, size).reshape(shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily = np.where(total_weight > 0, total / total_weight, 0.0)  # Tanggal tanpa data: index datar
+        return np.cumprod(1 + daily, axis=-1)
+
+    def period_returns(self, rows, target_rows, benchmark='market_value'):
+        # Return benchmark dari tanggal baris entry s.d. tanggal baris exit (lookup level, tanpa loop)
+        start = self.date_idx[rows]
+        end = self.date_idx[np.minimum(target_rows, len(self.date_idx) - 1)]
+        levels = self.levels[benchmark]
+        if benchmark != 'sector_value':
+            return levels[end] / levels[start] - 1
+        sector = self.sector_idx[rows]
+        known = sector >= 0
+        result = np.full(len(rows), np.nan)
+        result[known] = levels[sector[known], end[known]] / levels[sector[known], start[known]] - 1
+        return result
+
+    def index_frame(self):
+        # Level index pasar per tanggal (base 100) untuk chart
+        return pd.DataFrame({
+            'Last Trading Date': self.dates,
+            'Value-Weighted': self.levels['market_value'] * 100,
+            'Equal-Weighted': self.levels['market_equal'] * 100,
+        })
+
+
+def backtest_signals(prefix, signal_mask, hold_days, market=None, benchmark='market_value'):
+    # Research Lab: hanya baris sinyal yang di-materialize, forward return dihitung per baris sinyal
+    # market: MarketIndex -> kolom Excess_{d}D = return saham - return benchmark di tanggal yang sama
+    rows = np.flatnonzero(np.asarray(signal_mask, dtype=bool))
+    n_cols = len(hold_days) * (2 if market is not None else 1)
+    perf.reserve(len(rows) * (row_nbytes(prefix.df) + 8 * n_cols), 'backtest_signals')
+    returns = {}
+    for d in hold_days:
+        returns[f'Return_{d}D'] = prefix.forward_returns(rows, d)
+        if market is not None:
+            returns[f'Excess_{d}D'] = returns[f'Return_{d}D'] - market.period_returns(rows, rows + d, benchmark)
+    return prefix.df.take(rows).assign(**returns)
+
+
+HISTOGRAM_BINS = 50
+
+
+def return_histogram(returns, bins=HISTOGRAM_BINS):
+    # Distribusi return dibinning di server: payload chart = jumlah bin, bukan jumlah sinyal
+    # Bin_Mean: rata-rata return sinyal di dalam bin (hover)
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[np.isfinite(returns)]
+    if len(returns) == 0:
+        return pd.DataFrame(columns=['Bin_Left', 'Bin_Right', 'Count', 'Bin_Mean'])
+    edges = np.histogram_bin_edges(returns, bins)
+    n_bins = len(edges) - 1
+    # Sama dengan np.histogram: bin kanan-terbuka, kecuali bin terakhir yang memuat nilai maksimum
+    idx = np.minimum(np.searchsorted(edges, returns, side='right') - 1, n_bins - 1)
+    counts = np.bincount(idx, minlength=n_bins)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(idx, returns, n_bins) / counts
+    return pd.DataFrame({'Bin_Left': edges[:-1], 'Bin_Right': edges[1:], 'Count': counts, 'Bin_Mean': means})
+
+
+# Research Lab mode statistik
+BOOTSTRAP_RESAMPLES = 10_000
+RESAMPLE_BATCH = 4_000_000       # Elemen per batch resample -> memori tetap terbatas berapa pun jumlah resample
+LIQUIDITY_BINS_PER_DECADE = 2    # Strata likuiditas: Value per setengah dekade (1 M, 3 M, 10 M, ...)
+SIGNIFICANCE_COLS = ['Hold_Days', 'Signals', 'Universe', 'Mean', 'Mean_Lo', 'Mean_Hi', 'Win_Rate', 'Win_Lo', 'Win_Hi',
+                     'Random_Mean', 'Random_Mean_Lo', 'Random_Mean_Hi', 'Random_Win_Rate', 'P_Mean', 'P_Win']
+
+
+def _resample_stats(values, starts, counts, n_resamples, rng):
+    # Mean & win rate tiap resample; elemen j resample diambil acak dari values[starts[j]:starts[j] + counts[j]]
+    # Seluruh resample dalam batch 2D (resample x sinyal), bukan loop Python per resample
+    # Indeks int32 & uniform float32: separuh bandwidth memori dibanding int64/float64
+    n = len(starts)
+    batch = max(1, RESAMPLE_BATCH // max(n, 1))
+    perf.reserve(min(batch, n_resamples) * n * 16, 'bootstrap batch')
+    starts = starts.astype(np.int32)
+    last = starts + counts.astype(np.int32) - 1
+    counts = counts.astype(np.float32)
+    means = np.empty(n_resamples)
+    wins = np.empty(n_resamples)
+    for lo in range(0, n_resamples, batch):
+        hi = min(lo + batch, n_resamples)
+        idx = starts + (rng.random((hi - lo, n), dtype=np.float32) * counts).astype(np.int32)
+        np.minimum(idx, last, out=idx)  # Pembulatan float32 tidak boleh keluar strata
+        sample = values[idx]
+        means[lo:hi] = sample.mean(axis=1)
+        wins[lo:hi] = (sample > 0).mean(axis=1)
+    return means, wins
+
+
+def _two_sided_p(null, observed):
+    # Proporsi resample null yang sama ekstrem dengan observasi (+1 koreksi), dua arah
+    n = len(null)
+    upper = (1 + np.count_nonzero(null >= observed)) / (n + 1)
+    lower = (1 + np.count_nonzero(null <= observed)) / (n + 1)
+    return min(1.0, 2 * min(upper, lower))
+
+
+def signal_significance(prefix, signal_mask, universe_mask, hold_days, n_resamples=BOOTSTRAP_RESAMPLES, seed=0, ci=95):
+    # Bootstrap CI mean & win rate sinyal + baseline sinyal acak dengan tanggal & strata likuiditas sama
+    # universe_mask: saham yang boleh jadi entry acak (mis. filter Value minimum yang sama dengan sinyal)
+    rng = np.random.default_rng(seed)
+    signal_mask = np.asarray(signal_mask, dtype=bool)
+    universe_rows = np.flatnonzero(np.asarray(universe_mask, dtype=bool) | signal_mask)
+    is_signal = signal_mask[universe_rows]
+
+    frame = prefix.df
+    date_codes, _ = pd.factorize(frame['Last Trading Date'].to_numpy()[universe_rows])
+    value = frame['Value'].to_numpy(dtype=np.float64)[universe_rows]
+    bucket = np.floor(np.log10(np.maximum(value, 1)) * LIQUIDITY_BINS_PER_DECADE).astype(np.int64)
+    strata = date_codes.astype(np.int64) * 1000 + bucket
+    q_lo, q_hi = (100 - ci) / 2, 100 - (100 - ci) / 2
+
+    rows = []
+    for d in hold_days:
+        returns = prefix.forward_returns(universe_rows, d)
+        valid = ~np.isnan(returns)
+        keys, returns, signal_valid = strata[valid], returns[valid], is_signal[valid]
+        signal_returns = returns[signal_valid]
+        n = len(signal_returns)
+        row = {'Hold_Days': d, 'Signals': n, 'Universe': len(returns)}
+        if n < 2:
+            rows.append(row)
+            continue
+
+        # Pool baseline per strata (tanggal, likuiditas): urut key -> offset via searchsorted
+        order = np.argsort(keys, kind='stable')
+        pool, pool_keys = returns[order], keys[order]
+        signal_keys = keys[signal_valid]
+        starts = np.searchsorted(pool_keys, signal_keys, 'left')
+        counts = np.searchsorted(pool_keys, signal_keys, 'right') - starts
+
+        boot_mean, boot_win = _resample_stats(signal_returns, np.zeros(n, dtype=np.int64), np.full(n, n), n_resamples, rng)
+        base_mean, base_win = _resample_stats(pool, starts, counts, n_resamples, rng)
+        mean, win = signal_returns.mean(), (signal_returns > 0).mean()
+        row.update({
+            'Mean': mean, 'Mean_Lo': np.percentile(boot_mean, q_lo), 'Mean_Hi': np.percentile(boot_mean, q_hi),
+            'Win_Rate': win, 'Win_Lo': np.percentile(boot_win, q_lo), 'Win_Hi': np.percentile(boot_win, q_hi),
+            'Random_Mean': base_mean.mean(), 'Random_Mean_Lo': np.percentile(base_mean, q_lo), 'Random_Mean_Hi': np.percentile(base_mean, q_hi),
+            'Random_Win_Rate': base_win.mean(),
+            'P_Mean': _two_sided_p(base_mean, mean), 'P_Win': _two_sided_p(base_win, win),
+        })
+        rows.append(row)
+    return pd.DataFrame(rows, columns=SIGNIFICANCE_COLS)
+
+
+def period_anomaly_summary(prefix, start_date, mode, min_value, price_condition='all', aov_top_pct=None, detector='ratio'):
+    # Period Scanner Tab 2 dari counter kumulatif (tanpa filter + groupby)
+    # None -> kondisi harga butuh VWMA window, pakai jalur screen_anomaly + summarize
+    if price_condition not in ROW_PRICE_CONDITIONS:
+        return None
+    key = ('anomaly', mode, min_value, price_condition, aov_top_pct, detector)
+    mask_fn = lambda frame: anomaly_mask(frame, mode, min_value, aov_top_pct, detector) & price_mask(frame, price_condition)
+    hits = prefix.range_hits(key, mask_fn, start_date)
+
+    summary = pd.DataFrame({
+        'Stock Code': hits['Stock Code'],
+        'Company Name': hits['Company Name'],
+        'Total_Signals': hits['Count'],
+        'Last_Signal': hits['Last Date'],
+        'Avg_AOV_Ratio': hits['Sum AOV_Ratio'] / hits['Count'],
+        'Avg_Value': hits['Sum Value'] / hits['Count'],
+        'Latest_Close': hits['Last Close'],
+        'Avg_Change': hits['Sum Change %'] / hits['Count']
+    })
+    return summary.sort_values(by='Total_Signals', ascending=False).head(50)
+
+
+def period_bluechip_summary(prefix, start_date, min_value, aov_threshold, price_condition='all', top_pct=None, detector='ratio'):
+    # Period Scanner Tab 3 dari counter kumulatif
+    if price_condition not in ROW_PRICE_CONDITIONS:
+        return None
+    key = ('bluechip', min_value, aov_threshold, price_condition, tuple(sorted((top_pct or {}).items())), detector)
+    mask_fn = lambda frame: bluechip_mask(frame, min_value, aov_threshold, top_pct, detector) & price_mask(frame, price_condition)
+    hits = prefix.range_hits(key, mask_fn, start_date)
+
+    summary = pd.DataFrame({
+        'Stock Code': hits['Stock Code'],
+        'Company Name': hits['Company Name'],
+        'Freq_Muncul': hits['Count'],
+        'Total_Net_Foreign': hits['Sum Net Foreign'],
+        'Avg_Value': hits['Sum Value'] / hits['Count'],
+        'Avg_AOV_Ratio': hits['Sum AOV_Ratio'] / hits['Count'],
+        'Last_Close': hits['Last Close'],
+        'Avg_Change': hits['Sum Change %'] / hits['Count']
+    })
+    return summary.sort_values(by='Total_Net_Foreign', ascending=False).head(50)
+
+
+def anomaly_screen(df, prefix, panel, mode, min_value, price_condition='all', period=None, date=None, aov_top_pct=None, detector='ratio'):
+    # Screener harian lengkap (API, saved screen): period -> ringkasan per saham, date -> baris + Conviction Score
+    max_date = df['Last Trading Date'].max()
+    if date is None and period:
+        start_date = period_start(max_date, period)
+        summary = period_anomaly_summary(prefix, start_date, mode, min_value, price_condition, aov_top_pct=aov_top_pct, detector=detector)
+        if summary is not None:
+            return summary
+        suspects = screen_anomaly(select_window(df, start_date=start_date, panel=panel), mode, min_value, price_condition, aov_top_pct=aov_top_pct, detector=detector)
+        return summarize_anomaly_period(suspects)
+    target_df = select_window(df, date=max_date if date is None else date, panel=panel)
+    suspects = screen_anomaly(target_df, mode, min_value, price_condition, aov_top_pct=aov_top_pct, detector=detector)
+    return add_conviction_score(suspects, mode, detector)
+
+
+def bluechip_screen(df, prefix, panel, min_value, aov_threshold, price_condition='all', period=None, date=None, top_pct=None, detector='ratio'):
+    # Bluechip Radar lengkap: period -> akumulasi asing per saham, date -> baris urut Value
+    max_date = df['Last Trading Date'].max()
+    if date is None and period:
+        start_date = period_start(max_date, period)
+        summary = period_bluechip_summary(prefix, start_date, min_value, aov_threshold, price_condition, top_pct=top_pct, detector=detector)
+        if summary is not None:
+            return summary
+        bc_suspects = screen_bluechip(select_window(df, start_date=start_date, panel=panel), min_value, aov_threshold, price_condition, top_pct=top_pct, detector=detector)
+        return summarize_bluechip_period(bc_suspects)
+    df_bc = select_window(df, date=max_date if date is None else date, panel=panel)
+    bc_suspects = screen_bluechip(df_bc, min_value, aov_threshold, price_condition, top_pct=top_pct, detector=detector)
+    return bc_suspects.sort_values(by='Value', ascending=False)
+
+
+def summarize_bluechip_period(bc_suspects):
+    # Total Net Foreign selama periode (Akumulasi Asing)
+    summary = bc_suspects.groupby(['Stock Code', 'Company Name']).agg(
+        Freq_Muncul=('Last Trading Date', 'count'),
+        Total_Net_Foreign=('Net Foreign', 'sum'),
+        Avg_Value=('Value', 'mean'),
+        Avg_AOV_Ratio=('AOV_Ratio', 'mean'),
+        Last_Close=('Close', 'last'),
+        Avg_Change=('Change %', 'mean')
+    ).reset_index()
+    return summary.sort_values(by='Total_Net_Foreign', ascending=False).head(50)
@@ -0,0 +1,388 @@
+import contextvars
+import fnmatch
+import glob
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import perf
+from engine import NUMERIC_COLS, preprocess_raw
+
+# ==============================================================================
+# LOADER: Sumber data (Google Drive / file lokal)
+# Beberapa file (tahun berjalan + arsip, extract watchlist) di-download & di-parse paralel lalu
+# digabung; baris (Stock Code, tanggal) yang overlap -> sumber terakhir yang dipakai
+# Format dari nama file: CSV (boleh .gz / .zst / .zip / .bz2 / .xz) atau Parquet. Kompresi di-stream
+# ke parser chunk per chunk; download Drive mengalir lewat pipe (tanpa BytesIO seluruh file)
+# ==============================================================================
+FOLDER_ID = '1hX2jwUrAgi4Fr8xkcFWjCW6vbk6lsIlP'
+FILE_NAME = 'Kompilasi_Data_1Tahun.csv'
+
+# Set env ini untuk pakai file lokal (dev / API tanpa Drive).
+# Boleh beberapa path / glob, dipisah koma atau os.pathsep: "arsip/*.csv,Kompilasi_Data_1Tahun.csv"
+LOCAL_FILE_ENV = 'FREQ_DATA_FILE'
+# Nama file (boleh glob, mis. 'Kompilasi_Data_*.csv' / 'Kompilasi_Data_1Tahun.csv.gz') yang diambil dari folder Drive
+DRIVE_PATTERN_ENV = 'FREQ_DRIVE_PATTERN'
+
+MAX_LOAD_WORKERS = 4
+# Poller: cek metadata (id, modifiedTime, size) tiap POLL_INTERVAL detik, download hanya kalau berubah
+POLL_INTERVAL = 60
+RELIST_EVERY = 10  # Tiap N poll folder di-list ulang (file baru / diganti); di antaranya cukup get per id
+DRIVE_FILE_FIELDS = 'id, name, modifiedTime, size'
+
+COMPRESSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd', '.zip': 'zip', '.bz2': 'bz2', '.xz': 'xz'}
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+DOWNLOAD_CHUNK = 8 * 1024 * 1024  # Byte per request range download Drive (default googleapiclient 100 MB)
+KEY_COLS = ['Stock Code', 'Last Trading Date']
+FOREIGN_COLS = ['Foreign Buy', 'Foreign Sell']
+
+_thread_local = threading.local()
+
+
+def build_drive_service(service_account_info):
+    # Library Google di-import saat Drive benar-benar dipakai (mode file lokal / worker tidak butuh)
+    service_account = perf.timed_import('google.oauth2.service_account')
+    discovery = perf.timed_import('googleapiclient.discovery')
+    with perf.stage('load.drive_auth'):
+        creds = service_account.Credentials.from_service_account_info(
+            service_account_info,
+            scopes=['https://www.googleapis.com/auth/drive.readonly']
+        )
+        return discovery.build('drive', 'v3', credentials=creds)
+
+
+def thread_drive_service(service_account_info):
+    # googleapiclient (httplib2) tidak thread-safe -> satu service per thread
+    service = getattr(_thread_local, 'drive_service', None)
+    if service is None:
+        service = _thread_local.drive_service = build_drive_service(service_account_info)
+    return service
+
+
+def service_account_info_from_file(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def drive_pattern():
+    return os.environ.get(DRIVE_PATTERN_ENV) or FILE_NAME
+
+
+def list_drive_files(service, folder_id=FOLDER_ID, pattern=FILE_NAME):
+    # Semua file yang cocok dengan pattern, urut modifiedTime (file terbaru menang saat overlap)
+    with perf.stage('load.files_list') as rec:
+        query = f"'{folder_id}' in parents and trashed=false"
+        if not glob.has_magic(pattern):
+            query += f" and name='{pattern}'"
+        files, page_token = [], None
+        while True:
+            results = service.files().list(q=query, fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})", pageToken=page_token).execute()
+            files += [f for f in results.get('files', []) if fnmatch.fnmatchcase(f['name'], pattern)]
+            page_token = results.get('nextPageToken')
+            if not page_token: break
+        rec['files'] = len(files)
+    return sorted(files, key=lambda f: (f.get('modifiedTime', ''), f['name']))
+
+
+def drive_file_metadata(service, file_id):
+    with perf.stage('load.files_get'):
+        return service.files().get(fileId=file_id, fields=DRIVE_FILE_FIELDS).execute()
+
+
+class DriveStream(io.RawIOBase):
+    # Download Drive di thread terpisah -> pipe -> parser membaca sambil download berjalan
+    # Di memori hanya chunk yang sedang lewat; error download dilempar ke pembaca saat EOF
+    def __init__(self, service, file_id, name):
+        self.name = name
+        read_fd, write_fd = os.pipe()
+        self._reader = os.fdopen(read_fd, 'rb')
+        self._error = None
+        # copy_context: stage load.download tetap tercatat di perf run pemanggil
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._pump, service, file_id, os.fdopen(write_fd, 'wb')), daemon=True)
+        self._thread.start()
+
+    def _pump(self, service, file_id, writer):
+        try:
+            with writer, perf.stage('load.download') as rec:
+                request = service.files().get_media(fileId=file_id)
+                downloader = perf.timed_import('googleapiclient.http').MediaIoBaseDownload(writer, request, chunksize=DOWNLOAD_CHUNK)
+                done = False
+                while done is False:
+                    status, done = downloader.next_chunk()
+                rec['bytes'] = status.resumable_progress
+        except Exception as e:
+            self._error = e  # Termasuk BrokenPipe kalau pembaca berhenti lebih awal
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._reader.readinto(buffer)
+        if not n:
+            self._thread.join()
+            if self._error is not None:
+                raise OSError(f"Download '{self.name}' gagal: {self._error}") from self._error
+        return n
+
+    def close(self):
+        self._reader.close()
+        super().close()
+
+
+def open_drive_file(service, file_id, name):
+    return io.BufferedReader(DriveStream(service, file_id, name), DOWNLOAD_CHUNK)
+
+
+def source_format(name):
+    # ('parquet', None) atau ('csv', kompresi / None) dari nama file
+    name = str(name).lower()
+    if name.endswith(PARQUET_SUFFIXES):
+        return 'parquet', None
+    for suffix, compression in COMPRESSIONS.items():
+        if name.endswith(suffix):
+            return 'csv', compression
+    return 'csv', None
+
+
+def spool(fh):
+    # Parquet (footer) & zip (central directory) butuh seek: byte terkompresi disalin ke file temp di disk
+    with perf.stage('load.spool') as rec:
+        tmp = tempfile.TemporaryFile()
+        shutil.copyfileobj(fh, tmp, DOWNLOAD_CHUNK)
+        rec['bytes'] = tmp.tell()
+        tmp.seek(0)
+    return tmp
+
+
+def local_source_paths(spec=None):
+    # spec: list path, atau string path/glob dipisah koma / os.pathsep (default env FREQ_DATA_FILE)
+    spec = os.environ.get(LOCAL_FILE_ENV) if spec is None else spec
+    if not spec: return []
+    parts = re.split(f'[,{re.escape(os.pathsep)}]', spec) if isinstance(spec, str) else spec
+    paths = []
+    for part in (p.strip() for p in parts):
+        if not part: continue
+        for path in (sorted(glob.glob(part)) if glob.has_magic(part) else [part]):
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def read_source(fh, name=None):
+    # fh: path atau file-like; name (default path / fh.name) menentukan format & kompresi
+    is_path = isinstance(fh, (str, os.PathLike))
+    fmt, compression = source_format(name or (fh if is_path else getattr(fh, 'name', '')))
+    if not is_path and (fmt == 'parquet' or compression == 'zip') and not fh.seekable():
+        fh = spool(fh)
+    with perf.stage(f'load.read_{fmt}') as rec:
+        df = pd.read_parquet(fh) if fmt == 'parquet' else pd.read_csv(fh, compression=compression)
+        rec['rows'] = len(df)
+        rec['compression'] = compression
+    with perf.stage('load.coerce', rows=len(df)):
+        return preprocess_raw(df)
+
+
+def _read_opened(opener):
+    fh = opener()
+    if fh is None:
+        return None
+    try:
+        return read_source(fh)
+    finally:
+        if hasattr(fh, 'close'):
+            fh.close()
+
+
+def merge_sources(frames):
+    # Urutan frames = prioritas: baris (Stock Code, tanggal) duplikat -> yang terakhir dipakai
+    with perf.stage('load.merge', sum(len(f) for f in frames)) as rec:
+        columns = set().union(*(f.columns for f in frames))
+        if any(set(f.columns) != columns for f in frames):
+            frames = align_columns(frames, columns)
+        df = pd.concat(frames, ignore_index=True)
+        duplicated = df.duplicated(KEY_COLS, keep='last')
+        rec['duplicates'] = int(duplicated.sum())
+        if rec['duplicates']:
+            df = df[~duplicated].reset_index(drop=True)
+    return df
+
+
+def align_columns(frames, columns):
+    # Kolom beda antar file: dilengkapi per file sebelum concat (bukan NaN / 0 di frame gabungan)
+    # - MA50_AOVol hanya ada di sebagian file -> dibuang, compute_features menghitung ulang untuk semua baris
+    # - Kolom numerik lain yang tidak ada (Foreign Buy/Sell, Change, ...) = 0, sama seperti file tanpa kolom itu
+    #   (Change % & Value sudah diturunkan per file oleh preprocess_raw)
+    if not all('MA50_AOVol' in f.columns for f in frames):
+        frames = [f.drop(columns='MA50_AOVol', errors='ignore') for f in frames]
+        columns = columns - {'MA50_AOVol'}
+    numeric = [col for col in columns if col in NUMERIC_COLS or col in FOREIGN_COLS]
+    aligned = []
+    for frame in frames:
+        missing = {col: 0.0 for col in numeric if col not in frame.columns}
+        aligned.append(frame.assign(**missing) if missing else frame)
+    return aligned
+
+
+def read_sources(openers, max_workers=MAX_LOAD_WORKERS):
+    # openers: callable tanpa argumen -> path / file-like (download ikut jalan di thread pool)
+    # read_csv & I/O Drive melepas GIL -> total waktu ~ file terlambat, bukan jumlah semua file
+    if len(openers) <= 1:
+        return _read_opened(openers[0]) if openers else None
+    with perf.stage('load.concurrent') as rec:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(openers))) as pool:
+            # copy_context: stage di thread pool tetap tercatat di perf run pemanggil
+            futures = [pool.submit(contextvars.copy_context().run, _read_opened, opener) for opener in openers]
+            frames = [f.result() for f in futures]
+        frames = [f for f in frames if f is not None]
+        rec['files'] = len(frames)
+    return merge_sources(frames) if frames else None
+
+
+def load_local(paths, max_workers=MAX_LOAD_WORKERS):
+    return read_sources([lambda path=path: path for path in paths], max_workers)
+
+
+# ==============================================================================
+# SUMBER + POLLER METADATA
+# Sumber = metadata() murah (stat / Drive files.get) + load() mahal (download + parse)
+# ==============================================================================
+class LocalSource:
+    def __init__(self, spec=None):
+        self.spec = spec  # None = env FREQ_DATA_FILE, dievaluasi ulang tiap poll (glob bisa dapat file baru)
+
+    def metadata(self):
+        entries = []
+        for path in local_source_paths(self.spec):
+            try:
+                st = os.stat(path)
+                entries.append({'id': path, 'name': os.path.basename(path), 'modified': st.st_mtime, 'size': st.st_size})
+            except FileNotFoundError:
+                entries.append({'id': path, 'name': os.path.basename(path), 'modified': None, 'size': None})
+        return entries
+
+    def load(self):
+        return load_local(local_source_paths(self.spec))
+
+    __call__ = load
+
+
+class DriveSource:
+    def __init__(self, service_account_info, folder_id=FOLDER_ID, pattern=FILE_NAME, relist_every=RELIST_EVERY):
+        self.info = service_account_info
+        self.folder_id = folder_id
+        self.pattern = pattern
+        self.relist_every = relist_every
+        self.files = None  # Hasil list terakhir: id di-cache, poll berikutnya cukup files.get per id
+        self._polls = 0
+
+    def _list(self):
+        self.files = list_drive_files(thread_drive_service(self.info), self.folder_id, self.pattern)
+        return self.files
+
+    def metadata(self):
+        self._polls += 1
+        if self.files is None or self._polls % self.relist_every == 0:
+            files = self._list()
+        else:
+            try:
+                service = thread_drive_service(self.info)
+                files = self.files = [drive_file_metadata(service, f['id']) for f in self.files]
+            except Exception:
+                files = self._list()  # File dihapus / diganti (id baru)
+        return [{'id': f['id'], 'name': f['name'], 'modified': f.get('modifiedTime'), 'size': f.get('size')} for f in files]
+
+    def load(self):
+        files = self.files if self.files is not None else self._list()
+        openers = [lambda f=f: open_drive_file(thread_drive_service(self.info), f['id'], f['name']) for f in files]
+        return read_sources(openers)
+
+    __call__ = load
+
+
+class SourcePoller:
+    # Thread background: metadata sumber dicek tiap `interval` detik, load ulang hanya kalau berubah
+    # current = (generation, DataFrame) diganti sekaligus -> dibaca session tanpa lock & tanpa menunggu download
+    def __init__(self, source, interval=POLL_INTERVAL):
+        self.source = source
+        self.interval = interval
+        self.metadata = None
+        self.current = (0, None)  # generation naik tiap data baru dimuat -> kunci cache fitur
+        self.loaded_at = None
+        self.last_check = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self):
+        # Satu poll. Return True kalau data dimuat ulang
+        with self._lock:
+            with perf.stage('load.poll') as rec:
+                metadata = self.source.metadata()
+                rec['files'] = len(metadata)
+            self.last_check = time.time()
+            generation, data = self.current
+            if data is not None and metadata == self.metadata:
+                return False
+            data = self.source.load()
+            if data is None:
+                raise RuntimeError("Sumber data kosong / file tidak ditemukan")
+            # Metadata diambil sebelum load: file berubah saat download -> poll berikutnya load lagi
+            self.metadata, self.loaded_at = metadata, time.time()
+            self.current = (generation + 1, data)
+            self.last_error = None
+            return True
+
+    def start(self, on_change=None):
+        # on_change(poller) dipanggil di thread poller setiap data baru dimuat
+        if self._thread is not None:
+            return self
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    if self.check() and on_change is not None:
+                        on_change(self)
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Gagal cek sumber data: {e}")
+        self._thread = threading.Thread(target=loop, name='source-poller', daemon=True)
+        self._thread.start()
+        return self
+
+    def invalidate(self):
+        # Pemakai data gagal memproses -> poll berikutnya load ulang walau metadata sama
+        self.metadata = None
+
+    @property
+    def data(self):
+        return self.current[1]
+
+    def source_modified(self):
+        # modifiedTime terbaru di antara file sumber (epoch detik), None kalau tidak diketahui
+        stamps = [m['modified'] for m in self.metadata or [] if m['modified'] is not None]
+        if not stamps:
+            return None
+        return max(pd.Timestamp(t).timestamp() if isinstance(t, str) else t for t in stamps)
+
+
+def add_source_args(parser):
+    # Argumen CLI sumber data (api_server.py, worker.py)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--csv', nargs='+', help="Path / glob file kompilasi lokal: CSV (boleh .gz/.zst/.zip) atau Parquet (beberapa file digabung)")
+    src.add_argument('--service-account', help="Path JSON service account Google Drive")
+    parser.add_argument('--drive-pattern', default=drive_pattern(), help="Nama / glob file di folder Drive")
+
+
+def make_source(args):
+    # Sumber (callable -> DataFrame mentah, .metadata() untuk poller); glob dievaluasi ulang tiap load
+    if args.csv:
+        return LocalSource(args.csv)
+    return DriveSource(service_account_info_from_file(args.service_account), pattern=args.drive_pattern)
@@ -0,0 +1,237 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import datastore
+import engine
+import loader
+import perf
+
+# ==============================================================================
+# LOADTEST: N session konkuren terhadap app.py (Streamlit AppTest + data sintetis lokal, tanpa network)
+# Jalankan: python loadtest.py --sessions 8 --rounds 10
+#           python loadtest.py --sessions 4 --stocks 800 --days 500 --json hasil.json
+#           python loadtest.py --sessions 8 --store /tmp/freq-lt   (mode worker: session hanya memory-map)
+#
+# - AppTest memakai runtime global (satu session per proses), jadi tiap session = satu proses.
+#   Cache proses (feature store) tidak dibagi: pakai --store supaya semua session memory-map satu
+#   versi terpublikasi seperti deployment mode worker (PSS = memori setelah page bersama dibagi)
+# - Tiap session membuka dashboard (latency 'open' = cold start), menunggu semua session siap,
+#   lalu menjalankan interaksi acak bersamaan (seed per session): ganti saham / timeframe Deep Dive,
+#   mode & filter Screener, mode Bluechip, backtest Research Lab
+# - Laporan: latency p50/p90/p99 per interaksi, throughput fase konkuren, RSS / PSS / peak per session
+# ==============================================================================
+HERE = os.path.dirname(os.path.abspath(__file__))
+SECTORS = ['Finance', 'Energy', 'Consumer', 'Infrastructure', 'Basic Materials', 'Technology']
+
+
+def synthetic_data(path, n_stocks=200, n_days=260, seed=0):
+    # CSV kompilasi sintetis (kolom sama dengan file Drive): random walk harga, volume & frekuensi acak
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-01', periods=n_days).strftime('%Y-%m-%d')
+    frames = []
+    for i in range(n_stocks):
+        code = f'S{i:04d}'
+        close = np.maximum(np.round(rng.uniform(100, 5000) * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))), 1)
+        previous = np.r_[close[0], close[:-1]]
+        volume = rng.integers(1_000, 100_000, n_days).astype(float) * rng.uniform(0.1, 10)
+        frequency = rng.integers(10, 2_000, n_days).astype(float)
+        frames.append(pd.DataFrame({
+            'Stock Code': code, 'Company Name': f'PT {code}', 'Sector': SECTORS[i % len(SECTORS)],
+            'Last Trading Date': dates, 'Previous': previous, 'Open Price': previous,
+            'High': np.round(close * 1.02), 'Low': np.round(close * 0.98), 'Close': close, 'Change': close - previous,
+            'Volume': volume, 'Frequency': frequency, 'Value': close * volume * 100, 'Avg_Order_Volume': volume / frequency,
+            'Foreign Buy': rng.integers(0, 10**9, n_days), 'Foreign Sell': rng.integers(0, 10**9, n_days), 'Free Float': 30.0,
+        }))
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+# ==============================================================================
+# INTERAKSI (satu rerun per interaksi)
+# ==============================================================================
+def _by_label(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def deepdive_stock(at, rng):
+    box = at.selectbox(key='deepdive_stock')
+    box.set_value(rng.choice(box.options)).run()
+
+
+def deepdive_timeframe(at, rng):
+    radio = at.radio(key='deepdive_tf')
+    radio.set_value(rng.choice(radio.options)).run()
+
+
+def screener_mode(at, rng):
+    radio = _by_label(at.radio, "Metode Scanning:")
+    radio.set_value(rng.choice(radio.options)).run()
+
+
+def screener_price(at, rng):
+    box = _by_label(at.selectbox, "Filter Kondisi Harga:")
+    box.set_value(rng.choice(box.options)).run()
+
+
+def bluechip_mode(at, rng):
+    radio = at.radio(key='bc_scan_mode')
+    radio.set_value(rng.choice(radio.options)).run()
+
+
+def backtest(at, rng):
+    # Selectbox dengan format_func: set_value pakai nilai asli, bukan label yang tampil
+    at.selectbox(key='benchmark').set_value(rng.choice(engine.BENCHMARKS))
+    next(b for b in at.button if 'BACKTEST' in b.label).click().run()
+
+
+# Bobot = seberapa sering interaksi dipilih (navigasi lebih sering dari backtest)
+INTERACTIONS = {
+    'deepdive_stock': (deepdive_stock, 4),
+    'deepdive_timeframe': (deepdive_timeframe, 2),
+    'screener_mode': (screener_mode, 2),
+    'screener_price': (screener_price, 2),
+    'bluechip_mode': (bluechip_mode, 1),
+    'backtest': (backtest, 1),
+}
+
+
+# ==============================================================================
+# RUNNER
+# ==============================================================================
+def pss_bytes():
+    # Proportional set size (page bersama dibagi rata antar proses), None kalau /proc tidak ada
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _timed(results, session_id, name, action, at, rng):
+    started = time.perf_counter()
+    error = None
+    try:
+        action(at, rng)
+        if at.exception:
+            error = at.exception[0].value
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    results.append({'session': session_id, 'interaction': name, 'ms': (time.perf_counter() - started) * 1000, 'error': error})
+
+
+def run_session(session_id, rounds, seed, timeout, barrier, queue):
+    # Satu analis (proses sendiri): buka dashboard, tunggu session lain, lalu `rounds` interaksi acak
+    testing = perf.timed_import('streamlit.testing.v1')
+    rng = random.Random(seed + session_id)
+    results = []
+    at = testing.AppTest.from_file(os.path.join(HERE, 'app.py'), default_timeout=timeout)
+    _timed(results, session_id, 'open', lambda at, rng: at.run(), at, rng)
+    rss_open = perf.rss_bytes()
+
+    barrier.wait()
+    started = time.time()
+    names = list(INTERACTIONS)
+    for name in rng.choices(names, [INTERACTIONS[n][1] for n in names], k=rounds):
+        _timed(results, session_id, name, INTERACTIONS[name][0], at, rng)
+    queue.put({
+        'session': session_id, 'results': results, 'started': started, 'finished': time.time(),
+        'rss_open': rss_open, 'rss_end': perf.rss_bytes(), 'pss_end': pss_bytes(),
+        'rss_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    })
+
+
+def run_load(n_sessions, rounds, seed=0, timeout=300):
+    # Return (DataFrame hasil per interaksi, DataFrame memori per session, ringkasan)
+    ctx = multiprocessing.get_context('spawn')  # Proses bersih: tidak mewarisi state Streamlit / thread
+    barrier, queue = ctx.Barrier(n_sessions), ctx.Queue()
+    procs = [ctx.Process(target=run_session, args=(i, rounds, seed, timeout, barrier, queue), name=f'session-{i}')
+             for i in range(n_sessions)]
+    for proc in procs:
+        proc.start()
+    reports = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    results = pd.DataFrame([r for report in reports for r in report['results']])
+    memory = pd.DataFrame([{k: report[k] / 1e6 if report[k] is not None else None for k in ('rss_open', 'rss_end', 'pss_end', 'rss_peak')}
+                           for report in reports], index=[report['session'] for report in reports]).sort_index()
+    # Throughput fase konkuren: sejak session pertama mulai s.d. session terakhir selesai (tanpa 'open')
+    wall = max(r['finished'] for r in reports) - min(r['started'] for r in reports)
+    concurrent = int((results['interaction'] != 'open').sum())
+    summary = {
+        'sessions': n_sessions, 'interactions': concurrent, 'wall_s': wall,
+        'throughput_per_s': concurrent / wall if wall > 0 else None,
+        'errors': int(results['error'].notna().sum()),
+        'rss_per_session_mb': memory['rss_end'].mean(), 'pss_per_session_mb': memory['pss_end'].mean(),
+        'rss_peak_max_mb': memory['rss_peak'].max(), 'pss_total_mb': memory['pss_end'].sum(),
+    }
+    return results, memory, summary
+
+
+def latency_table(results):
+    # Percentil latency per interaksi (+ baris 'all')
+    frame = pd.concat([results, results.assign(interaction='all')])
+    table = frame.groupby('interaction')['ms'].describe(percentiles=[0.5, 0.9, 0.99])
+    table = table.rename(columns={'50%': 'p50', '90%': 'p90', '99%': 'p99'})[['count', 'p50', 'p90', 'p99', 'max']]
+    table['errors'] = frame.groupby('interaction')['error'].count()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frequency Analyzer concurrent-session load test")
+    parser.add_argument('--sessions', type=int, default=4, help="Jumlah session konkuren")
+    parser.add_argument('--rounds', type=int, default=10, help="Interaksi per session (setelah buka dashboard)")
+    parser.add_argument('--stocks', type=int, default=200)
+    parser.add_argument('--days', type=int, default=260)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help="Timeout per rerun (detik)")
+    parser.add_argument('--store', help="Mode worker: publish data sintetis ke direktori ini, session membaca versi terpublikasi")
+    parser.add_argument('--json', help="Simpan hasil mentah + ringkasan ke file JSON")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='freq-loadtest-')
+    with perf.stage('loadtest.synthetic') as rec:
+        path = synthetic_data(os.path.join(data_dir, 'synthetic.csv'), args.stocks, args.days, args.seed)
+        rec['rows'] = args.stocks * args.days
+    # Sumber lokal saja (tanpa Drive / network); screens tersimpan & ledger diisolasi di direktori temp
+    os.environ[loader.LOCAL_FILE_ENV] = path
+    os.environ.setdefault('FREQ_SCREENS_DIR', os.path.join(data_dir, 'screens'))
+    os.environ.setdefault(datastore.LEDGER_DIR_ENV, data_dir)
+    os.environ.pop(datastore.STORE_DIR_ENV, None)
+    if args.store:
+        import worker
+        version, _ = worker.run_once(loader.LocalSource(path), args.store, {})
+        os.environ[datastore.STORE_DIR_ENV] = args.store
+        print(f"Data sintetis dipublikasikan ke {args.store} (versi {version})")
+
+    print(f"Data sintetis: {args.stocks} saham x {args.days} hari -> {path}")
+    results, memory, summary = run_load(args.sessions, args.rounds, args.seed, args.timeout)
+    print(latency_table(results).round(1).to_string())
+    print()
+    print(memory.round(1).rename_axis('session').to_string())
+    print()
+    for key, value in summary.items():
+        print(f"{key:>20}: {value:,.2f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    errors = results.dropna(subset=['error'])
+    if not errors.empty:
+        print("\nError pertama:")
+        print(errors.groupby('interaction')['error'].first().to_string())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'memory': memory.to_dict('index'), 'results': results.to_dict('records')}, f, indent=1, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import engine
+import loader
+import perf
+from engine import DETECTORS, MAD_SCALE, ROBUST_MIN_PERIODS, ROBUST_WINDOW, SPLIT_RATIO, WHALE_RATIO
+
+# ==============================================================================
+# PARITY: Dual-run jalur referensi (pandas apa adanya, semantik app.py awal) vs jalur optimized engine
+# Jalankan: python parity.py --csv Kompilasi_Data_1Tahun.csv
+#           python parity.py --stocks 300 --days 400          (data sintetis, tanpa file / network)
+#
+# - Referensi: groupby + rolling / rank / filter boolean / shift per saham, dihitung dari nol
+# - Optimized: build_feature_set (inkremental: versi pertama tanpa N tanggal terakhir, lalu data tanpa
+#   R tanggal pertama = tanggal tertua keluar dari window sumber),
+#   Panel, PrefixIndex, rules, MarketIndex -- jalur yang dipakai app.py / worker.py / api_server.py
+# - Tiap kolom turunan & output screener/backtest dibandingkan dengan toleransi per kolom
+#   (NaN == NaN); baris yang hanya ada di satu sisi = mismatch (kecuali seri di batas top-50)
+# - Screener & backtest referensi membaca kolom fitur optimized (fitur sudah dicek di check 'features'),
+#   jadi mismatch screener menunjuk ke jalur screening (Panel / PrefixIndex / rules), bukan fitur
+# - Exit code 1 kalau ada mismatch -> dipakai sebagai gate sebelum optimasi di-merge
+# ==============================================================================
+DEFAULT_TOL = {'rtol': 1e-9, 'atol': 1e-9}
+# Kolom float32 (persentil panel) & agregat dari prefix-sum (selisih cumsum) punya error pembulatan
+COLUMN_TOL = {
+    'AOV_Pct': {'rtol': 0, 'atol': 1e-4}, 'Value_Pct': {'rtol': 0, 'atol': 1e-4}, 'Foreign_Pct': {'rtol': 0, 'atol': 1e-4},
+    'Avg_AOV_Ratio': {'rtol': 1e-6, 'atol': 1e-9}, 'Avg_Value': {'rtol': 1e-6, 'atol': 1e-3},
+    'Avg_Change': {'rtol': 1e-6, 'atol': 1e-6}, 'Total_Net_Foreign': {'rtol': 1e-6, 'atol': 1e-3},
+}
+FEATURE_COLS = ['MA50_AOVol', 'AOV_Ratio', 'Whale_Signal', 'Split_Signal', 'Net Foreign', 'MA20_Value', 'Value_Ratio',
+                'AOV_RobustZ', 'Whale_Signal_Robust', 'Split_Signal_Robust', 'AOV_Pct', 'Value_Pct', 'Foreign_Pct']
+BAR_COLS = ['Open Price', 'High', 'Low', 'Close', 'Volume', 'Frequency', 'Value', 'Net Foreign', 'Last Trading Date',
+            'Avg_Order_Volume', 'MA_AOVol', 'AOV_Ratio', 'Whale_Signal', 'Split_Signal', 'Change %']
+PRICE_CONDITIONS = engine.PRICE_CONDITIONS
+SCREEN_PERIOD = 10
+# Filter Value screener = kuantil Value seluruh data; rendah supaya hari AOV rendah (Split) tetap ikut dicek
+MIN_VALUE_QUANTILE = 0.1
+HOLD_DAYS = (5, 10, 20)
+INCREMENTAL_DAYS = 5
+ROLLOFF_DAYS = 1
+
+
+# ==============================================================================
+# REFERENSI (pandas apa adanya)
+# ==============================================================================
+def reference_features(df, source_ma50=None):
+    # df: frame terurut + corporate action adjusted (input yang sama dengan jalur optimized)
+    ref = pd.DataFrame(index=df.index)
+    ma50 = df.groupby('Stock Code')['Adj_AOV'].transform(lambda x: x.rolling(50, min_periods=1).mean())
+    if source_ma50 is not None:
+        # MA50 dari sumber dipakai, kecuali saham yang kena corporate action (dihitung ulang dari AOV adjusted)
+        affected = df.groupby('Stock Code')['CA_Factor'].transform(lambda f: (f != 1).any())
+        ma50 = source_ma50.reindex(df.index).where(~affected, ma50)
+    ref['MA50_AOVol'] = ma50
+    ref['AOV_Ratio'] = np.where(ma50 > 0, df['Adj_AOV'] / ma50, 0)
+    ref['Whale_Signal'] = ref['AOV_Ratio'] >= WHALE_RATIO
+    ref['Split_Signal'] = (ref['AOV_Ratio'] <= SPLIT_RATIO) & (ref['AOV_Ratio'] > 0)
+    if 'Foreign Buy' in df.columns and 'Foreign Sell' in df.columns:
+        ref['Net Foreign'] = (df['Foreign Buy'] - df['Foreign Sell']).fillna(0)
+    else:
+        ref['Net Foreign'] = 0
+    ref['MA20_Value'] = df.groupby('Stock Code')['Value'].transform(lambda x: x.rolling(20, min_periods=1).mean())
+    ref['Value_Ratio'] = np.where(ref['MA20_Value'] > 0, df['Value'] / ref['MA20_Value'], 0)
+
+    def robust_z(x):
+        med = x.rolling(ROBUST_WINDOW, min_periods=ROBUST_MIN_PERIODS).median()
+        mad = (x - med).abs().rolling(ROBUST_WINDOW, min_periods=ROBUST_MIN_PERIODS).median()
+        return pd.Series(np.nan_to_num(np.where(mad > 0, (x - med) / (MAD_SCALE * mad), 0)), index=x.index)
+    ref['AOV_RobustZ'] = np.log(df['Adj_AOV'].where(df['Adj_AOV'] > 0)).groupby(df['Stock Code']).transform(robust_z)
+    robust = DETECTORS['robust']
+    ref['Whale_Signal_Robust'] = ref['AOV_RobustZ'] >= robust['whale']
+    ref['Split_Signal_Robust'] = (ref['AOV_RobustZ'] <= robust['split']) & (ref['AOV_Ratio'] > 0)
+
+    # Persentil harian: rank 'max' dalam tanggal yang sama, 100 = tertinggi
+    for col, pct_col in engine.RANK_COLS.items():
+        ref[pct_col] = ref[col].groupby(df['Last Trading Date']).rank(method='max', pct=True) * 100
+    return ref
+
+
+def reference_bars(df, timeframe):
+    # Bar dari nol (tanpa bar lama): harga adjusted, groupby (saham, periode)
+    rows = engine.adjusted_prices(df)
+    period = rows['Last Trading Date'].dt.to_period(engine.TIMEFRAMES[timeframe]['period'])
+    agg = {k: v for k, v in engine.BAR_AGG.items() if k in rows.columns}
+    bars = rows.groupby([rows['Stock Code'], period.rename('Period')]).agg(agg).reset_index()
+    bars['Avg_Order_Volume'] = np.where(bars['Frequency'] > 0, bars['Volume'] / bars['Frequency'], 0)
+    ma_bars = engine.TIMEFRAMES[timeframe]['ma_bars']
+    bars['MA_AOVol'] = bars.groupby('Stock Code')['Avg_Order_Volume'].transform(lambda x: x.rolling(ma_bars, min_periods=1).mean())
+    bars['AOV_Ratio'] = np.where(bars['MA_AOVol'] > 0, bars['Avg_Order_Volume'] / bars['MA_AOVol'], 0)
+    bars['Whale_Signal'] = bars['AOV_Ratio'] >= WHALE_RATIO
+    bars['Split_Signal'] = (bars['AOV_Ratio'] <= SPLIT_RATIO) & (bars['AOV_Ratio'] > 0)
+    prev_close = bars.groupby('Stock Code')['Close'].shift(1)
+    bars['Change %'] = np.where(prev_close > 0, (bars['Close'] / prev_close - 1) * 100, 0)
+    return bars
+
+
+def reference_breadth(df):
+    # Jumlah & Value saham bersinyal per (tanggal, sektor), groupby langsung atas df
+    signals = {
+        'whale': df['Whale_Signal'], 'split': df['Split_Signal'],
+        'whale_robust': df['Whale_Signal_Robust'], 'split_robust': df['Split_Signal_Robust'],
+        'bluechip': (df['Value'] >= engine.BLUECHIP_MIN_VALUE) & (df['AOV_Ratio'] >= engine.BLUECHIP_AOV_RATIO),
+    }
+    frame = pd.DataFrame({'Last Trading Date': df['Last Trading Date'], 'Sector': df['Sector'].fillna(engine.NO_SECTOR), 'Stocks': 1, 'Value': df['Value']})
+    for signal, mask in signals.items():
+        frame[f'{signal}_Count'] = mask.astype(int)
+        frame[f'{signal}_Value'] = df['Value'].where(mask, 0)
+    return frame.groupby(['Last Trading Date', 'Sector']).sum().reset_index()
+
+
+def reference_price_context(suspects, condition):
+    if suspects.empty or condition == 'all':
+        return suspects
+    if condition == 'hidden_gem':
+        return suspects[(suspects['Change %'] >= -2.0) & (suspects['Change %'] <= 2.0)]
+    if condition == 'early_move':
+        return suspects[(suspects['Change %'] > 0) & (suspects['Change %'] <= 4.0)]
+    tp = (suspects['High'] + suspects['Low'] + suspects['Close']) / 3
+    vp = tp * suspects['Volume']
+    vwma = vp.groupby(suspects['Stock Code']).transform(lambda x: x.rolling(20).sum() / x.rolling(20).sum())
+    return suspects[(suspects['Close'] < vwma) | (suspects['Change %'] < 0)]
+
+
+def _reference_window(df, period):
+    max_date = df['Last Trading Date'].max()
+    if period:
+        return df[df['Last Trading Date'] >= engine.period_start(max_date, period)]
+    return df[df['Last Trading Date'] == max_date]
+
+
+def reference_anomaly(df, mode, min_value, price_condition='all', period=None, detector='ratio'):
+    cfg = DETECTORS[detector]
+    target = _reference_window(df, period)
+    x = target[cfg['col']]
+    if mode == 'whale':
+        suspects = target[(x >= cfg['screener_whale']) & (target['Value'] >= min_value)]
+    else:
+        suspects = target[(x <= cfg['split']) & (target['AOV_Ratio'] > 0) & (target['Value'] >= min_value)]
+    suspects = reference_price_context(suspects, price_condition)
+    if period:
+        summary = suspects.groupby(['Stock Code', 'Company Name']).agg(
+            Total_Signals=('Last Trading Date', 'count'), Last_Signal=('Last Trading Date', 'max'),
+            Avg_AOV_Ratio=('AOV_Ratio', 'mean'), Avg_Value=('Value', 'mean'),
+            Latest_Close=('Close', 'last'), Avg_Change=('Change %', 'mean')
+        ).reset_index()
+        return summary.sort_values(by='Total_Signals', ascending=False).head(50)
+    x = suspects[cfg['col']]
+    if mode == 'whale':
+        score = ((x - cfg['whale']) / (cfg['whale_max'] - cfg['whale']) * 80 + 20).clip(0, 99)
+    else:
+        score = ((cfg['split'] - x) / (cfg['split'] - cfg['split_min']) * 80 + 20).clip(0, 99)
+    return suspects.assign(Conviction_Score=score).sort_values(by=cfg['col'], ascending=False)
+
+
+def reference_bluechip(df, min_value, aov_threshold, price_condition='all', period=None, detector='ratio'):
+    target = _reference_window(df, period)
+    suspects = target[(target['Value'] >= min_value) & (target[DETECTORS[detector]['col']] >= aov_threshold)]
+    suspects = reference_price_context(suspects, price_condition)
+    if period:
+        summary = suspects.groupby(['Stock Code', 'Company Name']).agg(
+            Freq_Muncul=('Last Trading Date', 'count'), Total_Net_Foreign=('Net Foreign', 'sum'),
+            Avg_Value=('Value', 'mean'), Avg_AOV_Ratio=('AOV_Ratio', 'mean'),
+            Last_Close=('Close', 'last'), Avg_Change=('Change %', 'mean')
+        ).reset_index()
+        return summary.sort_values(by='Total_Net_Foreign', ascending=False).head(50)
+    return suspects.sort_values(by='Value', ascending=False)
+
+
+def reference_backtest(df, signal_mask, hold_days):
+    # Forward return = shift(-d) Adj_Close per saham; excess vs index value-weighted (bobot Value kemarin)
+    grouped = df.groupby('Stock Code')
+    daily = grouped['Adj_Close'].pct_change(fill_method=None)
+    weight = grouped['Value'].shift(1)
+    valid = np.isfinite(daily) & (weight > 0)
+    index_return = (daily * weight)[valid].groupby(df['Last Trading Date'][valid]).sum() / weight[valid].groupby(df['Last Trading Date'][valid]).sum()
+    level = (1 + index_return.reindex(np.sort(df['Last Trading Date'].unique())).fillna(0)).cumprod()
+
+    signals = df[signal_mask]
+    result = pd.DataFrame(index=signals.index)
+    for d in hold_days:
+        exit_close = grouped['Adj_Close'].shift(-d)[signal_mask]
+        exit_date = grouped['Last Trading Date'].shift(-d)[signal_mask]
+        result[f'Return_{d}D'] = exit_close / signals['Adj_Close'] - 1
+        benchmark = level.reindex(exit_date).to_numpy() / level.reindex(signals['Last Trading Date']).to_numpy() - 1
+        result[f'Excess_{d}D'] = result[f'Return_{d}D'] - benchmark
+    return result
+
+
+# ==============================================================================
+# DIFF
+# ==============================================================================
+def diff_columns(ref, opt, cols):
+    # Per kolom: jumlah baris beda di luar toleransi + selisih absolut terbesar
+    out = []
+    for col in cols:
+        a, b = ref[col].to_numpy(), opt[col].to_numpy()
+        if a.dtype.kind in 'bOUM' or b.dtype.kind in 'bOUM':
+            same = (a == b) | (pd.isna(a) & pd.isna(b))
+            max_diff = float('nan')
+        else:
+            a, b = a.astype(np.float64), b.astype(np.float64)
+            tol = COLUMN_TOL.get(col, DEFAULT_TOL)
+            same = np.isclose(a, b, equal_nan=True, **tol)
+            with np.errstate(invalid='ignore'):
+                diffs = np.abs(a - b)[~same]
+            max_diff = float(np.nanmax(diffs)) if len(diffs) and not np.isnan(diffs).all() else (float('inf') if len(diffs) else 0.0)
+        out.append({'column': col, 'mismatched': int((~same).sum()), 'max_abs_diff': max_diff,
+                    'example': None if same.all() else int(np.flatnonzero(~same)[0])})
+    return out
+
+
+def diff_frames(ref, opt, keys, cols, tie_col=None):
+    # Join per kunci; baris yang hanya ada di satu sisi dihitung mismatch.
+    # tie_col: hasil top-N -> baris yang hilang dengan nilai sama dengan batas bawah (seri) dimaafkan
+    merged = ref[keys + cols].merge(opt[keys + cols], on=keys, how='outer', suffixes=('_ref', '_opt'), indicator=True)
+    one_side = merged[merged['_merge'] != 'both']
+    if tie_col is not None and not one_side.empty:
+        cutoff = min(ref[tie_col].min(), opt[tie_col].min())
+        side_value = one_side[f'{tie_col}_ref'].fillna(one_side[f'{tie_col}_opt'])
+        one_side = one_side[side_value != cutoff]
+    both = merged[merged['_merge'] == 'both']
+    columns = diff_columns(both.rename(columns=lambda c: c[:-4] if c.endswith('_ref') else c),
+                           both.rename(columns=lambda c: c[:-4] if c.endswith('_opt') else c), cols)
+    return len(one_side), columns
+
+
+class Report:
+    def __init__(self):
+        self.rows = []
+        self.details = {}  # check -> kolom yang mismatch
+
+    def add(self, check, rows, columns, ref_s, opt_s, missing=0):
+        worst = max(columns, key=lambda c: c['mismatched'], default=None)
+        mismatched = sum(c['mismatched'] for c in columns) + missing
+        self.rows.append({
+            'check': check, 'rows': rows, 'mismatched': mismatched, 'missing_rows': missing,
+            'worst_column': worst['column'] if worst and worst['mismatched'] else '',
+            'max_abs_diff': max((c['max_abs_diff'] for c in columns if c['mismatched']), default=0.0),
+            'ref_ms': ref_s * 1000, 'opt_ms': opt_s * 1000, 'speedup': ref_s / opt_s if opt_s > 0 else float('inf'),
+        })
+        self.details[check] = [c for c in columns if c['mismatched']]
+
+    def frame(self):
+        return pd.DataFrame(self.rows)
+
+    @property
+    def ok(self):
+        return all(r['mismatched'] == 0 for r in self.rows)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+# ==============================================================================
+# DUAL RUN
+# ==============================================================================
+def build_optimized(df_raw, incremental_days=INCREMENTAL_DAYS, rolloff_days=ROLLOFF_DAYS):
+    # Jalur produksi: versi pertama tanpa N tanggal terakhir, lalu data tanpa R tanggal pertama
+    # (sumber rolling 1 tahun: tanggal baru masuk, tanggal tertua keluar) -> ranks, bar & breadth inkremental
+    store = {}
+    dates = np.sort(df_raw['Last Trading Date'].unique())
+    if incremental_days and len(dates) > incremental_days + rolloff_days:
+        engine.build_feature_set(df_raw[df_raw['Last Trading Date'] < dates[-incremental_days]].copy(), store)
+    final = df_raw[df_raw['Last Trading Date'] >= dates[rolloff_days]] if incremental_days and rolloff_days else df_raw
+    df, seconds = _timed(engine.build_feature_set, final.copy(), store)
+    return store, seconds
+
+
+def run_checks(df_raw, incremental_days=INCREMENTAL_DAYS, rolloff_days=ROLLOFF_DAYS, hold_days=HOLD_DAYS):
+    report = Report()
+    with perf.stage('parity.optimized_build', len(df_raw)):
+        store, opt_s = build_optimized(df_raw, incremental_days, rolloff_days)
+    df, prefix, panel = store['df'], store['prefix'], store['panel']
+
+    # 1. Fitur Section 3 + persentil (input: frame terurut & adjusted yang sama, MA50 sumber dari data mentah)
+    source_ma50 = df_raw['MA50_AOVol'] if 'MA50_AOVol' in df_raw.columns else None
+    ref, ref_s = _timed(reference_features, df, source_ma50)
+    report.add('features', len(df), diff_columns(ref, df, FEATURE_COLS), ref_s, opt_s)
+
+    # 2. Bar mingguan / bulanan (optimized = hasil inkremental di store)
+    for tf in engine.TIMEFRAMES:
+        ref_bars, ref_s = _timed(reference_bars, df, tf)
+        _, opt_bar_s = _timed(engine.resample_bars, df, tf)
+        missing, columns = diff_frames(ref_bars, store[f'bars_{tf}'], ['Stock Code', 'Period'], BAR_COLS)
+        report.add(f'bars_{tf}', len(ref_bars), columns, ref_s, opt_bar_s, missing)
+
+    # 2b. Market breadth (optimized = agregat inkremental di store)
+    ref_breadth, ref_s = _timed(reference_breadth, df)
+    _, opt_breadth_s = _timed(engine.market_breadth, df, panel=panel)
+    breadth_cols = [c for c in ref_breadth.columns if c not in ('Last Trading Date', 'Sector')]
+    missing, columns = diff_frames(ref_breadth, store['breadth'], ['Last Trading Date', 'Sector'], breadth_cols)
+    report.add('breadth', len(ref_breadth), columns, ref_s, opt_breadth_s, missing)
+
+    # 3. Screener (snapshot & period) per mode, kondisi harga, detektor
+    min_value = df['Value'].quantile(MIN_VALUE_QUANTILE)
+    for detector in DETECTORS:
+        for condition in PRICE_CONDITIONS:
+            for period in (None, SCREEN_PERIOD):
+                label = f"{detector}/{condition}/{'P' + str(period) if period else 'D'}"
+                for mode in engine.ANOMALY_MODES:
+                    ref_out, ref_s = _timed(reference_anomaly, df, mode, min_value, condition, period, detector)
+                    opt_out, opt_s = _timed(engine.anomaly_screen, df, prefix, panel, mode, min_value, condition, period=period, detector=detector)
+                    if period:
+                        missing, columns = diff_frames(ref_out, opt_out, ['Stock Code'], ['Total_Signals', 'Last_Signal', 'Avg_AOV_Ratio', 'Avg_Value', 'Latest_Close', 'Avg_Change'], tie_col='Total_Signals')
+                    else:
+                        missing, columns = diff_frames(ref_out, opt_out, ['Stock Code', 'Last Trading Date'], ['Conviction_Score'])
+                    report.add(f'{mode} {label}', len(ref_out), columns, ref_s, opt_s, missing)
+
+                aov_threshold = engine.BLUECHIP_AOV_RATIO if detector == 'ratio' else 1.0
+                ref_out, ref_s = _timed(reference_bluechip, df, min_value, aov_threshold, condition, period, detector)
+                opt_out, opt_s = _timed(engine.bluechip_screen, df, prefix, panel, min_value, aov_threshold, condition, period=period, detector=detector)
+                if period:
+                    missing, columns = diff_frames(ref_out, opt_out, ['Stock Code'], ['Freq_Muncul', 'Total_Net_Foreign', 'Avg_Value', 'Avg_AOV_Ratio', 'Last_Close', 'Avg_Change'], tie_col='Total_Net_Foreign')
+                else:
+                    missing, columns = diff_frames(ref_out, opt_out, ['Stock Code', 'Last Trading Date'], ['Value', 'Net Foreign'])
+                report.add(f'bluechip {label}', len(ref_out), columns, ref_s, opt_s, missing)
+
+    # 4. Backtest (forward return & excess vs index value-weighted)
+    for detector in DETECTORS:
+        whale, _ = engine.anomaly_masks(df, detector, whale_key='screener_whale')
+        signal_mask = whale & (df['Value'] >= min_value)
+        ref_out, ref_s = _timed(reference_backtest, df, signal_mask, hold_days)
+        opt_out, opt_s = _timed(engine.backtest_signals, prefix, signal_mask, hold_days, store['market'], 'market_value')
+        cols = [f'{kind}_{d}D' for d in hold_days for kind in ('Return', 'Excess')]
+        report.add(f'backtest {detector}', len(ref_out), diff_columns(ref_out, opt_out.set_index(ref_out.index), cols), ref_s, opt_s)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frequency Analyzer reference vs optimized parity check")
+    parser.add_argument('--csv', nargs='+', help="Path / glob file sumber (default: data sintetis)")
+    parser.add_argument('--stocks', type=int, default=200, help="Data sintetis: jumlah saham")
+    parser.add_argument('--days', type=int, default=260, help="Data sintetis: jumlah hari")
+    parser.add_argument('--incremental-days', type=int, default=INCREMENTAL_DAYS, help="Build pertama tanpa N tanggal terakhir (0 = build penuh sekali)")
+    parser.add_argument('--rolloff-days', type=int, default=ROLLOFF_DAYS, help="Build kedua tanpa R tanggal pertama (roll-off window sumber)")
+    parser.add_argument('--details', action='store_true', help="Tampilkan kolom yang mismatch per check")
+    args = parser.parse_args()
+
+    if args.csv:
+        df_raw = loader.load_local(loader.local_source_paths(args.csv))
+    else:
+        import loadtest
+        path = loadtest.synthetic_data(os.path.join(tempfile.mkdtemp(prefix='freq-parity-'), 'synthetic.csv'), args.stocks, args.days)
+        df_raw = loader.load_local([path])
+
+    report = run_checks(df_raw, args.incremental_days, args.rolloff_days)
+    frame = report.frame()
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(frame.round({'max_abs_diff': 9, 'ref_ms': 1, 'opt_ms': 1, 'speedup': 1}).to_string(index=False))
+    totals = frame[['ref_ms', 'opt_ms']].sum()
+    print(f"\nTotal referensi {totals['ref_ms']:,.0f} ms, optimized {totals['opt_ms']:,.0f} ms (speedup {totals['ref_ms'] / totals['opt_ms']:.1f}x)")
+    if args.details:
+        for check, columns in report.details.items():
+            for c in columns:
+                print(f"  {check}: {c['column']} {c['mismatched']} baris, max |diff| {c['max_abs_diff']}, contoh baris {c['example']}")
+    print("PARITY OK" if report.ok else "PARITY MISMATCH")
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import contextvars
+import importlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ==============================================================================
+# PERF: Timing per stage pipeline (wall time, baris, delta memori)
+# - Record per rerun ditampilkan di sidebar panel (app.py)
+# - JSON lines ke file kalau env FREQ_PERF_LOG di-set
+# - Agregat per stage diekspor sebagai teks Prometheus (/metrics di api_server.py)
+# - Budget alokasi per rerun (env FREQ_MEM_BUDGET_MB) dicek sebelum frame besar dibuat
+# ==============================================================================
+PERF_LOG_ENV = 'FREQ_PERF_LOG'
+MEM_BUDGET_ENV = 'FREQ_MEM_BUDGET_MB'
+BOOT_TS_ENV = 'FREQ_BOOT_TS'  # Di-set serve.py: epoch detik saat launcher mulai
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_current_run = contextvars.ContextVar('perf_run', default=None)
+_totals = {}
+_totals_lock = threading.Lock()
+_log_lock = threading.Lock()
+_once_keys = set()
+_once_lock = threading.Lock()
+_imported_at = time.time()
+
+
+def rss_bytes():
+    # RSS saat ini (Linux /proc), fallback ke peak RSS
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def boot_ts():
+    # Waktu boot proses: env dari serve.py, lalu start time proses (/proc), fallback waktu import modul ini
+    value = os.environ.get(BOOT_TS_ENV)
+    if value:
+        return float(value)
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, IndexError, ValueError):
+        return _imported_at
+
+
+def once(key):
+    # True hanya untuk pemanggilan pertama di proses ini
+    with _once_lock:
+        if key in _once_keys:
+            return False
+        _once_keys.add(key)
+        return True
+
+
+def timed_import(module_name):
+    # Import lazy modul berat; stage 'import.<modul>' hanya tercatat saat benar-benar di-load
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with stage(f'import.{module_name}'):
+        return importlib.import_module(module_name)
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+class PerfRun:
+    # Kumpulan record satu eksekusi (satu rerun Streamlit / satu request)
+    def __init__(self, name):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:8]
+        self.started = time.time()
+        self.records = []
+        self.rss_start = rss_bytes()
+        self.peak_rss = self.rss_start
+        self.peak_alloc = 0  # Alokasi sementara terbesar yang di-reserve selama run
+
+
+@contextmanager
+def run(name):
+    perf_run = PerfRun(name)
+    token = _current_run.set(perf_run)
+    try:
+        yield perf_run
+    finally:
+        _current_run.reset(token)
+
+
+def start_run(name):
+    # Untuk script linear (Streamlit): run aktif sampai start_run berikutnya di thread ini
+    perf_run = PerfRun(name)
+    _current_run.set(perf_run)
+    return perf_run
+
+
+def current_run():
+    return _current_run.get()
+
+
+def start(name, rows=None):
+    # Pasangan start/stop untuk blok panjang yang tidak praktis dibungkus `with`
+    return {'stage': name, 'rows': rows, '_t0': time.perf_counter(), '_rss0': rss_bytes()}
+
+
+def stop(rec, rows=None):
+    if rows is not None:
+        rec['rows'] = rows
+    rec['wall_ms'] = (time.perf_counter() - rec.pop('_t0')) * 1000
+    rss_after = rss_bytes()
+    rec['mem_delta_mb'] = (rss_after - rec.pop('_rss0')) / 1e6
+    rec['rss_mb'] = rss_after / 1e6
+    perf_run = _current_run.get()
+    if perf_run is not None:
+        perf_run.peak_rss = max(perf_run.peak_rss, rss_after)
+    record(rec)
+    return rec
+
+
+@contextmanager
+def stage(name, rows=None):
+    # rec['rows'] bisa diisi di dalam blok kalau jumlah baris baru diketahui belakangan
+    rec = start(name, rows)
+    try:
+        yield rec
+    finally:
+        stop(rec)
+
+
+def mem_budget_bytes():
+    value = os.environ.get(MEM_BUDGET_ENV)
+    return float(value) * 1e6 if value else None
+
+
+def reserve(nbytes, what):
+    # Dipanggil sebelum materialize frame sementara: catat ukuran, tolak kalau melewati budget
+    perf_run = _current_run.get()
+    if perf_run is not None:
+        perf_run.peak_alloc = max(perf_run.peak_alloc, nbytes)
+    budget = mem_budget_bytes()
+    if budget is not None and nbytes > budget:
+        raise MemoryBudgetExceeded(f"{what}: butuh ~{nbytes/1e6:,.1f} MB, budget {budget/1e6:,.1f} MB ({MEM_BUDGET_ENV})")
+
+
+def record(rec):
+    rec.setdefault('ts', time.time())
+    perf_run = _current_run.get()
+    if perf_run is not None:
+        rec.setdefault('run', perf_run.run_id)
+        rec.setdefault('run_name', perf_run.name)
+        perf_run.records.append(rec)
+
+    with _totals_lock:
+        total = _totals.setdefault(rec['stage'], {'count': 0, 'seconds': 0.0, 'rows': 0})
+        total['count'] += 1
+        total['seconds'] += rec.get('wall_ms', 0) / 1000
+        total['rows'] += rec.get('rows') or 0
+
+    log_path = os.environ.get(PERF_LOG_ENV)
+    if log_path:
+        with _log_lock, open(log_path, 'a') as f:
+            f.write(json.dumps(rec, default=str) + '\n')
+
+
+def prometheus_text(prefix='freq'):
+    # Stub exporter: counter per stage (format teks Prometheus)
+    lines = [
+        f'# HELP {prefix}_stage_seconds Total wall time per pipeline stage',
+        f'# TYPE {prefix}_stage_seconds summary'
+    ]
+    with _totals_lock:
+        totals = {k: dict(v) for k, v in _totals.items()}
+    for name, total in sorted(totals.items()):
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total["seconds"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {total["count"]}')
+    lines.append(f'# HELP {prefix}_stage_rows_total Rows processed per pipeline stage')
+    lines.append(f'# TYPE {prefix}_stage_rows_total counter')
+    for name, total in sorted(totals.items()):
+        lines.append(f'{prefix}_stage_rows_total{{stage="{name}"}} {total["rows"]}')
+    lines.append(f'# HELP {prefix}_process_rss_bytes Resident memory of the process')
+    lines.append(f'# TYPE {prefix}_process_rss_bytes gauge')
+    lines.append(f'{prefix}_process_rss_bytes {rss_bytes()}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,167 @@
+import ast
+from functools import lru_cache
+
+import numpy as np
+
+# ==============================================================================
+# RULES: Bahasa screen & score deklaratif -> satu fungsi NumPy tervektorisasi
+#
+#   hidden_gem:  "-2 <= chg <= 2"
+#   whale_gem:   "aov >= screener_whale and value >= 1e9 and -2 <= chg <= 2"
+#   score:       "clip((aov - whale) / (whale_max - whale) * 80 + 20, 0, 99)"
+#
+# - Nama = alias kolom (FIELDS), nama kolom apa adanya (mis. Whale_Signal), parameter, atau array extra
+# - and / or / not, perbandingan berantai, + - * / **, fungsi di FUNCTIONS
+# - Angka selalu float (9 ** 9 ** 9 = overflow cepat, bukan integer raksasa); operand and / or / not
+#   di-cast ke bool; error saat evaluasi (overflow, broadcast) dilaporkan sebagai RuleError
+# - Banyak rule dikompilasi jadi satu program: tiap kolom dibaca sekali, sub-ekspresi yang
+#   sama (mis. "value >= 1e9" di 10 screen) dihitung sekali
+# ==============================================================================
+FIELDS = {
+    'close': 'Close', 'open': 'Open Price', 'high': 'High', 'low': 'Low',
+    'chg': 'Change %', 'value': 'Value', 'volume': 'Volume', 'freq': 'Frequency',
+    'aov': 'AOV_Ratio', 'aov_z': 'AOV_RobustZ', 'value_ratio': 'Value_Ratio', 'foreign': 'Net Foreign',
+    'aov_pct': 'AOV_Pct', 'value_pct': 'Value_Pct', 'foreign_pct': 'Foreign_Pct', 'vwma': 'VWMA_20D',
+}
+
+# Nama fungsi -> (fungsi NumPy, jumlah argumen)
+FUNCTIONS = {
+    'abs': ('np.abs', 1), 'min': ('np.minimum', 2), 'max': ('np.maximum', 2), 'clip': ('np.clip', 3),
+    'log': ('np.log', 1), 'log1p': ('np.log1p', 1), 'sqrt': ('np.sqrt', 1), 'where': ('np.where', 3),
+}
+
+_COMPARE = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_BINARY = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**'}
+
+
+class RuleError(ValueError):
+    pass
+
+
+class Program:
+    # rules: {nama: ekspresi}; params: {nama: angka} di-inline sebagai konstanta saat kompilasi
+    def __init__(self, rules, params=None):
+        self.rules = dict(rules)
+        self.params = dict(params or {})
+        self.inputs = []  # Nama (alias / kolom / extra) yang dibaca, urut argumen program
+        self._lines = []
+        self._temps = {}
+
+        outputs = {name: self._emit(self._parse(name, expr)) for name, expr in self.rules.items()}
+        args = ', '.join(f'_in{i}' for i in range(len(self.inputs)))
+        returns = ', '.join(f'{name!r}: {var}' for name, var in outputs.items())
+        self.source = '\n'.join([f'def _program({args}):', *self._lines, f'    return {{{returns}}}'])
+        namespace = {'np': np}
+        exec(compile(self.source, '<rules>', 'exec'), namespace)
+        self._program = namespace['_program']
+
+    def _parse(self, name, expr):
+        try:
+            return ast.parse(str(expr).strip(), mode='eval').body
+        except SyntaxError as e:
+            raise RuleError(f"Rule '{name}': sintaks salah ({e.msg})")
+
+    def _emit(self, node):
+        # Return nama variabel / literal hasil node; node identik hanya dihitung sekali
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise RuleError(f"Konstanta tidak didukung: {node.value!r}")
+            try:
+                return repr(float(node.value))
+            except OverflowError:
+                raise RuleError(f"Konstanta terlalu besar: {ast.unparse(node)[:40]}")
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            return repr(-float(self._emit(node.operand)))  # _emit memvalidasi konstanta
+        if isinstance(node, ast.Name) and node.id in self.params:
+            return repr(float(self.params[node.id]))
+
+        key = ast.dump(node)
+        if key in self._temps:
+            return self._temps[key]
+        if isinstance(node, ast.Name):
+            var = f'_in{len(self.inputs)}'
+            self.inputs.append(node.id)
+            self._temps[key] = var
+            return var
+
+        expr = self._expr(node)  # Anak dulu -> nomor variabel unik
+        var = f'_t{len(self._lines)}'
+        self._lines.append(f'    {var} = {expr}')
+        self._temps[key] = var
+        return var
+
+    def _expr(self, node):
+        if isinstance(node, ast.BoolOp):
+            op = ' & ' if isinstance(node.op, ast.And) else ' | '
+            return op.join(f'np.asarray({self._emit(v)}, dtype=bool)' for v in node.values)
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return f'~np.asarray({self._emit(node.operand)}, dtype=bool)'
+            if isinstance(node.op, ast.USub):
+                return f'-({self._emit(node.operand)})'
+            if isinstance(node.op, ast.UAdd):
+                return self._emit(node.operand)
+        if isinstance(node, ast.Compare):
+            # a <= b <= c -> (a <= b) & (b <= c)
+            terms, left = [], self._emit(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARE:
+                    raise RuleError(f"Operator perbandingan tidak didukung: {type(op).__name__}")
+                right = self._emit(comparator)
+                terms.append(f'({left} {_COMPARE[type(op)]} {right})')
+                left = right
+            return ' & '.join(terms)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            return f'({self._emit(node.left)} {_BINARY[type(node.op)]} {self._emit(node.right)})'
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords:
+            func, n_args = FUNCTIONS[node.func.id]
+            if len(node.args) != n_args:
+                raise RuleError(f"Fungsi {node.func.id}() butuh {n_args} argumen, diberi {len(node.args)}")
+            return f"{func}({', '.join(self._emit(a) for a in node.args)})"
+        raise RuleError(f"Ekspresi tidak didukung: {ast.unparse(node)}")
+
+    def evaluate(self, frame=None, extra=None):
+        # {nama rule: array} -- satu kali baca per kolom, satu kali hitung per sub-ekspresi
+        extra = extra or {}
+        arrays = []
+        for name in self.inputs:
+            if name in extra:
+                arrays.append(extra[name])
+                continue
+            col = FIELDS.get(name, name)
+            if frame is None or col not in frame.columns:
+                raise RuleError(f"Kolom '{col}' tidak tersedia untuk rule")
+            arrays.append(frame[col].to_numpy())
+        try:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self._program(*arrays)
+        except Exception as e:
+            raise RuleError(f"Rule gagal dievaluasi: {type(e).__name__}: {e}") from e
+
+
+@lru_cache(maxsize=256)
+def _compiled(rules, params):
+    return Program(rules, params)
+
+
+def compile_rules(rules, params=None):
+    # Program di-cache per (rules, params): kompilasi sekali, evaluasi tiap rerun
+    return _compiled(tuple(rules.items()), tuple(sorted((params or {}).items())))
+
+
+def evaluate(rules, frame=None, params=None, extra=None):
+    return compile_rules(rules, params).evaluate(frame, extra)
+
+
+def parse_rule_lines(text):
+    # "nama: ekspresi" per baris (baris kosong / diawali # diabaikan) -> {nama: ekspresi}
+    rules = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, sep, expr = line.partition(':')
+        if not sep or not name.strip() or not expr.strip():
+            raise RuleError(f"Format baris harus 'nama: ekspresi': {line}")
+        rules[name.strip()] = expr.strip()
+    return rules
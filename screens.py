@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import datastore
+import engine
+import perf
+
+# ==============================================================================
+# SAVED SCREENS: Definisi screen bernama + hasil yang di-materialize per versi data
+#
+#   <dir>/definitions.json         -> {nama: {'kind', 'params', 'saved_at'}}
+#   <dir>/results/<key>.parquet    -> hasil screen; key = hash(kind, params, versi feature set)
+#
+# Versi baru dipublikasikan -> worker / build_features langsung menghitung semua screen tersimpan.
+# Membuka screen = baca file hasil; data atau definisi berubah -> key baru (hasil lama tinggal
+# menunggu dihapus LRU). Hasil dibatasi jumlah & ukuran, yang paling lama tidak dibuka dihapus.
+# ==============================================================================
+SCREENS_DIR_ENV = 'FREQ_SCREENS_DIR'
+SCREEN_KINDS = ('anomaly', 'bluechip', 'rule')
+MAX_RESULTS = 256
+MAX_RESULT_MB = 200
+
+
+def screens_dir(store_root=None):
+    # Default: di dalam store worker (kalau ada), supaya worker & session berbagi hasil
+    path = os.environ.get(SCREENS_DIR_ENV)
+    if path:
+        return path
+    store = store_root or datastore.store_dir()
+    return os.path.join(store, 'screens') if store else os.path.join(tempfile.gettempdir(), 'freq-screens')
+
+
+def load_definitions(root):
+    try:
+        with open(os.path.join(root, 'definitions.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_definitions(root, definitions):
+    os.makedirs(root, exist_ok=True)
+    datastore.write_atomic(os.path.join(root, 'definitions.json'), json.dumps(definitions, indent=1, sort_keys=True))
+
+
+def _update_definitions(root, update):
+    # Baca-ubah-tulis di bawah flock: simpan bersamaan (session / API lain) tidak saling menimpa definisi
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, '.definitions.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        definitions = load_definitions(root)
+        if update(definitions):
+            _write_definitions(root, definitions)
+
+
+def save_definition(root, name, kind, params):
+    if kind not in SCREEN_KINDS:
+        raise ValueError(f"kind harus salah satu dari {list(SCREEN_KINDS)}")
+    definition = {'kind': kind, 'params': params, 'saved_at': time.time()}
+    _update_definitions(root, lambda definitions: definitions.update({name: definition}) or True)
+    return definition
+
+
+def delete_definition(root, name):
+    _update_definitions(root, lambda definitions: definitions.pop(name, None) is not None)
+
+
+def result_key(definition, version):
+    # Nama & waktu simpan tidak ikut: dua screen dengan parameter sama berbagi hasil
+    payload = json.dumps({'kind': definition['kind'], 'params': definition['params'], 'version': version}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+def run_definition(definition, store):
+    # store: feature store (df, prefix, panel); params mengikuti argumen engine.*_screen
+    params = dict(definition['params'])
+    df, prefix, panel = store['df'], store['prefix'], store['panel']
+    kind = definition['kind']
+    if kind == 'anomaly':
+        return engine.anomaly_screen(df, prefix, panel, **params)
+    if kind == 'bluechip':
+        return engine.bluechip_screen(df, prefix, panel, **params)
+    period = params.get('period')
+    max_date = df['Last Trading Date'].max()
+    if period:
+        frame = engine.select_window(df, start_date=engine.period_start(max_date, period), panel=panel)
+    else:
+        frame = engine.select_window(df, date=max_date, panel=panel)
+    masks, scores = engine.run_screens(frame, {'screen': params['rule']}, params.get('score'))
+    return engine.screen_hits(frame, masks['screen'], scores)
+
+
+def _result_path(root, key):
+    return os.path.join(root, 'results', f'{key}.parquet')
+
+
+def get_result(root, definition, store):
+    # (DataFrame, dari_cache). Cache hit = satu baca file + sentuh mtime (urutan LRU)
+    # Snapshot store: key & hasil selalu dari versi df yang sama walau versi baru dipasang bersamaan
+    store = dict(store)
+    path = _result_path(root, result_key(definition, store['version']))
+    try:
+        with perf.stage('screens.read') as rec:
+            os.utime(path)
+            result = pd.read_parquet(path)
+            rec['rows'] = len(result)
+        return result, True
+    except FileNotFoundError:
+        pass  # Belum di-materialize / sudah dihapus LRU
+
+    with perf.stage('screens.compute') as rec:
+        result = run_definition(definition, store)
+        rec['rows'] = len(result)
+    _write_result(path, result)
+    evict(root)
+    return result, False
+
+
+def _write_result(path, result):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    result.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def materialize_all(root, store):
+    # Dipanggil sekali per versi data baru: semua screen tersimpan dihitung sebelum dibuka user
+    store = dict(store)
+    computed = 0
+    with perf.stage('screens.materialize') as rec:
+        for name, definition in load_definitions(root).items():
+            if os.path.exists(_result_path(root, result_key(definition, store['version']))):
+                continue
+            try:
+                get_result(root, definition, store)
+                computed += 1
+            except Exception as e:
+                print(f"Saved screen '{name}' gagal dihitung: {e}")
+        rec['rows'] = computed
+    return computed
+
+
+def evict(root, max_results=MAX_RESULTS, max_mb=MAX_RESULT_MB):
+    # LRU: urut mtime (disentuh tiap dibaca), hapus yang paling lama sampai jumlah & ukuran di bawah batas
+    results_dir = os.path.join(root, 'results')
+    entries = []
+    for name in os.listdir(results_dir):
+        if not name.endswith('.parquet'):
+            continue
+        try:
+            st = os.stat(os.path.join(results_dir, name))
+        except FileNotFoundError:
+            continue  # Dihapus proses lain (worker / session lain)
+        entries.append((st.st_mtime, st.st_size, name))
+    entries.sort(reverse=True)
+    total = 0
+    for i, (_, size, name) in enumerate(entries):
+        total += size
+        if i >= max_results or total > max_mb * 1e6:
+            try:
+                os.remove(os.path.join(results_dir, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,79 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import datastore
+import loader
+import perf
+
+# ==============================================================================
+# SERVE: Launcher Streamlit + prewarm opsional saat boot
+# Jalankan: python serve.py -- --server.port 8501
+#           python serve.py --prewarm --csv Kompilasi_Data_1Tahun.csv -- --server.port 8501
+#
+# --prewarm: worker.py jalan sebagai proses terpisah (FREQ_STORE_DIR) dan server Streamlit baru
+#            dibuka setelah versi pertama dipublikasikan -> session pertama hanya memory-map
+# Boot timestamp diteruskan via FREQ_BOOT_TS -> stage boot.first_render di perf log
+# ==============================================================================
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREWARM_TIMEOUT = 900
+
+
+def start_worker(args, store):
+    cmd = [sys.executable, os.path.join(HERE, 'worker.py'), '--store', store, '--interval', str(args.interval)]
+    cmd += ['--csv', *args.csv] if args.csv else ['--service-account', args.service_account, '--drive-pattern', args.drive_pattern]
+    return subprocess.Popen(cmd)
+
+
+def wait_published(worker, store, timeout=PREWARM_TIMEOUT):
+    # Tunggu CURRENT ada (versi dari boot sebelumnya juga valid: worker akan menggantinya saat siap)
+    deadline = time.time() + timeout
+    while datastore.current_version(store) is None:
+        if worker.poll() is not None:
+            raise SystemExit(f"Worker berhenti sebelum publish (exit {worker.returncode})")
+        if time.time() > deadline:
+            raise SystemExit(f"Prewarm timeout setelah {timeout} s")
+        time.sleep(0.5)
+    return datastore.current_version(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frequency Analyzer Streamlit launcher")
+    parser.add_argument('--prewarm', action='store_true', help="Jalankan worker & tunggu data siap sebelum server dibuka")
+    parser.add_argument('--csv', nargs='+', help="Path / glob CSV kompilasi lokal (untuk worker)")
+    parser.add_argument('--service-account', help="Path JSON service account Google Drive (untuk worker)")
+    parser.add_argument('--drive-pattern', default=loader.drive_pattern(), help="Nama / glob file di folder Drive (untuk worker)")
+    parser.add_argument('--store', default=datastore.store_dir() or os.path.join(tempfile.gettempdir(), 'freq-store'))
+    parser.add_argument('--interval', type=int, default=loader.POLL_INTERVAL, help="Interval cek metadata sumber oleh worker (detik)")
+    parser.add_argument('streamlit_args', nargs=argparse.REMAINDER, help="Argumen tambahan untuk `streamlit run` (setelah --)")
+    args = parser.parse_args()
+
+    os.environ[perf.BOOT_TS_ENV] = str(time.time())
+    worker = None
+    if args.prewarm:
+        if not (args.csv or args.service_account):
+            parser.error("--prewarm butuh --csv atau --service-account")
+        os.environ[datastore.STORE_DIR_ENV] = args.store
+        with perf.run('boot'), perf.stage('boot.prewarm'):
+            worker = start_worker(args, args.store)
+            version = wait_published(worker, args.store)
+        print(f"Prewarm selesai: versi {version} di {args.store}")
+
+    streamlit_args = [a for a in args.streamlit_args if a != '--']
+    server = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', os.path.join(HERE, 'app.py'), *streamlit_args])
+    # SIGTERM ke launcher -> worker & server ikut berhenti
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        return server.wait()
+    finally:
+        for proc in (server, worker):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import fcntl
+import os
+import time
+
+import datastore
+import engine
+import loader
+import perf
+import screens
+
+# ==============================================================================
+# WORKER: Fetch + parse + compute fitur di luar proses Streamlit
+# Jalankan: python worker.py --csv Kompilasi_Data_1Tahun.csv --store /var/lib/freq --interval 60
+# Session app.py dengan env FREQ_STORE_DIR=/var/lib/freq hanya membaca versi terbaru (memory-map),
+# jadi refresh tidak pernah terjadi di dalam request user
+# Tiap interval hanya metadata sumber yang dicek; download + hitung ulang hanya kalau file berubah
+# ==============================================================================
+
+
+def run_once(source, root, store):
+    # Return (versi, dipublikasikan?). Data mentah & kode sama dengan versi terbaru -> tidak ada kerja ulang
+    with perf.run('worker.refresh'):
+        df_raw = source()
+        if df_raw is None:
+            raise RuntimeError("Sumber data kosong / file tidak ditemukan")
+        version = engine.feature_version(df_raw)
+        if version == datastore.current_version(root):
+            return version, False
+
+        df = engine.build_feature_set(df_raw, store, version)
+        # Ledger ditulis sebelum publish -> versi baru selalu punya event tanggalnya
+        with perf.stage('worker.ledger') as rec:
+            rec['rows'] = datastore.append_ledger(root, store['ledger'].events, engine.code_version(),
+                                                  store['corp_actions'], df['Last Trading Date'].min())
+        # Saved screens dihitung untuk versi ini sebelum publish -> dibuka user = baca cache
+        screens.materialize_all(screens.screens_dir(root), store)
+        # Index turunan (panel, prefix, market, ledger) ikut dipublikasikan -> session pertama setelah publish
+        # hanya membuka memory-map, tidak membangun ulang index
+        tables = {'df': df, 'breadth': store['breadth'], 'ledger': store['ledger'].events,
+                  **{f'bars_{tf}': store[f'bars_{tf}'] for tf in engine.TIMEFRAMES}}
+        with perf.stage('worker.publish', len(df)):
+            datastore.publish(root, version, tables, info={'rows': len(df), 'max_date': str(df['Last Trading Date'].max())},
+                              arrays=engine.index_arrays(store))
+    return version, True
+
+
+def acquire_lock(root):
+    # Satu worker per store (tidak ada dua proses yang menghitung & publish bersamaan)
+    os.makedirs(root, exist_ok=True)
+    lock_file = open(os.path.join(root, '.worker.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frequency Analyzer feature precompute worker")
+    loader.add_source_args(parser)
+    parser.add_argument('--store', default=datastore.store_dir(), help=f"Direktori store (default env {datastore.STORE_DIR_ENV})")
+    parser.add_argument('--interval', type=int, default=loader.POLL_INTERVAL, help="Interval cek metadata sumber (detik)")
+    parser.add_argument('--once', action='store_true', help="Publish satu kali lalu keluar")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error(f"--store atau env {datastore.STORE_DIR_ENV} wajib diisi")
+
+    lock = acquire_lock(args.store)
+    if lock is None:
+        print(f"Worker lain sudah berjalan untuk store {args.store}")
+        return
+
+    poller = loader.SourcePoller(loader.make_source(args), args.interval)
+    store = {}
+    while True:
+        try:
+            started = time.perf_counter()
+            if poller.check():
+                version, published = run_once(lambda: poller.data, args.store, store)
+                status = "dipublikasikan" if published else "tidak berubah"
+                print(f"Versi {version} {status} ({time.perf_counter() - started:.1f} s)")
+        except Exception as e:
+            poller.invalidate()
+            print(f"Gagal refresh data: {e}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()